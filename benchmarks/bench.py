@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+"""
+End-to-end benchmark of the bot against a local fake Bot API.
+
+Runs the real `main()` of wai-bot-tele.py (plugins, authorization, rate
+limiter, dispatcher and transport included) against `FakeBotAPI`, replays
+a stream of commands at a fixed rate and reports throughput, per-command
+latency percentiles and event loop stalls.
+
+    python -m benchmarks.bench --mix "/help=5,/cmd echo hi=1" --rate 20 --count 500
+    python -m benchmarks.bench --script updates.jsonl --transport webhook --json
+
+A script is a JSON-lines file of {"at": seconds, "text": "/command args"}.
+Outbound rate limits still apply; raise SEND_GLOBAL_RATE/SEND_CHAT_RATE in
+the environment to measure the bot rather than the limiter.
+
+Latency is the time until the first answer to an update. For /cmd that is
+the "Running..." message (or the "Job started" reply with a trailing `&`),
+not the completion of the command.
+
+The path index and the system sampler are turned off so that no
+background thread competes for the GIL during the measurement, and
+CACHE_DIR (the job database, file_id and plugin caches) points to a
+temporary directory so that nothing is written into the repository.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import importlib.util
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from benchmarks.fake_bot_api import FakeBotAPI
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_CHAT = 10_000
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile, 0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+def build_script(args) -> List[Tuple[float, str]]:
+    """The (offset in seconds, text) of every update to send."""
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        return sorted((float(entry["at"]), entry["text"]) for entry in entries)
+
+    commands, weights = [], []
+    for item in args.mix.split(","):
+        text, _, weight = item.rpartition("=") if "=" in item else (item, "", "1")
+        commands.append(text.strip())
+        weights.append(float(weight))
+    rng = random.Random(args.seed)
+    return [(i / args.rate, rng.choices(commands, weights)[0]) for i in range(args.count)]
+
+class LoopMonitor:
+    """Measures how late the event loop wakes up a task that sleeps `interval` seconds."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.stalls: List[float] = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.stalls.append(max(0.0, loop.time() - started - self.interval))
+
+def load_bot():
+    """Imports wai-bot-tele.py as a module, after the environment is set up."""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    spec = importlib.util.spec_from_file_location("wai_bot_tele", os.path.join(ROOT, "wai-bot-tele.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+async def replay(api: FakeBotAPI, script: List[Tuple[float, str]], chats: int):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    offset = time.perf_counter() - started
+    next_chat = 0
+    for at, text in script:
+        delay = started + at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Each chat has at most one unanswered update so replies can be matched.
+        while True:
+            for i in range(chats):
+                chat_id = FIRST_CHAT + (next_chat + i) % chats
+                if not api.is_busy(chat_id):
+                    next_chat = (next_chat + i + 1) % chats
+                    break
+            else:
+                await asyncio.sleep(0.001)
+                continue
+            break
+        await api.inject(chat_id, text, scheduled=started + at + offset)
+
+def report(api: FakeBotAPI, monitor: LoopMonitor, sent: int, elapsed: float) -> Dict:
+    by_command: Dict[str, List[float]] = defaultdict(list)
+    for sample in api.samples:
+        by_command[sample.command].append(sample.latency)
+
+    def summary(latencies: List[float]) -> Dict:
+        return {
+            "count": len(latencies),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": max(latencies, default=0.0) * 1000,
+        }
+
+    return {
+        "sent": sent,
+        "answered": len(api.samples),
+        "unanswered": api.outstanding,
+        "elapsed_s": elapsed,
+        "throughput_per_s": len(api.samples) / elapsed if elapsed else 0.0,
+        "latency": summary([s.latency for s in api.samples]),
+        "delivery": summary([s.delivery for s in api.samples]),
+        "commands": {command: summary(latencies) for command, latencies in sorted(by_command.items())},
+        "loop_stall": {
+            "p99_ms": percentile(monitor.stalls, 99) * 1000,
+            "max_ms": max(monitor.stalls, default=0.0) * 1000,
+            "over_100ms": sum(1 for stall in monitor.stalls if stall > 0.1),
+        },
+        "api_calls": dict(sorted(api.stats.calls.items())),
+    }
+
+def print_report(result: Dict):
+    print(f"Sent {result['sent']} updates, answered {result['answered']}, "
+          f"unanswered {result['unanswered']} in {result['elapsed_s']:.2f}s "
+          f"({result['throughput_per_s']:.1f}/s)")
+    print(f"{'command':<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = list(result["commands"].items()) + [("(all)", result["latency"]), ("(delivery)", result["delivery"])]
+    for name, row in rows:
+        print(f"{name:<20}{row['count']:>7}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+    stall = result["loop_stall"]
+    print(f"Event loop stalls: p99 {stall['p99_ms']:.1f} ms, max {stall['max_ms']:.1f} ms, "
+          f"{stall['over_100ms']} over 100 ms")
+    print("API calls: " + ", ".join(f"{method}={count}" for method, count in result["api_calls"].items()))
+
+async def run(args) -> Dict:
+    api = FakeBotAPI()
+    await api.start()
+
+    cache = tempfile.TemporaryDirectory(prefix="wai-bench-")
+    os.environ.setdefault("INDEX_ROOTS", "")
+    os.environ.setdefault("SYSMON_INTERVAL", "0")
+    os.environ.update({
+        "CACHE_DIR": cache.name,
+        "TELEGRAM_BOT_TOKEN": "123456:bench",
+        "BOT_API_URL": api.url,
+        "AUTHORIZED_USERS": ",".join(str(FIRST_CHAT + i) for i in range(args.chats)),
+        "TRANSPORT": args.transport,
+        "PLUGIN_WATCH_INTERVAL": "0",
+        "ACL_RELOAD_INTERVAL": "0",
+    })
+    if args.transport == "webhook":
+        os.environ.setdefault("WEBHOOK_LISTEN", "127.0.0.1")
+        os.environ.setdefault("WEBHOOK_PORT", str(args.webhook_port))
+        os.environ.setdefault("WEBHOOK_URL", f"http://127.0.0.1:{args.webhook_port}/bench")
+
+    bot = load_bot()
+    monitor = LoopMonitor()
+    monitor_task = asyncio.ensure_future(monitor.run())
+    bot_task = asyncio.ensure_future(bot.main())
+    try:
+        await asyncio.wait_for(api.ready.wait(), 30)
+        monitor.stalls.clear()
+
+        script = build_script(args)
+        started = time.perf_counter()
+        await replay(api, script, args.chats)
+        deadline = time.perf_counter() + args.drain
+        while api.outstanding and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        return report(api, monitor, len(script), elapsed)
+    finally:
+        bot.shutdown_signal.set()
+        try:
+            await asyncio.wait_for(bot_task, 30)
+        except (asyncio.TimeoutError, SystemExit):
+            bot_task.cancel()
+        monitor_task.cancel()
+        await api.stop()
+        cache.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot against a local fake Bot API.")
+    parser.add_argument("--mix", default="/help=1", help='weighted commands, e.g. "/help=5,/cmd echo hi=1"')
+    parser.add_argument("--script", help="JSON-lines file of {\"at\": seconds, \"text\": ...} (overrides --mix)")
+    parser.add_argument("--rate", type=float, default=20, help="updates per second with --mix")
+    parser.add_argument("--count", type=int, default=200, help="updates to send with --mix")
+    parser.add_argument("--chats", type=int, default=100, help="distinct chats the updates come from")
+    parser.add_argument("--transport", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--webhook-port", type=int, default=18443)
+    parser.add_argument("--drain", type=float, default=30, help="seconds to wait for the last answers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+if __name__ == "__main__":
+    main()
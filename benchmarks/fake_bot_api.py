@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import itertools
+import json
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from email.parser import BytesParser
+from typing import Any, Deque, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+import httpx
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+            "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False}
+
+@dataclass
+class PendingUpdate:
+    """A scripted update waiting for the bot to answer."""
+    command: str
+    scheduled: float
+    delivered: Optional[float] = None
+
+@dataclass
+class Sample:
+    """Latency of one answered update."""
+    command: str
+    latency: float
+    delivery: float
+
+@dataclass
+class ApiStats:
+    """What the bot sent to the fake API."""
+    calls: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    bytes_in: int = 0
+
+class FakeBotAPI:
+    """
+    A stand-in for the Telegram Bot API, served on localhost.
+
+    It implements just enough of the API for the bot to run: getMe,
+    getUpdates (with long polling), setWebhook/deleteWebhook, sendMessage,
+    editMessageText, sendDocument and sendPhoto; any other method succeeds
+    with `true`. Updates are handed out through getUpdates, or posted to the
+    webhook once the bot has registered one.
+
+    Every scripted update is sent from its own chat, and the first request
+    the bot addresses to that chat answers it, which gives the
+    update-to-reply latency of each command.
+
+    Attributes:
+        samples (List[Sample]): Latencies of the updates answered so far.
+        stats (ApiStats): Counters of the requests the bot made.
+        ready (asyncio.Event): Set once the bot polls or registers a webhook.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.samples: List[Sample] = []
+        self.stats = ApiStats()
+        self.ready = asyncio.Event()
+        self.webhook: Optional[Dict[str, Any]] = None
+        self._updates: Deque[Dict] = deque()
+        self._new_update = asyncio.Event()
+        self._pending: Dict[int, PendingUpdate] = {}
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def outstanding(self) -> int:
+        """Updates injected but not answered yet."""
+        return len(self._pending)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._client = httpx.AsyncClient(timeout=30)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._client is not None:
+            await self._client.aclose()
+
+    def is_busy(self, chat_id: int) -> bool:
+        return chat_id in self._pending
+
+    async def inject(self, chat_id: int, text: str, scheduled: Optional[float] = None):
+        """
+        Queues a command message from a private chat.
+
+        Args:
+            chat_id (int): The chat (and user) the message comes from; it must not have an unanswered update.
+            text (str): The message text, starting with the command.
+            scheduled (float, optional): When the update was due, latency is measured from there.
+        """
+        now = time.perf_counter()
+        update_id = next(self._update_ids)
+        command = text.split(None, 1)[0]
+        self._pending[chat_id] = PendingUpdate(command, now if scheduled is None else scheduled)
+        user = {"id": chat_id, "is_bot": False, "first_name": "bench"}
+        update = {
+            "update_id": update_id,
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private", "first_name": "bench"},
+                "from": user,
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+            },
+        }
+        if self.webhook is not None:
+            self._pending[chat_id].delivered = time.perf_counter()
+            asyncio.ensure_future(self._post_webhook(update))
+        else:
+            self._updates.append(update)
+            self._new_update.set()
+
+    async def _post_webhook(self, update: Dict):
+        headers = {"X-Telegram-Bot-Api-Secret-Token": self.webhook.get("secret_token") or ""}
+        try:
+            await self._client.post(self.webhook["url"], json=update, headers=headers)
+        except httpx.HTTPError:
+            pass
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, target, _ = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                self.stats.bytes_in += len(body)
+
+                method = target.rsplit("/", 1)[-1].split("?", 1)[0]
+                params = self._parse(headers.get("content-type", ""), body)
+                result = await self._call(method, params)
+                payload = json.dumps({"ok": True, "result": result}).encode("utf-8")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            # A long poll still open when the server stops ends up here.
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse(content_type: str, body: bytes) -> Dict[str, Any]:
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser().parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+            )
+            params = {}
+            for part in message.get_payload():
+                name = part.get_param("name", header="content-disposition")
+                if part.get_filename() is not None:
+                    params[name] = part.get_payload(decode=True)
+                else:
+                    params[name] = part.get_payload(decode=True).decode("utf-8")
+        elif content_type.startswith("application/json"):
+            params = json.loads(body or b"{}")
+        else:
+            params = dict(parse_qsl(body.decode("utf-8")))
+
+        for key, value in params.items():
+            if isinstance(value, str):
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    pass
+        return params
+
+    def _answer(self, chat_id: Any):
+        try:
+            pending = self._pending.pop(int(chat_id))
+        except (KeyError, TypeError, ValueError):
+            return
+        now = time.perf_counter()
+        delivered = pending.delivered if pending.delivered is not None else now
+        self.samples.append(Sample(pending.command, now - pending.scheduled, delivered - pending.scheduled))
+
+    def _message(self, params: Dict, **extra) -> Dict:
+        chat_id = params.get("chat_id")
+        message = {
+            "message_id": params.get("message_id") or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "bench"},
+            "from": BOT_USER,
+        }
+        message.update(extra)
+        return message
+
+    async def _call(self, method: str, params: Dict) -> Any:
+        self.stats.calls[method] += 1
+        if method == "getMe":
+            return BOT_USER
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "setWebhook":
+            self.webhook = params
+            self.ready.set()
+            return True
+        if method == "deleteWebhook":
+            self.webhook = None
+            return True
+        if method == "getWebhookInfo":
+            return {"url": (self.webhook or {}).get("url", ""), "has_custom_certificate": False,
+                    "pending_update_count": len(self._updates)}
+
+        if "chat_id" in params:
+            self._answer(params["chat_id"])
+        if method in ("sendMessage", "editMessageText"):
+            return self._message(params, text=str(params.get("text", "")))
+        if method == "sendDocument":
+            file_id = f"doc{next(self._message_ids)}"
+            return self._message(params, document={"file_id": file_id, "file_unique_id": file_id})
+        if method == "sendPhoto":
+            file_id = f"photo{next(self._message_ids)}"
+            return self._message(params, photo=[{"file_id": file_id, "file_unique_id": file_id,
+                                                 "width": 1, "height": 1}])
+        return True
+
+    async def _get_updates(self, params: Dict) -> List[Dict]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates:
+            self.ready.set()
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                return []
+        batch = list(itertools.islice(self._updates, limit))
+        now = time.perf_counter()
+        for update in batch:
+            pending = self._pending.get(update["message"]["chat"]["id"])
+            if pending is not None and pending.delivered is None:
+                pending.delivered = now
+        return batch
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import os
+
+class Setting:
+    """
+    Runtime settings for the bot.
+
+    Every value can be overridden through an environment variable of the same
+    name (usually set in the `.env` file next to `wai-bot-tele.py`).
+    """
+
+    # Where caches and local state are kept
+    CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+    # Transport: "polling" or "webhook" (falls back to polling if the webhook cannot start)
+    TRANSPORT = os.getenv("TRANSPORT", "polling").lower()
+    BOT_API_URL = os.getenv("BOT_API_URL", "")
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+    WEBHOOK_CERT = os.getenv("WEBHOOK_CERT") or None
+    WEBHOOK_KEY = os.getenv("WEBHOOK_KEY") or None
+    WEBHOOK_UPLOAD_CERT = os.getenv("WEBHOOK_UPLOAD_CERT", "false").lower() in ("1", "true", "yes")
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+    # Update dispatch (UPDATE_WORKERS=1 processes updates one at a time)
+    UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "8"))
+    UPDATE_BACKLOG = int(os.getenv("UPDATE_BACKLOG", "256"))
+
+    # Outbound requests (Telegram allows about 30 messages/s overall,
+    # 1/s per private chat and 20/min per group)
+    SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+    SEND_GLOBAL_BURST = float(os.getenv("SEND_GLOBAL_BURST", "30"))
+    SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+    SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+    SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", str(20 / 60)))
+    SEND_GROUP_BURST = float(os.getenv("SEND_GROUP_BURST", "3"))
+    SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+    # /cmd executor
+    CMD_TIMEOUT = float(os.getenv("CMD_TIMEOUT", "300"))
+    CMD_MAX_CONCURRENT = int(os.getenv("CMD_MAX_CONCURRENT", "4"))
+    CMD_EDIT_INTERVAL = float(os.getenv("CMD_EDIT_INTERVAL", "1.5"))
+    CMD_MAX_OUTPUT = int(os.getenv("CMD_MAX_OUTPUT", str(1024 * 1024)))
+
+    # Persistent /cmd shell sessions, opted in per chat with /shell on
+    SHELL_COMMAND = os.getenv("SHELL_COMMAND", "bash --noprofile --norc")
+    SHELL_MAX_SESSIONS = int(os.getenv("SHELL_MAX_SESSIONS", "4"))
+    SHELL_IDLE_TIMEOUT = float(os.getenv("SHELL_IDLE_TIMEOUT", "900"))
+    SHELL_INTERRUPT_GRACE = float(os.getenv("SHELL_INTERRUPT_GRACE", "5"))
+
+    # Paged /cmd output (OUTPUT_FILE_THRESHOLD=0 never sends output as a file)
+    OUTPUT_STORE_BYTES = int(os.getenv("OUTPUT_STORE_BYTES", str(32 * 1024 * 1024)))
+    OUTPUT_STORE_ENTRIES = int(os.getenv("OUTPUT_STORE_ENTRIES", "256"))
+    OUTPUT_FILE_THRESHOLD = int(os.getenv("OUTPUT_FILE_THRESHOLD", str(64 * 1024)))
+
+    # /uploadfile
+    UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(49 * 1024 * 1024)))
+    UPLOAD_PARALLEL = int(os.getenv("UPLOAD_PARALLEL", "2"))
+    UPLOAD_WRITE_TIMEOUT = float(os.getenv("UPLOAD_WRITE_TIMEOUT", "600"))
+    UPLOAD_COMPRESS_LEVEL = int(os.getenv("UPLOAD_COMPRESS_LEVEL", "6"))
+
+    # /uploaddir
+    ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", str(os.cpu_count() or 1)))
+    ARCHIVE_BLOCK_SIZE = int(os.getenv("ARCHIVE_BLOCK_SIZE", str(1024 * 1024)))
+
+    # Documents sent to the bot (DOWNLOAD_ALLOWED_DIRS separated by os.pathsep, default DOWNLOAD_DIR only)
+    DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR", "downloads")
+    DOWNLOAD_ALLOWED_DIRS = os.getenv("DOWNLOAD_ALLOWED_DIRS", "")
+    DOWNLOAD_PARALLEL = int(os.getenv("DOWNLOAD_PARALLEL", "2"))
+    DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "600"))
+
+    # file_id cache (FILE_CACHE_ENTRIES=0 disables it)
+    FILE_CACHE = os.getenv("FILE_CACHE", os.path.join(CACHE_DIR, "file_ids.json"))
+    FILE_CACHE_ENTRIES = int(os.getenv("FILE_CACHE_ENTRIES", "1024"))
+
+    # /screenshot
+    SCREENSHOT_FORMAT = os.getenv("SCREENSHOT_FORMAT", "jpeg").lower()
+    SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", "80"))
+    SCREENSHOT_MAX_DIM = int(os.getenv("SCREENSHOT_MAX_DIM", "0"))
+    SCREENSHOT_AS_PHOTO = os.getenv("SCREENSHOT_AS_PHOTO", "false").lower() in ("1", "true", "yes")
+    WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "5"))
+    WATCH_MIN_INTERVAL = float(os.getenv("WATCH_MIN_INTERVAL", "1"))
+    WATCH_THRESHOLD = float(os.getenv("WATCH_THRESHOLD", "1"))
+
+    # Logging (LOG_FORMAT is "text" or "json")
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+    LOG_FILE = os.getenv("LOG_FILE") or None
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "3"))
+
+    # Access control
+    ACL_FILE = os.getenv("ACL_FILE", "config/acl.json")
+    ACL_RELOAD_INTERVAL = float(os.getenv("ACL_RELOAD_INTERVAL", "5"))
+    AUTH_HANDLER_GROUP = int(os.getenv("AUTH_HANDLER_GROUP", "-100"))
+
+    # Background jobs
+    JOBS_DB = os.getenv("JOBS_DB", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+    JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+    JOBS_RETENTION_DAYS = float(os.getenv("JOBS_RETENTION_DAYS", "7"))
+    JOBS_MAX_OUTPUT = int(os.getenv("JOBS_MAX_OUTPUT", str(64 * 1024)))
+
+    # Metrics (METRICS_PORT=0 disables the Prometheus endpoint)
+    METRICS_LAG_INTERVAL = float(os.getenv("METRICS_LAG_INTERVAL", "0.5"))
+    METRICS_LAG_WARNING = float(os.getenv("METRICS_LAG_WARNING", "1"))
+    METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+    # System monitor for /sys and /top (SYSMON_INTERVAL=0 disables sampling; tiers are step:points)
+    SYSMON_INTERVAL = float(os.getenv("SYSMON_INTERVAL", "1"))
+    SYSMON_TIERS = os.getenv("SYSMON_TIERS", "1:600,60:1440")
+    SYSMON_PROC_INTERVAL = float(os.getenv("SYSMON_PROC_INTERVAL", "5"))
+    SYSMON_TOP = int(os.getenv("SYSMON_TOP", "10"))
+
+    # Path index for /find and /ls (paths separated by os.pathsep; empty INDEX_ROOTS disables it)
+    INDEX_ROOTS = os.getenv("INDEX_ROOTS", "")
+    INDEX_EXCLUDE = os.getenv("INDEX_EXCLUDE", os.pathsep.join(["/proc", "/sys", "/dev", "/run"]))
+    INDEX_REFRESH_INTERVAL = float(os.getenv("INDEX_REFRESH_INTERVAL", "60"))
+    INDEX_PAGE_SIZE = int(os.getenv("INDEX_PAGE_SIZE", "30"))
+
+    # Multi-host agent mode (FLEET_PORT=0 disables it; agents run wai-agent.py)
+    FLEET_LISTEN = os.getenv("FLEET_LISTEN", "0.0.0.0")
+    FLEET_PORT = int(os.getenv("FLEET_PORT", "0"))
+    FLEET_TOKEN = os.getenv("FLEET_TOKEN", "")
+    FLEET_CERT = os.getenv("FLEET_CERT") or None
+    FLEET_KEY = os.getenv("FLEET_KEY") or None
+
+    # Plugins
+    PLUGIN_HANDLER_GROUP = int(os.getenv("PLUGIN_HANDLER_GROUP", "1"))
+    PLUGIN_WATCH_INTERVAL = float(os.getenv("PLUGIN_WATCH_INTERVAL", "2"))
+    PLUGIN_THREADS = int(os.getenv("PLUGIN_THREADS", "4"))
+    PLUGIN_PROCESSES = int(os.getenv("PLUGIN_PROCESSES", str(os.cpu_count() or 1)))
+    PLUGIN_WORKER_MAX_RSS = int(os.getenv("PLUGIN_WORKER_MAX_RSS", str(512 * 1024 * 1024)))
@@ -1,21 +1,42 @@
 import os
 import sys
+import ast
+import json
+import asyncio
+import hashlib
 import importlib
-import inspect
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from telegram.ext import CommandHandler
 
+from config.settings import Setting
+from utils.jobs import jobs
 from utils.logger import Logger
+from utils.metrics import metrics
+from manager.plugin_workers import MODES, run_in_process, run_in_thread
 
 class PluginManager:
     """
     Manages loading, reloading, and executing plugins for a Telegram bot.
 
+    Plugin files are not imported at startup. Their commands are discovered by
+    parsing the source, the result is cached in a manifest keyed by the hash of
+    each file, and every command is registered through a lightweight proxy that
+    imports the plugin module the first time the command is used.
+
     Attributes:
         plugin_folder (str): The folder where plugin files are stored.
         commands (Dict[str, Callable]): A dictionary mapping command names to their corresponding handler functions.
         help_texts (Dict[str, str]): A dictionary mapping command names to their help text descriptions.
-        loaded_modules (List[str]): A list of module names that have been loaded.
+        loaded_modules (List[str]): A list of module names that have been imported.
+        command_modules (Dict[str, str]): A dictionary mapping command names to the module that defines them.
+        command_limits (Dict[str, int]): The concurrency cap each plugin declared for its commands.
+        background_commands (Set[str]): The commands that run as background jobs.
+        command_modes (Dict[str, str]): The execution mode of every command that does not run in the event loop.
+        manifest_path (str): The file where the scanned commands of every plugin are cached.
+        manifest (Dict[str, Dict]): The hash and commands of every plugin file, keyed by file name.
+        file_stats (Dict[str, Tuple[int, int]]): The (mtime_ns, size) of every plugin file at the last scan.
+        application: The application the plugin handlers are attached to, if any.
+        handler_group (int): The handler group that holds the plugin commands.
     """
 
     def __init__(self, plugin_folder: str = "plugins"):
@@ -29,8 +50,218 @@ class PluginManager:
         self.commands: Dict[str, Callable] = {}
         self.help_texts: Dict[str, str] = {}
         self.loaded_modules: List[str] = []
+        self.command_modules: Dict[str, str] = {}
+        self.command_limits: Dict[str, int] = {}
+        self.background_commands: Set[str] = set()
+        self.command_modes: Dict[str, str] = {}
+        self.manifest_path = os.path.join(Setting.CACHE_DIR, "plugin_manifest.json")
+        self.manifest: Dict[str, Dict] = {}
+        self.file_stats: Dict[str, Tuple[int, int]] = {}
+        self.application = None
+        self.handler_group = Setting.PLUGIN_HANDLER_GROUP
         self.load_plugin()
 
+    @staticmethod
+    def scan_source(source: str) -> Dict[str, str]:
+        """
+        Finds the commands defined by a plugin without importing it.
+
+        Args:
+            source (str): The source code of the plugin.
+
+        Returns:
+            Dict[str, str]: A dictionary mapping command names to their docstring.
+        """
+        commands = {}
+        for node in ast.parse(source).body:
+            if isinstance(node, ast.AsyncFunctionDef) and node.name.startswith("cmd_"):
+                commands[node.name[4:]] = (ast.get_docstring(node) or "No description").strip()
+        return commands
+
+    @staticmethod
+    def scan_limits(source: str) -> Dict[str, int]:
+        """
+        Reads the concurrency caps a plugin declares, without importing it.
+
+        A plugin declares them with a module-level literal such as
+        `CONCURRENCY = {"screenshot": 1}`, mapping command names to the number
+        of invocations allowed to run at the same time.
+
+        Args:
+            source (str): The source code of the plugin.
+
+        Returns:
+            Dict[str, int]: A dictionary mapping command names to their cap.
+        """
+        value = PluginManager._scan_literal(source, "CONCURRENCY") or {}
+        return {str(k): int(v) for k, v in value.items() if int(v) > 0}
+
+    @staticmethod
+    def scan_background(source: str) -> List[str]:
+        """
+        Reads which commands a plugin wants to run as background jobs.
+
+        A plugin opts in with a module-level literal such as
+        `BACKGROUND = ["cmd"]`; called with a trailing `&` argument, those
+        commands answer with a job id and run through `utils.jobs.JobManager`.
+
+        Args:
+            source (str): The source code of the plugin.
+
+        Returns:
+            List[str]: The command names.
+        """
+        return [str(command) for command in PluginManager._scan_literal(source, "BACKGROUND") or ()]
+
+    @staticmethod
+    def scan_execution(source: str) -> Dict[str, str]:
+        """
+        Reads where a plugin wants its commands to run.
+
+        A plugin declares it with a module-level literal such as
+        `EXECUTION = {"render": "process"}`. Commands run in the event loop
+        ("loop") unless they are listed as "thread", on a pool thread with
+        their own event loop, or "process", in a worker process that a crash
+        or a memory leak cannot take the bot down with.
+
+        Args:
+            source (str): The source code of the plugin.
+
+        Returns:
+            Dict[str, str]: Command names mapped to "thread" or "process".
+        """
+        value = PluginManager._scan_literal(source, "EXECUTION") or {}
+        modes = {}
+        for command, mode in value.items():
+            if mode not in MODES:
+                Logger.warning(f"Unknown execution mode {mode!r} for /{command}, running it in the event loop")
+            elif mode != "loop":
+                modes[str(command)] = mode
+        return modes
+
+    @staticmethod
+    def _scan_literal(source: str, name: str):
+        for node in ast.parse(source).body:
+            if isinstance(node, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id == name for target in node.targets
+            ):
+                return ast.literal_eval(node.value)
+        return None
+
+    def _read_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest: Dict[str, Dict]):
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+            temp_path = f"{self.manifest_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(temp_path, self.manifest_path)
+        except OSError as e:
+            Logger.warning(f"Could not write plugin manifest {self.manifest_path}: {e}")
+
+    def _make_proxy(self, command: str, module_name: str) -> Callable:
+        """
+        Builds the handler registered for a command.
+
+        The proxy imports the plugin module on first use (in a worker thread, so
+        heavy imports do not stall the event loop) and then forwards the call.
+        """
+        func_name = f"cmd_{command}"
+        file = f"{module_name.rsplit('.', 1)[-1]}.py"
+
+        async def proxy(update, context):
+            mode = self.command_modes.get(command)
+            if mode == "process":
+                digest = self.manifest.get(file, {}).get("hash", "")
+                return await run_in_process(command, module_name, digest, update, context)
+            module = sys.modules.get(module_name)
+            if module is None:
+                try:
+                    module = await asyncio.to_thread(importlib.import_module, module_name)
+                except Exception as e:
+                    Logger.error(f"Error loading plugin {module_name}: {e}")
+                    if update.effective_message:
+                        await update.effective_message.reply_text(f"⚠️ Failed to load plugin for /{command}: {e}")
+                    return
+                if module_name not in self.loaded_modules:
+                    self.loaded_modules.append(module_name)
+            if mode == "thread":
+                return await run_in_thread(getattr(module, func_name), update, context)
+            return await getattr(module, func_name)(update, context)
+
+        proxy.__name__ = proxy.__qualname__ = func_name
+        proxy.__doc__ = self.help_texts.get(command)
+        return proxy
+
+    def _plugin_files(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Lists the plugin files with their modification time and size.
+
+        Returns:
+            Dict[str, Tuple[int, int]]: A dictionary mapping file names to (mtime_ns, size).
+        """
+        files = {}
+        with os.scandir(self.plugin_folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(".py") and entry.name != "__init__.py" and entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return dict(sorted(files.items()))
+
+    def _scan_file(self, file: str, entry: Optional[Dict] = None) -> Tuple[Dict, bool]:
+        """
+        Reads a plugin file and returns its manifest entry.
+
+        Args:
+            file (str): The plugin file name.
+            entry (Dict, optional): The cached entry, reused when the file hash still matches.
+
+        Returns:
+            Tuple[Dict, bool]: The entry and whether the file content changed.
+        """
+        with open(os.path.join(self.plugin_folder, file), "rb") as f:
+            source = f.read()
+        digest = hashlib.sha256(source).hexdigest()
+        if entry and entry.get("hash") == digest and "execution" in entry:
+            return entry, False
+        text = source.decode("utf-8")
+        return {
+            "hash": digest,
+            "commands": self.scan_source(text),
+            "limits": self.scan_limits(text),
+            "background": self.scan_background(text),
+            "execution": self.scan_execution(text),
+        }, True
+
+    def _register(self, file: str, entry: Dict):
+        module_name = f"{self.plugin_folder}.{file[:-3]}"
+        for command, description in entry["commands"].items():
+            self.help_texts[command] = description
+            self.command_modules[command] = module_name
+            self.commands[command] = self._make_proxy(command, module_name)
+            if command in entry.get("limits", {}):
+                self.command_limits[command] = entry["limits"][command]
+            if command in entry.get("background", []):
+                self.background_commands.add(command)
+            if command in entry.get("execution", {}):
+                self.command_modes[command] = entry["execution"][command]
+
+    def _unregister(self, file: str):
+        module_name = f"{self.plugin_folder}.{file[:-3]}"
+        for command in [c for c, m in self.command_modules.items() if m == module_name]:
+            self.commands.pop(command, None)
+            self.help_texts.pop(command, None)
+            self.command_limits.pop(command, None)
+            self.background_commands.discard(command)
+            self.command_modes.pop(command, None)
+            del self.command_modules[command]
+
     def load_plugin(self):
         """
         Loads all plugins from the specified plugin folder, registering any commands found in them.
@@ -41,27 +272,26 @@ class PluginManager:
         load_count = 0
         error_count = 0
         
-        for file in filter(lambda f: f.endswith(".py") and f != "__init__.py", os.listdir(self.plugin_folder)):
+        manifest = self._read_manifest()
+        self.manifest = {}
+        self.file_stats = {}
+
+        for file, stat in self._plugin_files().items():
             module_name = f"{self.plugin_folder}.{file[:-3]}"
             try:
-                module = importlib.import_module(module_name)
+                entry, _ = self._scan_file(file, manifest.get(file))
+                self.manifest[file] = entry
+                self.file_stats[file] = stat
+                self._register(file, entry)
                 
-                if module_name not in self.loaded_modules:
-                    self.loaded_modules.append(module_name)
-
-                cmd_count = 0
-                for name, func in inspect.getmembers(module, inspect.iscoroutinefunction):
-                    if name.startswith("cmd_"):
-                        command = name[4:]  
-                        self.commands[command] = func
-                        self.help_texts[command] = (func.__doc__ or "No description").strip()
-                        cmd_count += 1
-                
-                if cmd_count > 0:
+                if entry["commands"]:
                     load_count += 1
             except Exception as e:
                 error_count += 1
                 Logger.error(f"Error loading plugin {module_name}: {e}")
+
+        if self.manifest != manifest:
+            self._write_manifest(self.manifest)
         
         # Log summary instead of individual plugin loads
         if load_count > 0:
@@ -69,14 +299,138 @@ class PluginManager:
         if error_count > 0:
             Logger.info(f"Failed to load {error_count} plugin(s)")
 
+    def attach(self, application, group: int = Setting.PLUGIN_HANDLER_GROUP):
+        """
+        Registers the plugin commands on an application in their own handler group.
+
+        The group is owned by the PluginManager: `refresh` and `reload` replace
+        its handler list in one assignment, so a reload never leaves the bot with
+        a half-registered set of commands.
+
+        Args:
+            application: The telegram Application to register the handlers on.
+            group (int): The handler group reserved for plugin commands.
+        """
+        self.application = application
+        self.handler_group = group
+        self._swap_handlers()
+
+    def _swap_handlers(self):
+        if self.application is None:
+            return
+        handlers = dict(self.application.handlers)
+        handlers[self.handler_group] = self.get_handlers()
+        # Replace the whole mapping rather than mutating it, so an update being
+        # dispatched keeps iterating over a consistent snapshot.
+        self.application.handlers = dict(sorted(handlers.items()))
+
+    def refresh(self) -> Dict[str, List[str]]:
+        """
+        Applies only what changed in the plugin folder since the last scan.
+
+        Files are compared by modification time and size first, and only the
+        ones that moved are hashed. Commands of added, changed and removed files
+        are updated and the handler group is swapped if anything changed.
+        Modules that were already imported are dropped (see `_unload`) and
+        imported again, in a worker thread, on their next use.
+
+        Returns:
+            Dict[str, List[str]]: The plugin files that were "added", "changed" and "removed".
+        """
+        files = self._plugin_files()
+        result = {"added": [], "changed": [], "removed": []}
+
+        for file in [f for f in self.file_stats if f not in files]:
+            self._unregister(file)
+            self._unload(f"{self.plugin_folder}.{file[:-3]}")
+            self.manifest.pop(file, None)
+            del self.file_stats[file]
+            result["removed"].append(file)
+
+        for file, stat in files.items():
+            if self.file_stats.get(file) == stat:
+                continue
+            module_name = f"{self.plugin_folder}.{file[:-3]}"
+            # Record the stat even on failure so a broken file is reported once,
+            # not on every poll; the previous commands stay registered.
+            self.file_stats[file] = stat
+            try:
+                entry, modified = self._scan_file(file, self.manifest.get(file))
+            except Exception as e:
+                Logger.error(f"Error loading plugin {module_name}: {e}")
+                continue
+
+            if not modified:
+                continue
+
+            is_new = file not in self.manifest
+            self._unregister(file)
+            self.manifest[file] = entry
+            self._register(file, entry)
+            result["added" if is_new else "changed"].append(file)
+
+            self._unload(module_name)
+
+        if any(result.values()):
+            importlib.invalidate_caches()
+            self._write_manifest(self.manifest)
+            self._swap_handlers()
+            Logger.info(
+                f"Plugins updated: {len(result['added'])} added, "
+                f"{len(result['changed'])} changed, {len(result['removed'])} removed"
+            )
+        return result
+
+    def _unload(self, module_name: str):
+        """
+        Forgets an imported plugin module so the next call imports it again.
+        A plugin that keeps running tasks releases them in a module-level
+        `on_unload()`, called here before the module is dropped.
+        """
+        if module_name in self.loaded_modules:
+            self.loaded_modules.remove(module_name)
+        module = sys.modules.pop(module_name, None)
+        hook = getattr(module, "on_unload", None)
+        if callable(hook):
+            try:
+                hook()
+            except Exception as e:
+                Logger.error(f"Error unloading module {module_name}: {e}")
+
+    async def watch(self, interval: float = Setting.PLUGIN_WATCH_INTERVAL):
+        """
+        Polls the plugin folder and applies changes as soon as they are seen.
+
+        A poll is a single `os.scandir` of the folder, so it is cheap enough to
+        run every second; files are only read when their mtime or size moved.
+
+        Args:
+            interval (float): Seconds between two polls.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self._plugin_files() != self.file_stats:
+                    self.refresh()
+            except Exception as e:
+                Logger.error(f"Error watching plugins: {e}")
+
     def get_handlers(self) -> List[CommandHandler]:
         """
         Returns a list of CommandHandler objects corresponding to the loaded commands.
+        Every handler is instrumented, see `utils.metrics.Metrics.instrument`, and
+        background commands are submitted as jobs, see `utils.jobs.JobManager.wrap`.
         
         Returns:
             List[CommandHandler]: A list of CommandHandler objects for each command.
         """
-        return [CommandHandler(cmd, func) for cmd, func in self.commands.items()]
+        handlers = []
+        for cmd, func in self.commands.items():
+            func = metrics.instrument(cmd, func)
+            if cmd in self.background_commands:
+                func = jobs.wrap(cmd, func)
+            handlers.append(CommandHandler(cmd, func))
+        return handlers
 
     def get_help(self) -> str:
         """
@@ -87,41 +441,39 @@ class PluginManager:
         """
         help_text = ["# Available Command:"]
         help_text.append("/help - Show this message")
-        help_text.append("/reload - Reload plugins")
+        help_text.append("/reload [-f] - Reload changed plugins (-f reloads all)")
+        help_text.append("/stats - Command and event loop statistics")
         help_text.append("/shutdown - Bot shutdown")
+        help_text.append("Send a document to save it on this host (caption: [-f] [path] [sha256=<hex>])")
         help_text.extend([f"/{cmd} - {desc.splitlines()[0]}" for cmd, desc in self.help_texts.items()])
         
         return "\n".join(help_text)
 
     def reload(self) -> int:
         """
-        Reloads all plugins, clearing the current commands and reloading the plugin folder.
+        Reloads all plugins, clearing the current commands and rescanning the plugin folder.
+        Imported modules are dropped and imported again, off the event loop, when next used.
         
         Returns:
             int: The number of commands loaded after reloading the plugins.
         """
         self.commands = {}
         self.help_texts = {}
+        self.command_modules = {}
+        self.command_limits = {}
+        self.background_commands = set()
+        self.command_modes = {}
         
-        reload_count = 0
-        error_count = 0
-        
-        for module_name in self.loaded_modules:
-            try:
-                if module_name in sys.modules:
-                    importlib.reload(sys.modules[module_name])
-                    reload_count += 1
-            except Exception as e:
-                error_count += 1
-                Logger.error(f"Error reloading module {module_name}: {e}")
-        
-        if reload_count > 0:
-            Logger.info(f"Reloaded {reload_count} module(s)")
+        unloaded = list(self.loaded_modules)
+        for module_name in unloaded:
+            self._unload(module_name)
         
-        self.loaded_modules = []
+        if unloaded:
+            Logger.info(f"Unloaded {len(unloaded)} module(s), they are imported again when used")
         
         importlib.invalidate_caches()
         
         self.load_plugin()
+        self._swap_handlers()
         
-        return len(self.commands)
\ No newline at end of file
+        return len(self.commands)
@@ -0,0 +1,428 @@
+import os
+import sys
+import queue
+import pickle
+import struct
+import asyncio
+import importlib
+import threading
+import contextvars
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import psutil
+import telegram
+from telegram import TelegramObject, Update
+
+from config.settings import Setting
+from utils.file_cache import file_cache
+from utils.logger import Logger
+
+MODES = ("loop", "thread", "process")
+
+HEADER = struct.Struct(">I")
+
+class PluginWorkerError(Exception):
+    """A plugin command failed inside a worker, or its worker died."""
+
+def export_value(value: Any) -> Any:
+    """Turns API results into plain data that can cross a thread or process boundary."""
+    if isinstance(value, TelegramObject):
+        return ("tg", type(value).__name__, value.to_dict())
+    if isinstance(value, (list, tuple)):
+        return [export_value(item) for item in value]
+    return value
+
+def import_value(value: Any, bot) -> Any:
+    """Rebuilds values made by `export_value`, bound to `bot`."""
+    if isinstance(value, tuple) and len(value) == 3 and value[0] == "tg":
+        return getattr(telegram, value[1]).de_json(value[2], bot)
+    if isinstance(value, list):
+        return [import_value(item, bot) for item in value]
+    return value
+
+class ForwardingBot:
+    """
+    Stands in for the bot inside a worker.
+
+    Every public method call, such as `send_message` made by
+    `Message.reply_text`, is handed to `forward` and executed by the real bot
+    in the main event loop. Returned messages are bound to this bot again, so
+    `(await message.reply_text(...)).edit_text(...)` works as usual.
+    """
+
+    defaults = None
+
+    def __init__(self, forward: Callable[[str, tuple, dict], Awaitable[Any]], bot_id: Optional[int] = None,
+                 username: Optional[str] = None):
+        self._forward = forward
+        self.id = bot_id
+        self.username = username
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def method(*args, **kwargs):
+            return import_value(await self._forward(name, args, kwargs), self)
+
+        method.__name__ = name
+        return method
+
+class WorkerContext:
+    """
+    The part of `CallbackContext` a plugin gets in a worker.
+
+    `args` and `bot` behave as usual; `user_data`, `chat_data` and `bot_data`
+    start empty and are not written back.
+    """
+
+    def __init__(self, args: List[str], bot: ForwardingBot):
+        self.args = args
+        self.bot = bot
+        self.user_data: Dict = {}
+        self.chat_data: Dict = {}
+        self.bot_data: Dict = {}
+
+async def _call_bot(bot, method: str, args: tuple, kwargs: dict) -> Any:
+    if method.startswith("_"):
+        raise AttributeError(method)
+    return export_value(await getattr(bot, method)(*args, **kwargs))
+
+class ThreadRunner:
+    """
+    Runs plugin commands on a private event loop in a pool thread.
+
+    Blocking calls in the plugin then only hold up that thread. Bot calls are
+    scheduled on the main loop with the caller's context, so metrics and job
+    output are still attributed to the command.
+    """
+
+    def __init__(self, workers: int = Setting.PLUGIN_THREADS):
+        self.pool = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="plugin")
+
+    async def run(self, func: Callable, update: Update, context) -> Any:
+        main_loop = asyncio.get_running_loop()
+        bot = context.bot
+
+        async def forward(method: str, args: tuple, kwargs: dict):
+            future = asyncio.run_coroutine_threadsafe(_call_bot(bot, method, args, kwargs), main_loop)
+            return await asyncio.wrap_future(future)
+
+        proxy = ForwardingBot(forward, bot.id, bot.username)
+        worker_update = Update.de_json(update.to_dict(), proxy)
+        worker_context = WorkerContext(list(context.args or []), proxy)
+        started = threading.Event()
+        state = {}
+
+        def run_in_thread():
+            loop = asyncio.new_event_loop()
+            try:
+                state["loop"] = loop
+                state["task"] = loop.create_task(func(worker_update, worker_context))
+                started.set()
+                return loop.run_until_complete(state["task"])
+            finally:
+                loop.close()
+
+        # copy_context() carries the command and job ids into the thread.
+        future = main_loop.run_in_executor(self.pool, contextvars.copy_context().run, run_in_thread)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if started.is_set():
+                state["loop"].call_soon_threadsafe(state["task"].cancel)
+            raise
+
+def _write_frame(stream, message: Any):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(HEADER.pack(len(data)) + data)
+
+def _portable(value: Any, kwargs: dict, key: Optional[str] = None) -> Any:
+    """Reads file objects passed to the bot into bytes, keeping their name as `filename`."""
+    if hasattr(value, "read"):
+        name = getattr(value, "name", None)
+        if key is not None and isinstance(name, str) and "filename" not in kwargs:
+            kwargs["filename"] = os.path.basename(name)
+        return value.read()
+    return value
+
+class _Worker:
+    """A worker process and its framed pickle channel over stdin/stdout."""
+
+    def __init__(self):
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.killed = False
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "manager.plugin_workers",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+        )
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None and not self.killed
+
+    async def send(self, message: Any):
+        _write_frame(self.process.stdin, message)
+        await self.process.stdin.drain()
+
+    async def recv(self) -> Any:
+        size, = HEADER.unpack(await self.process.stdout.readexactly(HEADER.size))
+        return pickle.loads(await self.process.stdout.readexactly(size))
+
+    def rss(self) -> int:
+        try:
+            return psutil.Process(self.process.pid).memory_info().rss
+        except psutil.Error:
+            return 0
+
+    def kill(self):
+        if self.alive:
+            self.killed = True
+            self.process.kill()
+
+class ProcessPool:
+    """
+    Runs plugin commands in a pool of worker processes.
+
+    Workers are started on demand, up to `Setting.PLUGIN_PROCESSES` (one per
+    core by default), and each runs one command at a time, so CPU-bound
+    plugins spread across cores. A plugin crash only kills its worker. A
+    worker that dies, whose command is cancelled, or whose memory goes over
+    `Setting.PLUGIN_WORKER_MAX_RSS` is killed and replaced on the next call.
+    The update and the arguments travel as plain data; bot calls and
+    file_id cache changes come back over the same pipe and are applied by
+    the bot process.
+    """
+
+    def __init__(self, size: int = Setting.PLUGIN_PROCESSES):
+        self.size = max(size, 1)
+        self.idle: List[_Worker] = []
+        self.started = 0
+        self._available: Optional[asyncio.Condition] = None
+
+    async def _acquire(self) -> _Worker:
+        if self._available is None:
+            self._available = asyncio.Condition()
+        async with self._available:
+            while not self.idle and self.started >= self.size:
+                await self._available.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.started += 1
+        worker = _Worker()
+        try:
+            await worker.start()
+        except Exception:
+            await self._release(worker)
+            raise
+        return worker
+
+    async def _release(self, worker: _Worker):
+        async with self._available:
+            if worker.alive:
+                self.idle.append(worker)
+            else:
+                self.started -= 1
+            self._available.notify()
+
+    async def _watch_memory(self, worker: _Worker, command: str):
+        while True:
+            await asyncio.sleep(1)
+            rss = worker.rss()
+            if rss > Setting.PLUGIN_WORKER_MAX_RSS:
+                Logger.warning("Plugin worker for /%s uses %d bytes, restarting it", command, rss, command=command)
+                worker.kill()
+                return
+
+    async def run(self, command: str, module_name: str, func_name: str, digest: str, update: Update, context) -> Any:
+        bot = context.bot
+        worker = await self._acquire()
+        watcher = None
+        error = None
+        try:
+            if Setting.PLUGIN_WORKER_MAX_RSS > 0:
+                watcher = asyncio.ensure_future(self._watch_memory(worker, command))
+            await worker.send(("run", module_name, func_name, digest, update.to_dict(),
+                               list(context.args or []), bot.id, bot.username))
+            while True:
+                try:
+                    message = await worker.recv()
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    await worker.process.wait()
+                    raise PluginWorkerError(
+                        f"Plugin worker for /{command} died (exit code {worker.process.returncode})"
+                    ) from None
+                if message[0] == "call":
+                    asyncio.ensure_future(self._serve_call(worker, bot, *message[1:]))
+                elif message[0] == "cache" and message[1] in ("put", "discard"):
+                    # A file_id the worker learned, kept and saved by the bot process.
+                    getattr(file_cache, message[1])(*message[2])
+                elif message[0] == "done":
+                    error = None if message[1] else message[2]
+                    break
+        except BaseException:
+            worker.kill()
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if worker.alive and Setting.PLUGIN_WORKER_MAX_RSS > 0 and worker.rss() > Setting.PLUGIN_WORKER_MAX_RSS:
+                worker.kill()
+            await self._release(worker)
+        if error is not None:
+            raise PluginWorkerError(error)
+
+    async def _serve_call(self, worker: _Worker, bot, call_id: int, method: str, args: tuple, kwargs: dict):
+        try:
+            reply = ("reply", call_id, True, await _call_bot(bot, method, args, kwargs))
+        except Exception as e:
+            reply = ("reply", call_id, False, e)
+        try:
+            try:
+                await worker.send(reply)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                await worker.send(("reply", call_id, False, PluginWorkerError(str(reply[3]))))
+        except (ConnectionError, AttributeError):
+            pass
+
+    def close(self):
+        for worker in self.idle:
+            worker.kill()
+        self.idle.clear()
+
+_thread_runner: Optional[ThreadRunner] = None
+_process_pool: Optional[ProcessPool] = None
+
+async def run_in_thread(func: Callable, update: Update, context) -> Any:
+    """Runs a plugin command on the plugin thread pool, see `ThreadRunner`."""
+    global _thread_runner
+    if _thread_runner is None:
+        _thread_runner = ThreadRunner()
+    return await _thread_runner.run(func, update, context)
+
+async def run_in_process(command: str, module_name: str, digest: str, update: Update, context) -> Any:
+    """
+    Runs a plugin command in a worker process, see `ProcessPool`.
+
+    Args:
+        command (str): The command name.
+        module_name (str): The plugin module, imported by the worker.
+        digest (str): Hash of the plugin source; a worker re-imports the module when it changes.
+        update (Update): The incoming update.
+        context: The callback context.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPool()
+    return await _process_pool.run(command, module_name, f"cmd_{command}", digest, update, context)
+
+def shutdown_workers():
+    """Stops idle worker processes and the plugin thread pool."""
+    if _process_pool is not None:
+        _process_pool.close()
+    if _thread_runner is not None:
+        _thread_runner.pool.shutdown(wait=False, cancel_futures=True)
+
+class _WorkerChannel:
+    """
+    The worker end of the pipe. A reader thread routes replies to the command
+    running on the worker loop and queues the next requests.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.requests: "queue.Queue" = queue.Queue()
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def serve(self):
+        try:
+            while True:
+                header = self.reader.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                size, = HEADER.unpack(header)
+                message = pickle.loads(self.reader.read(size))
+                if message[0] == "reply" and self.loop is not None:
+                    self.loop.call_soon_threadsafe(self._resolve, *message[1:])
+                elif message[0] == "run":
+                    self.requests.put(message[1:])
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        # The parent went away; nothing is left to answer to.
+        os._exit(0)
+
+    def write(self, message: Any):
+        with self.lock:
+            _write_frame(self.writer, message)
+            self.writer.flush()
+
+    async def forward(self, method: str, args: tuple, kwargs: dict) -> Any:
+        self.calls += 1
+        call_id = self.calls
+        kwargs = dict(kwargs)
+        kwargs = {key: _portable(value, kwargs, key) for key, value in list(kwargs.items())}
+        args = tuple(_portable(value, kwargs) for value in args)
+        future = self.loop.create_future()
+        self.pending[call_id] = future
+        self.write(("call", call_id, method, args, kwargs))
+        return await future
+
+    def cache_update(self, method: str, args: tuple):
+        """Hands a file_id cache change to the bot process; nothing is answered."""
+        self.write(("cache", method, args))
+
+    def _resolve(self, call_id: int, ok: bool, value: Any):
+        future = self.pending.pop(call_id, None)
+        if future is not None and not future.done():
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+async def _run_command(channel: _WorkerChannel, module_name: str, func_name: str, update_data: Dict,
+                       args: List[str], bot_id: int, username: str):
+    bot = ForwardingBot(channel.forward, bot_id, username)
+    module = importlib.import_module(module_name)
+    await getattr(module, func_name)(Update.de_json(update_data, bot), WorkerContext(args, bot))
+
+def worker_main():
+    """Entry point of a worker process: runs one command at a time for the parent."""
+    # The pipe owns the real stdout; anything a plugin prints goes to stderr.
+    writer = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    channel = _WorkerChannel(sys.stdin.buffer, writer)
+    # The bot process owns the file_id cache on disk; a worker reads it and
+    # sends its changes there, so they outlive the worker.
+    file_cache.persist = False
+    file_cache.forward = channel.cache_update
+    threading.Thread(target=channel.serve, name="plugin-pipe", daemon=True).start()
+    digests: Dict[str, str] = {}
+
+    while True:
+        module_name, func_name, digest, update_data, args, bot_id, username = channel.requests.get()
+        if module_name in sys.modules and digests.get(module_name) != digest:
+            importlib.reload(sys.modules[module_name])
+        digests[module_name] = digest
+
+        loop = asyncio.new_event_loop()
+        channel.loop = loop
+        try:
+            loop.run_until_complete(_run_command(channel, module_name, func_name, update_data, args, bot_id, username))
+            channel.write(("done", True, None))
+        except Exception as e:
+            channel.write(("done", False, "".join(traceback.format_exception(type(e), e, e.__traceback__)).strip()))
+        finally:
+            channel.loop = None
+            channel.pending.clear()
+            loop.close()
+
+if __name__ == "__main__":
+    worker_main()
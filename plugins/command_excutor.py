@@ -20,23 +20,277 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
-import subprocess
+import asyncio
+import html
+import math
+import re
+import time
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from config.settings import Setting
+from utils.logger import Logger
+from utils.outbound import COALESCE
+from utils.fleet import fleet
+from utils.output_store import OutputStore, output_store
+from utils.process import CommandResult, run_command
+from utils.shell_session import ShellSessionError, shell_sessions
+
+# Commands that run as background jobs when called with a trailing `&`, read by PluginManager.
+BACKGROUND = ["cmd"]
+
+# Telegram caps a message at 4096 characters; leave room for the status line.
+TAIL_CHARS = 3500
+
+USAGE = "Usage: /cmd [-t seconds] [@host,pattern*] [command]"
+
+class _LiveOutput:
+    """
+    Mirrors the output of a running command into a single Telegram message.
+
+    Chunks are buffered and the message is edited at most once every
+    `Setting.CMD_EDIT_INTERVAL` seconds, so a chatty command costs a bounded
+    number of API calls no matter how fast it writes.
+    """
+
+    def __init__(self, message, command: str):
+        self.message = message
+        self.command = command
+        self.tail = ""
+        self._shown = None
+        self._last_edit = 0.0
+        self._closed = False
+        self._pending = None
+        self._lock = asyncio.Lock()
+
+    def feed(self, chunk: str):
+        self.tail = (self.tail + chunk)[-TAIL_CHARS:]
+        if self._pending is None and not self._closed:
+            self._pending = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        loop = asyncio.get_running_loop()
+        delay = self._last_edit + Setting.CMD_EDIT_INTERVAL - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._pending = None
+        if not self._closed:
+            await self._edit(self._render(self.tail, "⏳ Running..."))
+
+    async def _edit(self, text: str):
+        async with self._lock:
+            if text == self._shown:
+                return
+            self._last_edit = asyncio.get_running_loop().time()
+            try:
+                await self.message.edit_text(text, parse_mode="HTML")
+                self._shown = text
+            except Exception as e:
+                Logger.debug("Failed to update output of '%s': %s", self.command, e)
+
+    def _render(self, output: str, status: str) -> str:
+        if len(output) > TAIL_CHARS:
+            output = "...\n" + output[-TAIL_CHARS:]
+        return f"<pre>{html.escape(output or '(no output)')}</pre>\n{status}"
+
+    async def finish(self, result: CommandResult):
+        """
+        Shows the final output. Output longer than a message is stored and
+        paged from its last page; past `Setting.OUTPUT_FILE_THRESHOLD`
+        characters it is sent as a file as well.
+        """
+        self._closed = True
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+        if len(result.output) <= TAIL_CHARS:
+            await self._edit(self._render(result.output, _status(result)))
+            return
+
+        title = f"<code>{html.escape(self.command[:200])}</code>: {_status(result)}"
+        entry = await asyncio.to_thread(OutputStore.build, result.output, title)
+        async with self._lock:
+            try:
+                await output_store.show(self.message, entry, entry.pages)
+            except Exception as e:
+                Logger.debug("Failed to show output of '%s': %s", self.command, e)
+        if Setting.OUTPUT_FILE_THRESHOLD and len(result.output) >= Setting.OUTPUT_FILE_THRESHOLD:
+            await output_store.send_file(self.message.get_bot(), self.message.chat_id, entry, self.message.message_id)
+
+def _status(result: CommandResult) -> str:
+    if result.timed_out:
+        status = "⏱ Timed out, process killed"
+    elif result.returncode == 0:
+        status = "✅ Exit code 0"
+    else:
+        status = f"❌ Exit code {result.returncode}"
+    if result.truncated:
+        status += " (output truncated)"
+    return status
+
+def _render_fleet(results: dict, unmatched: list) -> str:
+    """Groups hosts that produced identical results so each output is shown once."""
+    groups = {}
+    for name, result in results.items():
+        if isinstance(result, CommandResult):
+            key = (_status(result), result.output)
+        else:
+            key = (f"⚠️ {result}", None)
+        groups.setdefault(key, []).append(name)
+
+    budget = TAIL_CHARS // max(len(groups), 1)
+    parts = []
+    for (status, output), names in sorted(groups.items(), key=lambda item: -len(item[1])):
+        part = f"<b>{html.escape(', '.join(names))}</b>: {status}"
+        if output is not None:
+            if len(output) > budget:
+                output = "...\n" + output[-budget:]
+            part += f"\n<pre>{html.escape(output or '(no output)')}</pre>"
+        parts.append(part)
+    if unmatched:
+        parts.append(f"No connected host matches: {html.escape(', '.join(unmatched))}")
+    return "\n".join(parts)
+
+async def _cmd_fleet(update: Update, targets: str, command: str, timeout):
+    names, unmatched = fleet.match([t for t in targets.split(",") if t])
+    if not names:
+        await update.message.reply_text(f"No connected host matches {targets}")
+        return
+    message = await update.message.reply_text(f"⏳ Running on {len(names)} host(s)...")
+    results = await fleet.run(names, command, timeout)
+    await message.edit_text(_render_fleet(results, unmatched), parse_mode="HTML")
+
 async def cmd_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Execute a system command"""
-    if not context.args:
-        await update.message.reply_text("Usage: /cmd [command]")
+    """Execute a system command, here or on agents (`/cmd @web*,db1 uptime`)"""
+    args = list(context.args or [])
+    timeout = None
+    if len(args) >= 2 and args[0] == "-t":
+        try:
+            timeout = float(args[1])
+        except ValueError:
+            timeout = None
+        if timeout is None or not math.isfinite(timeout) or timeout <= 0:
+            await update.message.reply_text(USAGE)
+            return
+        args = args[2:]
+
+    targets = None
+    if args and args[0].startswith("@"):
+        targets = args.pop(0)[1:]
+
+    if not args or targets == "":
+        await update.message.reply_text(USAGE)
         return
 
-    command = " ".join(context.args)
+    command = " ".join(args)
 
     try:
-        result = subprocess.run(command, shell=True, text=True, capture_output=True)
-
-        output = result.stderr if result.returncode != 0 else result.stdout
-        await update.message.reply_text(f"```\n{output}\n```", parse_mode="Markdown")
+        if targets is not None:
+            await _cmd_fleet(update, targets, command, timeout)
+            return
+        chat_id = update.effective_chat.id
+        if chat_id in shell_sessions.enabled:
+            session, started = await shell_sessions.get(chat_id)
+            message = await update.message.reply_text("🐚 New shell session\n⏳ Running..." if started else "⏳ Running...")
+            live = _LiveOutput(message, command)
+            result = await session.run(command, on_output=live.feed, timeout=timeout)
+        else:
+            message = await update.message.reply_text("⏳ Running...")
+            live = _LiveOutput(message, command)
+            result = await run_command(command, on_output=live.feed, timeout=timeout)
+        await live.finish(result)
 
     except Exception as e:
-        await update.message.reply_text(f"⚠️ An error occurred while executing the command: {str(e)}")
+        await update.message.reply_text(
+            f"⚠️ An error occurred while executing the command: {str(e)}", rate_limit_args=COALESCE
+        )
+
+async def cmd_shell(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Keep a shell per chat for /cmd: /shell on|off (cwd and variables carry over)"""
+    args = context.args or []
+    chat_id = update.effective_chat.id
+    action = args[0].lower() if args else ""
+    try:
+        if action == "on":
+            shell_sessions.enable(chat_id)
+            await update.message.reply_text(
+                f"🐚 /cmd now runs in a shell kept for this chat (closed after {Setting.SHELL_IDLE_TIMEOUT:.0f}s idle)"
+            )
+        elif action == "off":
+            await shell_sessions.disable(chat_id)
+            await update.message.reply_text("/cmd now starts a new shell for every command")
+        elif not args:
+            session = shell_sessions.sessions.get(chat_id)
+            if chat_id not in shell_sessions.enabled:
+                status = "off"
+            elif session is None or not session.alive:
+                status = "on, a shell starts with the next /cmd"
+            else:
+                status = f"on, shell up {int(time.time() - session.started)}s"
+            await update.message.reply_text(
+                f"Shell session: {status} ({len(shell_sessions.sessions)}/{Setting.SHELL_MAX_SESSIONS} in use)"
+            )
+        else:
+            await update.message.reply_text("Usage: /shell [on|off]")
+    except ShellSessionError as e:
+        await update.message.reply_text(f"⚠️ {e}")
+
+def _stored_output(update: Update):
+    reply = update.message.reply_to_message
+    if reply is None:
+        return None
+    return output_store.get(reply.chat_id, reply.message_id)
+
+async def cmd_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Jump to a page of a long /cmd output (reply to it)"""
+    args = context.args or []
+    if len(args) != 1 or not args[0].isdigit():
+        await update.message.reply_text("Usage: reply to a /cmd output with /page N")
+        return
+    entry = _stored_output(update)
+    if entry is None:
+        await update.message.reply_text("Reply to a long /cmd output that is still stored")
+        return
+    await output_store.show(update.message.reply_to_message, entry, int(args[0]))
+
+def _grep(text: str, pattern: str) -> str:
+    try:
+        regex = re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        regex = re.compile(re.escape(pattern), re.IGNORECASE)
+    return "".join(line for line in text.splitlines(keepends=True) if regex.search(line))
+
+async def cmd_grep(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the lines of a /cmd output that match a pattern (reply to it)"""
+    pattern = " ".join(context.args or [])
+    if not pattern:
+        await update.message.reply_text("Usage: reply to a /cmd output with /grep pattern")
+        return
+    entry = _stored_output(update)
+    if entry is None:
+        reply = update.message.reply_to_message
+        text = (reply.text or "") if reply is not None else ""
+        if not text:
+            await update.message.reply_text("Reply to a /cmd output")
+            return
+        title = "Output"
+    else:
+        text, title = output_store.text(entry), entry.title
+
+    matches = await asyncio.to_thread(_grep, text, pattern)
+    count = len(matches.splitlines())
+    title = f"{title}\n🔎 {count} line{'s' if count != 1 else ''} matching <code>{html.escape(pattern)}</code>"
+    await output_store.reply(update.message, await asyncio.to_thread(OutputStore.build, matches, title))
+
+async def cmd_hosts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List the agents connected for /cmd @host"""
+    if not fleet.agents:
+        await update.message.reply_text("No agents connected")
+        return
+    now = time.time()
+    lines = [
+        f"{html.escape(agent.name)} ({html.escape(agent.address)}, up {int(now - agent.connected)}s)"
+        for agent in sorted(fleet.agents.values(), key=lambda agent: agent.name)
+    ]
+    await update.message.reply_text("\n".join(lines), parse_mode="HTML")
@@ -20,28 +20,193 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+import asyncio
+import html
 import os
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from config.settings import Setting
+from utils.archive import DirectoryArchive
+from utils.logger import Logger
+from utils.outbound import COALESCE
+from utils.path_index import path_index
+from utils.upload import upload_directory, upload_file
+
+# Commands that run as background jobs when called with a trailing `&`, read by PluginManager.
+BACKGROUND = ["uploadfile", "uploaddir"]
+
 async def cmd_uploadfile(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Upload a file"""
-    if not context.args:
-        await update.message.reply_text("Usage: `/uploadfile /path/to/file`")
+    """Upload a file (use -z to compress, large files are split into parts)"""
+    args = list(context.args or [])
+    compress = bool(args) and args[0] == "-z"
+    if compress:
+        args = args[1:]
+
+    if not args:
+        await update.message.reply_text("Usage: `/uploadfile [-z] /path/to/file`")
         return
 
-    file_path = " ".join(context.args)
+    file_path = " ".join(args)
 
-    if not os.path.exists(file_path):
-        await update.message.reply_text(f"⚠️ File not found: {file_path}")
+    if not os.path.isfile(file_path):
+        await update.message.reply_text(f"⚠️ File not found: {file_path}", rate_limit_args=COALESCE)
         return
 
     try:
-        with open(file_path, 'rb') as file:
-            await context.bot.send_document(
-                chat_id=update.effective_chat.id,
-                document=file,
-                filename=os.path.basename(file_path)
+        size = os.path.getsize(file_path)
+        if size == 0:
+            await update.message.reply_text(f"⚠️ File is empty: {file_path}", rate_limit_args=COALESCE)
+            return
+        if size > Setting.UPLOAD_PART_SIZE:
+            parts = -(-size // Setting.UPLOAD_PART_SIZE)
+            await update.message.reply_text(
+                f"📦 Sending {os.path.basename(file_path)} in {parts} parts...", rate_limit_args=COALESCE
             )
+
+        await upload_file(context.bot, update.effective_chat.id, file_path, compress=compress)
+    except Exception as e:
+        await update.message.reply_text(
+            f"⚠️ An error occurred while uploading the file: {str(e)}", rate_limit_args=COALESCE
+        )
+
+def _size(value: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if value < 1024 or unit == "TiB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+
+def _archive_progress(archive: DirectoryArchive) -> str:
+    percent = 100 * archive.bytes_done / archive.bytes_total if archive.bytes_total else 100
+    return (
+        f"📦 {archive.name}.tar.gz: {archive.files_done}/{archive.files_total} entries, "
+        f"{_size(archive.bytes_done)}/{_size(archive.bytes_total)} ({percent:.0f}%)"
+    )
+
+async def _report_progress(message, archive: DirectoryArchive):
+    shown = None
+    while True:
+        await asyncio.sleep(Setting.CMD_EDIT_INTERVAL)
+        text = _archive_progress(archive)
+        if text != shown:
+            try:
+                await message.edit_text(text)
+                shown = text
+            except Exception as e:
+                Logger.debug("Failed to update progress of %s: %s", archive.root, e)
+
+async def cmd_uploaddir(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Upload a directory as .tar.gz: /uploaddir [-i glob]... [-x glob]... /path"""
+    args = list(context.args or [])
+    include, exclude = [], []
+    while len(args) >= 2 and args[0] in ("-i", "-x"):
+        (include if args[0] == "-i" else exclude).append(args[1])
+        del args[:2]
+
+    if not args:
+        await update.message.reply_text("Usage: /uploaddir [-i glob]... [-x glob]... /path/to/dir")
+        return
+
+    dir_path = " ".join(args)
+    if not os.path.isdir(dir_path):
+        await update.message.reply_text(f"⚠️ Directory not found: {dir_path}", rate_limit_args=COALESCE)
+        return
+
+    archive = DirectoryArchive(dir_path, include, exclude)
+    try:
+        members = await asyncio.to_thread(archive.scan)
+    except Exception as e:
+        await update.message.reply_text(f"⚠️ Could not read {dir_path}: {str(e)}", rate_limit_args=COALESCE)
+        return
+    if not members:
+        reason = f"Could not read {archive.skipped[0]}" if archive.skipped else f"No files to send in {dir_path}"
+        await update.message.reply_text(f"⚠️ {reason}", rate_limit_args=COALESCE)
+        return
+
+    message = await update.message.reply_text(_archive_progress(archive))
+    progress = asyncio.ensure_future(_report_progress(message, archive))
+    try:
+        parts = await upload_directory(context.bot, update.effective_chat.id, archive, members)
+    except Exception as e:
+        status = f"⚠️ An error occurred while uploading the directory: {str(e)}"
+    else:
+        status = f"✅ Sent {archive.name}.tar.gz" + (f" in {parts} parts" if parts > 1 else "")
+    finally:
+        progress.cancel()
+
+    text = f"{_archive_progress(archive)}\n{status}"
+    if archive.skipped:
+        names = "\n".join(archive.skipped[:20])
+        more = f"\n... and {len(archive.skipped) - 20} more" if len(archive.skipped) > 20 else ""
+        text += f"\n⚠️ Skipped {len(archive.skipped)} unreadable path(s):\n{names}{more}"
+    try:
+        await message.edit_text(text[:4000])
     except Exception as e:
-        await update.message.reply_text(f"⚠️ An error occurred while uploading the file: {str(e)}")
+        Logger.debug("Failed to update progress of %s: %s", archive.root, e)
+
+def _page_arg(args: list):
+    """Pops a leading `-p N` and returns the page number (1-based), or None if it is invalid."""
+    if len(args) >= 2 and args[0] == "-p":
+        if not args[1].isdigit() or int(args[1]) < 1:
+            return None
+        page = int(args[1])
+        del args[:2]
+        return page
+    return 1
+
+def _render_page(title: str, lines: list, page: int, total: int) -> str:
+    pages = max(-(-total // Setting.INDEX_PAGE_SIZE), 1)
+    text = f"{title} (page {page}/{pages})"
+    body = "\n".join(lines)
+    if len(body) > 3800:
+        body = body[:3800] + "\n..."
+    if body:
+        text += f"\n<pre>{html.escape(body)}</pre>"
+    if path_index.roots and not path_index.ready:
+        text += "\n⏳ Index still building, results may be incomplete"
+    return text
+
+async def cmd_find(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Find files by name or glob from the path index: /find [-p page] pattern [dir]"""
+    args = list(context.args or [])
+    page = _page_arg(args)
+    if page is None or not args:
+        await update.message.reply_text("Usage: /find [-p page] pattern [dir]")
+        return
+    if not path_index.roots:
+        await update.message.reply_text("⚠️ The path index is disabled (INDEX_ROOTS is empty)")
+        return
+
+    pattern, under = args[0], " ".join(args[1:]) or None
+    size = Setting.INDEX_PAGE_SIZE
+    paths, total = await asyncio.to_thread(path_index.search, pattern, under, (page - 1) * size, size)
+    title = f"🔎 {total} match{'es' if total != 1 else ''} for {html.escape(pattern)}"
+    await update.message.reply_text(_render_page(title, paths, page, total), parse_mode="HTML")
+
+def _scan_listing(path: str) -> list:
+    with os.scandir(path) as it:
+        names = [entry.name + "/" if entry.is_dir() else entry.name for entry in it]
+    return sorted(names, key=lambda name: (not name.endswith("/"), name.lower()))
+
+async def cmd_ls(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List a directory: /ls [-p page] [dir]"""
+    args = list(context.args or [])
+    page = _page_arg(args)
+    if page is None:
+        await update.message.reply_text("Usage: /ls [-p page] [dir]")
+        return
+
+    path = os.path.abspath(" ".join(args) or os.getcwd())
+    try:
+        names = await asyncio.to_thread(path_index.listdir, path)
+        if names is None:
+            names = await asyncio.to_thread(_scan_listing, path)
+    except OSError as e:
+        await update.message.reply_text(f"⚠️ Cannot list {path}: {e.strerror}", rate_limit_args=COALESCE)
+        return
+
+    size = Setting.INDEX_PAGE_SIZE
+    title = f"📁 {html.escape(path)}: {len(names)} entries"
+    await update.message.reply_text(
+        _render_page(title, names[(page - 1) * size:page * size], page, len(names)), parse_mode="HTML"
+    )
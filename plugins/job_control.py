@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import html
+import json
+from datetime import datetime
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from utils.jobs import RUNNING, QUEUED, jobs
+
+# Room left for the job header in a 4096 character message.
+OUTPUT_CHARS = 3000
+MAX_FILES = 10
+
+STATUS_ICONS = {
+    "queued": "🕓", "running": "⏳", "done": "✅", "failed": "❌", "cancelled": "🛑", "interrupted": "⚠️",
+}
+
+def _describe(job) -> str:
+    line = f"{STATUS_ICONS.get(job.status, '')} #{job.id} /{job.command} {' '.join(job.args)}".rstrip()
+    if job.duration is not None:
+        line += f" ({job.duration:.1f}s)"
+    return line
+
+async def _own_job(update: Update, context: ContextTypes.DEFAULT_TYPE, usage: str):
+    """The job named in the arguments, if it belongs to this chat."""
+    try:
+        job_id = int(context.args[0].lstrip("#"))
+    except (IndexError, TypeError, ValueError):
+        await update.message.reply_text(usage)
+        return None
+    job = await jobs.get(job_id)
+    if job is None or job.chat_id != update.effective_chat.id:
+        await update.message.reply_text(f"⚠️ Job #{job_id} not found.")
+        return None
+    return job
+
+async def cmd_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List the latest background jobs of this chat"""
+    recent = await jobs.list(update.effective_chat.id)
+    if not recent:
+        await update.message.reply_text("No jobs yet.")
+        return
+    await update.message.reply_text("\n".join(_describe(job) for job in recent))
+
+async def cmd_job(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the status and output of a background job"""
+    job = await _own_job(update, context, "Usage: /job <id>")
+    if job is None:
+        return
+
+    started = datetime.fromtimestamp(job.created).strftime("%Y-%m-%d %H:%M:%S")
+    lines = [html.escape(_describe(job)), f"Submitted {started}"]
+    if job.error:
+        lines.append(f"Error: {html.escape(job.error)}")
+
+    texts, files = [], []
+    for kind, content in await jobs.output(job.id):
+        if kind == "text":
+            texts.append(content)
+        else:
+            files.append((kind, json.loads(content)))
+
+    output = "\n".join(texts)
+    if len(output) > OUTPUT_CHARS:
+        output = "...\n" + output[-OUTPUT_CHARS:]
+    if output:
+        lines.append(f"<pre>{html.escape(output)}</pre>")
+    await update.message.reply_text("\n".join(lines), parse_mode="HTML")
+
+    # Files were already uploaded once, resending them by file_id is free.
+    chat_id = update.effective_chat.id
+    for kind, file in files[:MAX_FILES]:
+        if kind == "photo":
+            await context.bot.send_photo(chat_id=chat_id, photo=file["file_id"])
+        else:
+            await context.bot.send_document(chat_id=chat_id, document=file["file_id"])
+
+async def cmd_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Cancel a queued or running background job"""
+    job = await _own_job(update, context, "Usage: /cancel <id>")
+    if job is None:
+        return
+    if job.status not in (QUEUED, RUNNING) or not jobs.cancel(job.id):
+        await update.message.reply_text(f"Job #{job.id} is not running ({job.status}).")
+        return
+    await update.message.reply_text(f"🛑 Cancelling job #{job.id}.")
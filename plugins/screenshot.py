@@ -20,27 +20,330 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+import asyncio
+import hashlib
+import sys
 import pyautogui
+from dataclasses import dataclass
 from datetime import datetime
 from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+from PIL import ImageChops
 from telegram import Update
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
+from config.settings import Setting
+from utils.file_cache import file_cache
+from utils.logger import Logger
+from utils.outbound import COALESCE
+
+USAGE = (
+    "Usage: `/screenshot [-f png|jpeg|webp] [-q quality] [-m max_size] "
+    "[-s monitor] [-r x,y,w,h] [-p|-d]`"
+)
+
+# Telegram rejects photos above these limits, they are sent as documents instead.
+PHOTO_MAX_BYTES = 10 * 1024 * 1024
+PHOTO_MAX_SIDES = 10000
+
+WATCH_USAGE = "Usage: `/watch [interval] [-t threshold%] [-c] [screenshot options]`"
+
+# Change detection works on a grayscale copy about this wide; a pixel counts
+# as changed when its brightness moves by more than PIXEL_DELTA.
+SAMPLE_WIDTH = 160
+PIXEL_DELTA = 24
+CHANGED_LUT = [255 if value > PIXEL_DELTA else 0 for value in range(256)]
+
+FORMATS = {"png": "PNG", "jpg": "JPEG", "jpeg": "JPEG", "webp": "WEBP"}
+
+# Commands allowed to run at the same time, read by PluginManager.
+CONCURRENCY = {"screenshot": 1}
+
+# Capture and encoding run in a worker process, read by PluginManager. /watch
+# and /unwatch stay in the event loop: their tasks outlive the command.
+EXECUTION = {"screenshot": "process"}
+
+@dataclass
+class ShotOptions:
+    """Capture and encoding options for a single screenshot."""
+    format: str = Setting.SCREENSHOT_FORMAT
+    quality: int = Setting.SCREENSHOT_QUALITY
+    max_dim: int = Setting.SCREENSHOT_MAX_DIM
+    monitor: Optional[int] = None
+    region: Optional[Tuple[int, int, int, int]] = None
+    as_photo: bool = Setting.SCREENSHOT_AS_PHOTO
+
+def _parse_options(args: List[str]) -> ShotOptions:
+    """Parse /screenshot arguments, raising ValueError on anything unknown."""
+    options = ShotOptions()
+    args = list(args)
+    while args:
+        flag = args.pop(0)
+        if flag == "-p":
+            options.as_photo = True
+        elif flag == "-d":
+            options.as_photo = False
+        elif flag in ("-f", "-q", "-m", "-s", "-r") and args:
+            value = args.pop(0)
+            if flag == "-f":
+                if value.lower() not in FORMATS:
+                    raise ValueError(f"unknown format {value}")
+                options.format = value.lower()
+            elif flag == "-q":
+                options.quality = max(1, min(100, int(value)))
+            elif flag == "-m":
+                options.max_dim = int(value)
+            elif flag == "-s":
+                options.monitor = int(value)
+            else:
+                x, y, w, h = (int(v) for v in value.split(","))
+                options.region = (x, y, w, h)
+        else:
+            raise ValueError(f"unexpected argument {flag}")
+
+    if FORMATS.get(options.format) is None:
+        options.format = "jpeg"
+    return options
+
+def _monitors() -> List[Tuple[int, int, int, int]]:
+    """List monitor geometries as (x, y, width, height), primary screen first."""
+    try:
+        if sys.platform.startswith("linux"):
+            from Xlib import display
+            connection = display.Display()
+            try:
+                monitors = connection.screen().root.xrandr_get_monitors().monitors
+            finally:
+                connection.close()
+            monitors = sorted(monitors, key=lambda m: not m.primary)
+            return [(m.x, m.y, m.width_in_pixels, m.height_in_pixels) for m in monitors]
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+            found = []
+            callback_type = ctypes.WINFUNCTYPE(
+                ctypes.c_int, wintypes.HMONITOR, wintypes.HDC, ctypes.POINTER(wintypes.RECT), wintypes.LPARAM
+            )
+
+            def callback(monitor, dc, rect, data):
+                r = rect.contents
+                found.append((r.left, r.top, r.right - r.left, r.bottom - r.top))
+                return 1
+
+            ctypes.windll.user32.EnumDisplayMonitors(None, None, callback_type(callback), 0)
+            return sorted(found, key=lambda m: (m[0], m[1]) != (0, 0))
+    except Exception:
+        pass
+    width, height = pyautogui.size()
+    return [(0, 0, width, height)]
+
+def _capture(options: ShotOptions):
+    """Grab the screen, a monitor or a region. Blocking, run it off the event loop."""
+    region = options.region
+    if region is None and options.monitor is not None:
+        monitors = _monitors()
+        if not 1 <= options.monitor <= len(monitors):
+            raise ValueError(f"monitor {options.monitor} not found ({len(monitors)} available)")
+        region = monitors[options.monitor - 1]
+
+    kwargs = {"allScreens": True} if sys.platform == "win32" else {}
+    return pyautogui.screenshot(region=region, **kwargs)
+
+def _encode(image, options: ShotOptions) -> Tuple[bytes, str]:
+    """Downscale and encode a captured image. Blocking, run it off the event loop."""
+    if options.max_dim > 0 and max(image.size) > options.max_dim:
+        image.thumbnail((options.max_dim, options.max_dim))
+
+    fmt = "JPEG" if options.as_photo else FORMATS[options.format]
+    if fmt == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+
+    with BytesIO() as byte_io:
+        if fmt == "PNG":
+            image.save(byte_io, format=fmt, compress_level=3)
+        else:
+            image.save(byte_io, format=fmt, quality=options.quality)
+        extension = "jpg" if fmt == "JPEG" else fmt.lower()
+        return byte_io.getvalue(), extension
+
+def _shoot(options: ShotOptions) -> Tuple[bytes, str, Tuple[int, int]]:
+    """Capture and encode in one worker call."""
+    image = _capture(options)
+    data, extension = _encode(image, options)
+    return data, extension, image.size
+
+async def _send_image(context: ContextTypes.DEFAULT_TYPE, chat_id: int, data: bytes,
+                      filename: str, size: Tuple[int, int], as_photo: bool, caption: Optional[str] = None):
+    """
+    Send encoded image bytes as a photo when Telegram allows it, else as a document.
+
+    Identical bytes that were sent before are sent again by file_id.
+    """
+    as_photo = as_photo and len(data) <= PHOTO_MAX_BYTES and sum(size) <= PHOTO_MAX_SIDES
+    key = file_cache.content_key(await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest()),
+                                 "photo" if as_photo else "document")
+    entry = file_cache.get(key)
+    if entry is not None:
+        try:
+            return (await file_cache.send(context.bot, chat_id, entry, caption=caption))[0]
+        except BadRequest as e:
+            Logger.debug("Cached screenshot rejected, sending it again: %s", e)
+
+    if as_photo:
+        message = await context.bot.send_photo(chat_id=chat_id, photo=data, caption=caption)
+        file_id = message.photo[-1].file_id if message and message.photo else None
+    else:
+        message = await context.bot.send_document(chat_id=chat_id, document=data, filename=filename, caption=caption)
+        file_id = message.document.file_id if message and message.document else None
+    if file_id:
+        file_cache.put({"files": [[filename, file_id]], "photo": as_photo}, key)
+    return message
+
 async def cmd_screenshot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Screenshot current window"""
     try:
-        screenshot = pyautogui.screenshot()
-
-        screenshot_filename = f"screenshot_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.png"
-        
-        with BytesIO() as byte_io:
-            screenshot.save(byte_io, format="PNG")
-            byte_io.seek(0)
-            await context.bot.send_document(
-                chat_id=update.effective_chat.id,
-                document=byte_io,
-                filename=screenshot_filename
+        options = _parse_options(context.args or [])
+    except ValueError as e:
+        await update.message.reply_text(f"⚠️ {e}\n{USAGE}", parse_mode="Markdown")
+        return
+
+    try:
+        data, extension, size = await asyncio.to_thread(_shoot, options)
+
+        screenshot_filename = f"screenshot_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.{extension}"
+        await _send_image(context, update.effective_chat.id, data, screenshot_filename, size, options.as_photo)
+    except Exception as e:
+        await update.message.reply_text(f"⚠️ Error screenshot: {str(e)}", rate_limit_args=COALESCE)
+
+_watchers: Dict[int, asyncio.Task] = {}
+UNLOADED = "plugin unloaded"
+
+def on_unload():
+    """Stop running watches before PluginManager drops this module."""
+    for task in _watchers.values():
+        task.cancel(UNLOADED)
+
+@dataclass
+class WatchFrame:
+    """Result of sampling the screen once in /watch mode."""
+    sample: object
+    changed: float
+    data: Optional[bytes] = None
+    extension: str = ""
+    size: Tuple[int, int] = (0, 0)
+
+def _sample(image):
+    """Downsampled grayscale copy of a frame, returned with its scale factor."""
+    factor = max(1, image.width // SAMPLE_WIDTH)
+    return image.reduce(factor).convert("L"), factor
+
+def _watch_frame(reference, options: ShotOptions, threshold: float, crop: bool) -> WatchFrame:
+    """
+    Capture a frame and compare it with the last frame that was sent.
+
+    The frame is only encoded when the share of changed pixels reaches
+    `threshold`; the first frame is always encoded. Blocking, run it off the
+    event loop.
+    """
+    image = _capture(options)
+    sample, factor = _sample(image)
+
+    box = None
+    if reference is None or reference.size != sample.size:
+        changed = 1.0
+    else:
+        mask = ImageChops.difference(reference, sample).point(CHANGED_LUT)
+        changed = mask.histogram()[255] / (sample.width * sample.height)
+        box = mask.getbbox()
+
+    if changed < threshold:
+        return WatchFrame(sample, changed)
+
+    if crop and box is not None:
+        left, top, right, bottom = box
+        image = image.crop((
+            max(0, (left - 1) * factor),
+            max(0, (top - 1) * factor),
+            min(image.width, (right + 1) * factor),
+            min(image.height, (bottom + 1) * factor),
+        ))
+    data, extension = _encode(image, options)
+    return WatchFrame(sample, changed, data, extension, image.size)
+
+async def _watch(context: ContextTypes.DEFAULT_TYPE, chat_id: int, interval: float,
+                 threshold: float, crop: bool, options: ShotOptions):
+    loop = asyncio.get_running_loop()
+    reference = None
+    try:
+        while True:
+            started = loop.time()
+            frame = await asyncio.to_thread(_watch_frame, reference, options, threshold, crop)
+            if frame.data is not None:
+                reference = frame.sample
+                stamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+                await _send_image(
+                    context, chat_id, frame.data, f"watch_{stamp}.{frame.extension}", frame.size,
+                    options.as_photo, caption=f"Δ {frame.changed:.1%} at {stamp}"
+                )
+            await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+    except asyncio.CancelledError as e:
+        if e.args == (UNLOADED,):
+            await context.bot.send_message(
+                chat_id=chat_id, text="⚠️ Watch stopped by a plugin reload, run /watch again.",
+                rate_limit_args=COALESCE
             )
+        raise
     except Exception as e:
-        await update.message.reply_text(f"⚠️ Error screenshot: {str(e)}")
+        Logger.error(f"Screen watch for chat {chat_id} stopped: {e}")
+        await context.bot.send_message(
+            chat_id=chat_id, text=f"⚠️ Watch stopped: {str(e)}", rate_limit_args=COALESCE
+        )
+    finally:
+        if _watchers.get(chat_id) is asyncio.current_task():
+            del _watchers[chat_id]
+
+async def cmd_watch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send a screenshot whenever the screen changes"""
+    args = list(context.args or [])
+    interval = Setting.WATCH_INTERVAL
+    threshold = Setting.WATCH_THRESHOLD
+    crop = False
+    rest = []
+    try:
+        while args:
+            arg = args.pop(0)
+            if arg == "-c":
+                crop = True
+            elif arg == "-t" and args:
+                threshold = float(args.pop(0).rstrip("%"))
+            elif not rest and arg.replace(".", "", 1).isdigit():
+                interval = float(arg)
+            else:
+                rest.append(arg)
+        options = _parse_options(rest)
+    except ValueError as e:
+        await update.message.reply_text(f"⚠️ {e}\n{WATCH_USAGE}", parse_mode="Markdown")
+        return
+
+    chat_id = update.effective_chat.id
+    interval = max(interval, Setting.WATCH_MIN_INTERVAL)
+    previous = _watchers.pop(chat_id, None)
+    if previous is not None:
+        previous.cancel()
+
+    _watchers[chat_id] = asyncio.ensure_future(
+        _watch(context, chat_id, interval, threshold / 100, crop, options)
+    )
+    await update.message.reply_text(
+        f"👀 Watching the screen every {interval:g}s (threshold {threshold:g}%). Use /unwatch to stop."
+    )
 
+async def cmd_unwatch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Stop watching the screen"""
+    task = _watchers.pop(update.effective_chat.id, None)
+    if task is None:
+        await update.message.reply_text("Not watching the screen.", rate_limit_args=COALESCE)
+        return
+    task.cancel()
+    await update.message.reply_text("🛑 Stopped watching the screen.", rate_limit_args=COALESCE)
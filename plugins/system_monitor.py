@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import html
+import re
+import socket
+import time
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import psutil
+from PIL import Image, ImageDraw
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config.settings import Setting
+from utils.telemetry import telemetry
+
+SYS_USAGE = "Usage: /sys [-c] [window, e.g. 10m, 1h, 24h]"
+TOP_USAGE = "Usage: /top [-m] [count]"
+
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+CHART_SIZE = (720, 420)
+COLORS = {"cpu": (230, 80, 60), "mem": (60, 120, 220), "net_rx": (40, 170, 90), "net_tx": (200, 140, 30),
+          "disk_read": (140, 80, 200), "disk_write": (90, 90, 90)}
+
+def _parse_window(text: str) -> Optional[float]:
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd]?)", text)
+    if not match:
+        return None
+    return float(match.group(1)) * UNITS[match.group(2) or "s"]
+
+def _rate(value: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:.0f} {unit}/s" if unit == "B" else f"{value:.1f} {unit}/s"
+        value /= 1024
+
+def _size(value: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if value < 1024 or unit == "TiB":
+            return f"{value:.1f} {unit}"
+        value /= 1024
+
+def _avg(name: str, seconds: float) -> str:
+    value = telemetry.average(name, seconds)
+    return "-" if value is None else f"{value:.1f}%"
+
+def _summary(window: Optional[float] = None, label: str = "") -> str:
+    now = telemetry.latest
+    uptime = int(time.time() - psutil.boot_time())
+    lines = [
+        f"🖥 <b>{html.escape(socket.gethostname())}</b>, up {uptime // 86400}d {uptime % 86400 // 3600}h {uptime % 3600 // 60}m",
+        f"CPU {now['cpu']:.1f}% (1m {_avg('cpu', 60)}, 1h {_avg('cpu', 3600)}), load {now['load']:.2f}",
+        f"Mem {now['mem']:.1f}% of {_size(psutil.virtual_memory().total)}, swap {now['swap']:.1f}%",
+        f"Disk read {_rate(now['disk_read'])}, write {_rate(now['disk_write'])}",
+        f"Net rx {_rate(now['net_rx'])}, tx {_rate(now['net_tx'])}",
+    ]
+    if window is not None:
+        lines.append(f"Last {html.escape(label)}: CPU {_avg('cpu', window)}, mem {_avg('mem', window)}, swap {_avg('swap', window)}")
+    return "\n".join(lines)
+
+def _plot(draw: ImageDraw.ImageDraw, box, times: List[float], series: Dict[str, List[float]], top: float, label: str):
+    left, upper, right, lower = box
+    draw.rectangle(box, outline=(200, 200, 200))
+    draw.text((left + 4, upper + 2), label, fill=(0, 0, 0))
+    if len(times) < 2:
+        return
+    start, span = times[0], max(times[-1] - times[0], 1e-6)
+    width, height = right - left, lower - upper - 14
+    legend = left + 4 + draw.textlength(label) + 12
+    for name, values in series.items():
+        points = [
+            (left + (t - start) / span * width, lower - min(v / top, 1.0) * height)
+            for t, v in zip(times, values)
+        ]
+        draw.line(points, fill=COLORS[name], width=2)
+        draw.text((legend, upper + 2), name, fill=COLORS[name])
+        legend += draw.textlength(name) + 10
+
+def _render_chart(times: List[float], values: Dict[str, List[float]], title: str) -> bytes:
+    """Draws CPU/memory and network/disk throughput as a PNG. Blocking, run it off the event loop."""
+    image = Image.new("RGB", CHART_SIZE, (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.text((10, 6), title, fill=(0, 0, 0))
+    width, height = CHART_SIZE
+    _plot(draw, (10, 24, width - 10, height // 2 + 4), times, {k: values[k] for k in ("cpu", "mem")}, 100.0, "%")
+    io = {k: values[k] for k in ("net_rx", "net_tx", "disk_read", "disk_write")}
+    peak = max((max(v) for v in io.values() if v), default=0.0)
+    _plot(draw, (10, height // 2 + 14, width - 10, height - 10), times, io, peak or 1.0, f"max {_rate(peak)}")
+    buffer = BytesIO()
+    image.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+async def cmd_sys(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """System usage from the background sampler (-c draws a chart)"""
+    args = list(context.args or [])
+    chart = bool(args) and args[0] == "-c"
+    if chart:
+        args = args[1:]
+    window = _parse_window(args[0]) if args else 600.0
+    if window is None or len(args) > 1:
+        await update.message.reply_text(SYS_USAGE)
+        return
+    if not telemetry.latest:
+        await update.message.reply_text("⏳ No samples yet (is SYSMON_INTERVAL 0?)")
+        return
+
+    if not chart:
+        await update.message.reply_text(_summary(window if args else None, args[0] if args else ""), parse_mode="HTML")
+        return
+
+    times, values = telemetry.window(window)
+    if len(times) < 2:
+        await update.message.reply_text("⏳ Not enough history for a chart yet")
+        return
+    title = f"{socket.gethostname()}, last {args[0] if args else '10m'}"
+    png = await asyncio.to_thread(_render_chart, times, values, title)
+    await update.message.reply_photo(png, caption=title)
+
+async def cmd_top(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Busiest processes from the background sampler (-m sorts by memory)"""
+    args = list(context.args or [])
+    by_memory = bool(args) and args[0] == "-m"
+    if by_memory:
+        args = args[1:]
+    if args and not args[0].isdigit():
+        await update.message.reply_text(TOP_USAGE)
+        return
+    count = min(int(args[0]) if args else Setting.SYSMON_TOP, 50)
+    if not telemetry.processes:
+        await update.message.reply_text("⏳ No process samples yet (is SYSMON_INTERVAL 0?)")
+        return
+
+    taken, by_cpu, by_rss = telemetry.processes[-1]
+    rows = by_rss if by_memory else by_cpu
+    lines = [f"{'PID':>7} {'CPU%':>6} {'RSS':>10}  NAME"]
+    lines += [f"{pid:>7} {cpu:>6.1f} {_size(rss):>10}  {name}" for pid, name, cpu, rss in rows[:count]]
+    await update.message.reply_text(
+        f"<pre>{html.escape(chr(10).join(lines))}</pre>\nSampled {int(time.time() - taken)}s ago",
+        parse_mode="HTML",
+    )
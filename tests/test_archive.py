@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import filecmp
+import os
+import random
+import subprocess
+import threading
+
+import pytest
+
+from config.settings import Setting
+from utils.archive import DirectoryArchive
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setattr(Setting, "ARCHIVE_BLOCK_SIZE", 64 * 1024)
+    monkeypatch.setattr(Setting, "ARCHIVE_WORKERS", 3)
+    root = tmp_path / "project"
+    rng = random.Random(42)
+    (root / "src" / "deep").mkdir(parents=True)
+    (root / "build").mkdir()
+    (root / "src" / "main.py").write_text("print('hello')\n" * 5000)
+    (root / "src" / "deep" / "blob.bin").write_bytes(rng.randbytes(300 * 1024))
+    (root / "src" / "deep" / "empty.txt").write_bytes(b"")
+    (root / "build" / "out.o").write_bytes(rng.randbytes(1024))
+    (root / "debug.log").write_text("noise\n")
+    (root / "name with 'quotes'.txt").write_text("quoted\n")
+    return root
+
+async def _collect(archive: DirectoryArchive, members) -> bytes:
+    return b"".join([chunk async for chunk in archive.stream(members)])
+
+def test_archive_round_trips_through_tar(source, tmp_path):
+    archive = DirectoryArchive(str(source), exclude=["build", "*.log"])
+    members = archive.scan()
+    data = asyncio.run(_collect(archive, members))
+
+    assert archive.files_total == archive.files_done == 4
+    assert archive.bytes_done == archive.bytes_total
+    assert archive.skipped == []
+
+    target = tmp_path / "unpacked"
+    target.mkdir()
+    path = tmp_path / "project.tar.gz"
+    path.write_bytes(data)
+    subprocess.run(["tar", "-xzf", str(path), "-C", str(target)], check=True)
+
+    unpacked = target / "project"
+    assert sorted(
+        os.path.relpath(os.path.join(current, name), unpacked)
+        for current, _, files in os.walk(unpacked) for name in files
+    ) == sorted(["src/main.py", "src/deep/blob.bin", "src/deep/empty.txt", "name with 'quotes'.txt"])
+    for relative in ("src/main.py", "src/deep/blob.bin", "src/deep/empty.txt", "name with 'quotes'.txt"):
+        assert filecmp.cmp(source / relative, unpacked / relative, shallow=False)
+
+def test_include_selects_files_only(source):
+    archive = DirectoryArchive(str(source), include=["*.py", "*.txt"], exclude=["deep"])
+    assert [name for _, name, _ in archive.scan()] == [
+        "project/name with 'quotes'.txt", "project/src/main.py",
+    ]
+
+def test_stopping_early_stops_the_producer(source):
+    archive = DirectoryArchive(str(source))
+    members = archive.scan()
+
+    async def main():
+        stream = archive.stream(members)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(main())[:2] == b"\x1f\x8b"
+    for thread in threading.enumerate():
+        if thread.name == "archive-tar":
+            thread.join(5)
+            assert not thread.is_alive()
+
+def test_empty_and_symlinked_directories_are_kept(source, tmp_path):
+    (source / "empty" / "nested").mkdir(parents=True)
+    (source / "linked").symlink_to(source / "src", target_is_directory=True)
+    archive = DirectoryArchive(str(source), exclude=["build", "*.log"])
+    data = asyncio.run(_collect(archive, archive.scan()))
+
+    path = tmp_path / "project.tar.gz"
+    path.write_bytes(data)
+    target = tmp_path / "unpacked"
+    target.mkdir()
+    subprocess.run(["tar", "-xzf", str(path), "-C", str(target)], check=True)
+
+    unpacked = target / "project"
+    assert (unpacked / "empty" / "nested").is_dir()
+    assert os.readlink(unpacked / "linked") == str(source / "src")
+    assert (unpacked / "linked").is_symlink()
+
+    names = [name for _, name, _ in DirectoryArchive(str(source), include=["*.py"]).scan()]
+    assert names == ["project/src/main.py"]
+
+def test_unreadable_directories_are_reported(tmp_path):
+    gone = tmp_path / "gone"
+    archive = DirectoryArchive(str(gone))
+    assert archive.scan() == []
+    assert archive.skipped == [str(gone)]
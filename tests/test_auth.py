@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+from datetime import datetime
+
+import pytest
+from telegram import Chat, Document, Message, Update, User
+
+from utils.auth import command_of
+
+def _update(text=None, document=None) -> Update:
+    message = Message(
+        message_id=1, date=datetime.now(), chat=Chat(1, Chat.PRIVATE),
+        from_user=User(1, "user", False), text=text, document=document,
+    )
+    return Update(1, message=message)
+
+@pytest.mark.parametrize("text, command", [
+    ("/help", "help"),
+    ("/CMD ls -la", "cmd"),
+    ("/cmd@wai_bot echo hi", "cmd"),
+    ("/", None),
+    ("/ ", None),
+    ("/@bot", None),
+    ("/@bot help", None),
+    ("hello /help", None),
+    ("", None),
+])
+def test_command_of_text(text, command):
+    assert command_of(_update(text)) == command
+
+def test_command_of_document_and_other_updates():
+    assert command_of(_update(document=Document("id", "unique"))) == "download"
+    assert command_of(Update(2)) is None
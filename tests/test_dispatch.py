@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import inspect
+from datetime import datetime
+
+import pytest
+from telegram import Chat, Message, Update, User
+
+from utils.auth import acl
+from utils.dispatch import ConcurrentDispatcher
+
+ALLOWED = {1, 2, 3}
+
+@pytest.fixture(autouse=True)
+def allowed_users(monkeypatch):
+    monkeypatch.setattr(acl, "users", set(ALLOWED))
+
+def _update(update_id: int, user_id: int, chat_id: int, text: str = "hello") -> Update:
+    message = Message(
+        message_id=update_id, date=datetime.now(), chat=Chat(chat_id, Chat.PRIVATE),
+        from_user=User(user_id, "user", False), text=text,
+    )
+    return Update(update_id, message=message)
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+        self.running = 0
+        self.peak = {}
+
+    async def handle(self, name: str, delay: float = 0.0, key: str = "all"):
+        self.running += 1
+        self.peak[key] = max(self.peak.get(key, 0), self.running)
+        self.events.append(f"start {name}")
+        await asyncio.sleep(delay)
+        self.events.append(f"end {name}")
+        self.running -= 1
+
+def test_updates_of_one_chat_run_in_order_and_chats_run_in_parallel():
+    async def main():
+        dispatcher = ConcurrentDispatcher(workers=4, backlog=16)
+        recorder = Recorder()
+        await asyncio.gather(
+            dispatcher.process_update(_update(1, 1, 10), recorder.handle("a1", 0.05)),
+            dispatcher.process_update(_update(2, 1, 10), recorder.handle("a2")),
+            dispatcher.process_update(_update(3, 2, 20), recorder.handle("b1", 0.01)),
+        )
+        return dispatcher, recorder
+
+    dispatcher, recorder = asyncio.run(main())
+    events = recorder.events
+    assert events.index("end a1") < events.index("start a2")
+    assert events.index("end b1") < events.index("end a1")
+    assert dispatcher.pending == 0
+    assert dispatcher._chats == {}
+
+def test_full_backlog_sheds_new_updates():
+    async def main():
+        dispatcher = ConcurrentDispatcher(workers=1, backlog=2)
+        recorder = Recorder()
+        await asyncio.gather(*(
+            dispatcher.process_update(_update(i, 1, 10 + i), recorder.handle(f"u{i}", 0.01))
+            for i in range(5)
+        ))
+        return dispatcher, recorder
+
+    dispatcher, recorder = asyncio.run(main())
+    assert recorder.events == ["start u0", "end u0", "start u1", "end u1"]
+    assert dispatcher.shed == 3
+    assert dispatcher.pending == 0
+
+def test_unknown_senders_are_rejected_before_the_backlog():
+    async def main():
+        dispatcher = ConcurrentDispatcher(workers=1, backlog=1)
+        recorder = Recorder()
+        await asyncio.gather(
+            *(dispatcher.process_update(_update(i, 99, 99), recorder.handle(f"stranger{i}"))
+              for i in range(20)),
+            dispatcher.process_update(_update(100, 1, 10), recorder.handle("owner")),
+        )
+        return dispatcher, recorder
+
+    dispatcher, recorder = asyncio.run(main())
+    assert recorder.events == ["start owner", "end owner"]
+    assert dispatcher.rejected == 20
+    assert dispatcher.shed == 0
+
+def test_command_cap_limits_runs_across_chats():
+    async def main():
+        dispatcher = ConcurrentDispatcher(
+            workers=8, backlog=16, command_limit=lambda command: 1 if command == "cmd" else None
+        )
+        recorder = Recorder()
+        capped = Recorder()
+        await asyncio.gather(
+            *(dispatcher.process_update(_update(i, 1 + i % 3, 10 + i, "/cmd ls"),
+                                        capped.handle(f"cmd{i}", 0.01, "cmd"))
+              for i in range(3)),
+            *(dispatcher.process_update(_update(10 + i, 1 + i % 3, 20 + i, "/help"),
+                                        recorder.handle(f"help{i}", 0.01, "help"))
+              for i in range(3)),
+        )
+        return capped, recorder
+
+    capped, recorder = asyncio.run(main())
+    assert capped.peak["cmd"] == 1
+    assert len(capped.events) == 6
+    assert recorder.peak["help"] == 3
+
+def test_a_failing_command_cap_lookup_runs_the_update_uncapped():
+    def broken_limit(command):
+        raise RuntimeError("no manifest")
+
+    async def main():
+        dispatcher = ConcurrentDispatcher(workers=2, backlog=4, command_limit=broken_limit)
+        recorder = Recorder()
+        await dispatcher.process_update(_update(1, 1, 10, "/cmd ls"), recorder.handle("cmd"))
+        return dispatcher, recorder
+
+    dispatcher, recorder = asyncio.run(main())
+    assert recorder.events == ["start cmd", "end cmd"]
+    assert dispatcher.pending == 0 and dispatcher._chats == {}
+
+def test_an_error_before_the_handler_runs_closes_its_coroutine(monkeypatch):
+    async def fail(update, coroutine):
+        raise RuntimeError("boom")
+
+    async def main():
+        dispatcher = ConcurrentDispatcher(workers=2, backlog=4)
+        monkeypatch.setattr(dispatcher, "do_process_update", fail)
+        coroutine = Recorder().handle("never")
+        with pytest.raises(RuntimeError):
+            await dispatcher.process_update(_update(1, 1, 10), coroutine)
+        return dispatcher, coroutine
+
+    dispatcher, coroutine = asyncio.run(main())
+    assert inspect.getcoroutinestate(coroutine) == inspect.CORO_CLOSED
+    assert dispatcher.pending == 0 and dispatcher._chats == {}
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import json
+import math
+
+import pytest
+
+from config.settings import Setting
+from utils.fleet import (
+    HEADER, Agent, Channel, Coordinator, FleetError, _parse_timeout, read_frame, session_key, write_frame,
+)
+
+TOKEN = "fleet-token"
+
+class Fleet:
+    """A coordinator listening on a free local port."""
+
+    async def __aenter__(self):
+        self.coordinator = Coordinator(TOKEN)
+        self.server = await asyncio.start_server(self.coordinator._accept, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        for agent in list(self.coordinator.agents.values()):
+            agent.close("test finished")
+        self.server.close()
+        await self.server.wait_closed()
+
+    def agent(self, name: str = "web1", token: str = TOKEN) -> Agent:
+        return Agent("127.0.0.1", self.port, token, name=name)
+
+    async def wait_for(self, name: str):
+        for _ in range(200):
+            if name in self.coordinator.agents:
+                return self.coordinator.agents[name]
+            await asyncio.sleep(0.01)
+        raise AssertionError(f"{name} never connected")
+
+def test_agent_runs_commands_after_the_handshake():
+    async def main():
+        async with Fleet() as fleet:
+            session = asyncio.ensure_future(fleet.agent()._session())
+            await fleet.wait_for("web1")
+            results = await fleet.coordinator.run(["web1", "db1"], "echo hello", timeout=5)
+            session.cancel()
+            await asyncio.gather(session, return_exceptions=True)
+            return results
+
+    results = asyncio.run(main())
+    assert results["web1"].output.strip() == "hello"
+    assert results["web1"].returncode == 0
+    assert isinstance(results["db1"], FleetError)
+
+def test_agent_with_a_wrong_token_is_rejected():
+    async def main():
+        async with Fleet() as fleet:
+            with pytest.raises(asyncio.IncompleteReadError):
+                await asyncio.wait_for(fleet.agent(token="wrong")._session(), 5)
+            return dict(fleet.coordinator.agents)
+
+    assert asyncio.run(main()) == {}
+
+def test_agent_refuses_a_coordinator_without_the_token():
+    async def impostor(reader, writer):
+        write_frame(writer, {"type": "challenge", "nonce": "00"})
+        await writer.drain()
+        await read_frame(reader)
+        write_frame(writer, {"type": "welcome", "mac": "0" * 64})
+        write_frame(writer, {"type": "run", "id": 1, "command": "echo owned"})
+        await writer.drain()
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(impostor, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            with pytest.raises(FleetError, match="coordinator failed authentication"):
+                await asyncio.wait_for(Agent("127.0.0.1", port, TOKEN, name="web1")._session(), 5)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(main())
+
+def test_malformed_hello_is_rejected():
+    async def main():
+        async with Fleet() as fleet:
+            reader, writer = await asyncio.open_connection("127.0.0.1", fleet.port)
+            await read_frame(reader)
+            write_frame(writer, ["hello"])
+            await writer.drain()
+            closed = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            return closed, dict(fleet.coordinator.agents)
+
+    assert asyncio.run(main()) == (b"", {})
+
+def test_forged_frame_drops_the_connection(tmp_path):
+    marker = tmp_path / "pwned"
+
+    async def main():
+        async with Fleet() as fleet:
+            session = asyncio.ensure_future(fleet.agent()._session())
+            connection = await fleet.wait_for("web1")
+            payload = json.dumps({"type": "run", "id": 1, "command": f"touch {marker}"}).encode()
+            connection.channel.writer.write(HEADER.pack(32 + len(payload)) + bytes(32) + payload)
+            with pytest.raises(FleetError, match="failed authentication"):
+                await asyncio.wait_for(session, 5)
+
+    asyncio.run(main())
+    assert not marker.exists()
+
+class _Pipe:
+    """Stands in for a StreamWriter and keeps every frame written."""
+
+    def __init__(self):
+        self.frames = []
+
+    def write(self, data: bytes):
+        self.frames.append(data)
+
+    async def drain(self):
+        pass
+
+def test_channel_rejects_replayed_and_misdirected_frames():
+    key = session_key(TOKEN, "challenge", "nonce")
+
+    async def receive(frames, role="agent", peer="coordinator"):
+        reader = asyncio.StreamReader()
+        for frame in frames:
+            reader.feed_data(frame)
+        channel = Channel(reader, _Pipe(), key, role, peer)
+        return [await channel.recv() for _ in frames]
+
+    async def main():
+        pipe = _Pipe()
+        sender = Channel(None, pipe, key, "coordinator", "agent")
+        await sender.send({"type": "ping"})
+        await sender.send({"type": "run", "id": 1})
+        first, second = pipe.frames
+
+        assert await receive([first, second]) == [{"type": "ping"}, {"type": "run", "id": 1}]
+        with pytest.raises(FleetError):
+            await receive([first, first])
+        with pytest.raises(FleetError):
+            await receive([second])
+        with pytest.raises(FleetError):
+            # A coordinator frame reflected back to the coordinator.
+            await receive([first], role="coordinator", peer="agent")
+
+    asyncio.run(main())
+    assert session_key(TOKEN, "a", "b") != session_key(TOKEN, "b", "a")
+
+def test_run_timeout_must_be_finite_and_positive():
+    assert _parse_timeout(None) == Setting.CMD_TIMEOUT
+    assert _parse_timeout(2.5) == 2.5
+    for value in (0, -1, math.nan, math.inf, "nan"):
+        with pytest.raises(ValueError):
+            _parse_timeout(value)
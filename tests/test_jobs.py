@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+from config.settings import Setting
+from utils.jobs import CANCELLED, DONE, FAILED, INTERRUPTED, QUEUED, RUNNING, JobManager
+
+def _update(chat_id: int = 5):
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    message = SimpleNamespace(reply_text=reply_text)
+    update = SimpleNamespace(
+        effective_chat=SimpleNamespace(id=chat_id), effective_user=SimpleNamespace(id=1),
+        effective_message=message,
+    )
+    return update, replies
+
+async def _settle():
+    """Waits for the jobs and the output writes they left behind."""
+    while True:
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if not pending:
+            return
+        await asyncio.gather(*pending, return_exceptions=True)
+
+def test_importing_and_creating_a_manager_touches_nothing(tmp_path):
+    path = tmp_path / "jobs" / "jobs.db"
+    manager = JobManager(str(path))
+    assert not path.parent.exists()
+    manager.open()
+    assert path.exists()
+    manager.close()
+
+def test_open_marks_unfinished_jobs_interrupted_and_drops_expired_ones(tmp_path, monkeypatch):
+    monkeypatch.setattr(Setting, "JOBS_RETENTION_DAYS", 7)
+    path = str(tmp_path / "jobs.db")
+    previous = JobManager(path)
+    now = time.time()
+    for status, created in ((QUEUED, now), (RUNNING, now), (DONE, now), (DONE, now - 30 * 86400)):
+        previous._insert(
+            "INSERT INTO jobs (command, args, chat_id, user_id, status, created) VALUES (?, ?, ?, ?, ?, ?)",
+            ("cmd", "[]", 5, 1, status, created),
+        )
+    previous.close()
+
+    manager = JobManager(path)
+    manager.open()
+    jobs = asyncio.run(manager.list())
+    manager.close()
+
+    assert [(job.id, job.status) for job in jobs] == [(3, DONE), (2, INTERRUPTED), (1, INTERRUPTED)]
+    assert all(job.finished is not None for job in jobs[1:])
+
+def test_wrap_runs_inline_unless_the_last_argument_is_ampersand(tmp_path):
+    manager = JobManager(str(tmp_path / "jobs.db"))
+    calls = []
+
+    async def handler(update, context):
+        calls.append(list(context.args))
+        manager.record("sendMessage", {"chat_id": 5, "text": "<b>built</b>", "parse_mode": "HTML"},
+                       {"message_id": 10})
+
+    async def main():
+        wrapped = manager.wrap("cmd", handler)
+        update, replies = _update()
+        await wrapped(update, SimpleNamespace(args=["make"]))
+        inline_jobs = await manager.list()
+
+        await wrapped(update, SimpleNamespace(args=["make", "all", "&"]))
+        await _settle()
+        job = (await manager.list())[0]
+        return inline_jobs, replies, job, await manager.output(job.id)
+
+    inline_jobs, replies, job, output = asyncio.run(main())
+    manager.close()
+
+    assert calls == [["make"], ["make", "all"]]
+    assert inline_jobs == []
+    assert replies == [f"🧵 Job #{job.id} started, /job {job.id} for its result, /cancel {job.id} to stop it."]
+    assert (job.command, job.args, job.status, job.chat_id) == ("cmd", ["make", "all"], DONE, 5)
+    assert output == [("text", "built")]
+
+def test_failed_and_cancelled_jobs_keep_their_status(tmp_path):
+    manager = JobManager(str(tmp_path / "jobs.db"))
+
+    async def fail(update, context):
+        raise RuntimeError("boom")
+
+    async def hang(update, context):
+        await asyncio.sleep(60)
+
+    async def main():
+        update, _ = _update()
+        failed = await manager.submit("fail", fail, update, SimpleNamespace(args=[]))
+        hung = await manager.submit("hang", hang, update, SimpleNamespace(args=[]))
+        await asyncio.sleep(0.05)
+        assert manager.cancel(hung)
+        assert not manager.cancel(12345)
+        await _settle()
+        return await manager.get(failed), await manager.get(hung)
+
+    failed, hung = asyncio.run(main())
+    manager.close()
+    assert (failed.status, failed.error) == (FAILED, "boom")
+    assert hung.status == CANCELLED
+    assert manager.tasks == {}
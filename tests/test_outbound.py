@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import time
+
+from telegram.error import RetryAfter
+
+from config.settings import Setting
+from utils.outbound import BULK, COALESCE, TEXT, OutboundLimiter, PriorityBucket, TokenBucket
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_token_bucket_allows_a_burst_then_refills(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    bucket = TokenBucket(rate=2, capacity=3)
+
+    for _ in range(3):
+        assert bucket.delay() == 0
+        bucket.consume()
+    assert bucket.delay() == 0.5
+
+    clock.now += 0.25
+    assert bucket.delay() == 0.25
+    clock.now += 10
+    assert bucket.delay() == 0
+    assert bucket.full
+
+def test_token_bucket_refuses_tokens_while_paused(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    bucket = TokenBucket(rate=1, capacity=5)
+
+    bucket.pause(3)
+    assert bucket.delay() == 3
+    clock.now += 2
+    assert bucket.delay() == 1
+    clock.now += 1
+    assert bucket.delay() == 0
+    assert bucket.tokens == 3
+
+def test_priority_bucket_serves_text_before_bulk():
+    async def main():
+        bucket = PriorityBucket(rate=50, capacity=1)
+        await bucket.acquire()
+        order = []
+
+        async def waiter(name, priority):
+            await bucket.acquire(priority)
+            order.append(name)
+
+        await asyncio.gather(
+            waiter("bulk-1", BULK), waiter("bulk-2", BULK),
+            waiter("text-1", TEXT), waiter("text-2", TEXT),
+        )
+        return order
+
+    assert asyncio.run(main()) == ["text-1", "text-2", "bulk-1", "bulk-2"]
+
+def _limit_chats(monkeypatch, rate=20.0):
+    monkeypatch.setattr(Setting, "SEND_CHAT_RATE", rate)
+    monkeypatch.setattr(Setting, "SEND_CHAT_BURST", 1.0)
+    monkeypatch.setattr(Setting, "SEND_GLOBAL_RATE", 1000.0)
+    monkeypatch.setattr(Setting, "SEND_GLOBAL_BURST", 1000.0)
+
+def _send(limiter, sent, text, rate_limit_args=None, chat_id=1, **extra):
+    data = {"chat_id": chat_id, "text": text, **extra}
+
+    async def callback():
+        sent.append(data["text"])
+        return {"text": data["text"]}
+
+    return limiter.process_request(callback, (), {}, "sendMessage", data, rate_limit_args)
+
+def test_coalesced_messages_are_merged_while_queued(monkeypatch):
+    _limit_chats(monkeypatch)
+
+    async def main():
+        limiter = OutboundLimiter()
+        sent = []
+        first = asyncio.ensure_future(_send(limiter, sent, "first"))
+        second = asyncio.ensure_future(_send(limiter, sent, "second"))
+        await asyncio.sleep(0)
+        results = await asyncio.gather(
+            first, second,
+            _send(limiter, sent, "a", COALESCE),
+            _send(limiter, sent, "b", COALESCE),
+            _send(limiter, sent, "c", COALESCE),
+        )
+        return sent, results
+
+    sent, results = asyncio.run(main())
+    assert sent == ["first", "second", "a\nb\nc"]
+    assert results[2] == results[3] == results[4] == {"text": "a\nb\nc"}
+
+def test_coalescing_keeps_different_options_and_plain_sends_apart(monkeypatch):
+    _limit_chats(monkeypatch)
+
+    async def main():
+        limiter = OutboundLimiter()
+        sent = []
+        blocker = asyncio.ensure_future(_send(limiter, sent, "first"))
+        await asyncio.sleep(0)
+        await asyncio.gather(
+            blocker,
+            _send(limiter, sent, "second"),
+            _send(limiter, sent, "a", COALESCE),
+            _send(limiter, sent, "*b*", COALESCE, parse_mode="Markdown"),
+            _send(limiter, sent, "c"),
+            _send(limiter, sent, "d", COALESCE, chat_id=2),
+        )
+        return sent
+
+    sent = asyncio.run(main())
+    assert sorted(sent) == ["*b*", "a", "c", "d", "first", "second"]
+    assert [text for text in sent if text != "d"] == ["first", "second", "a", "*b*", "c"]
+
+def test_retry_after_pauses_the_chat_and_retries(monkeypatch):
+    _limit_chats(monkeypatch, rate=1000.0)
+    monkeypatch.setattr(Setting, "SEND_MAX_RETRIES", 2)
+    recorded = []
+
+    async def main():
+        limiter = OutboundLimiter(on_sent=lambda endpoint, data, result: recorded.append(result))
+        calls = []
+
+        async def callback():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise RetryAfter(0)
+            return True
+
+        result = await limiter.process_request(
+            callback, (), {}, "sendMessage", {"chat_id": 1, "text": "hi"}, None
+        )
+        return result, calls
+
+    result, calls = asyncio.run(main())
+    assert result is True
+    assert len(calls) == 2
+    assert recorded == [True]
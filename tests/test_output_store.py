@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+from types import SimpleNamespace
+
+from plugins import command_excutor
+from utils.output_store import CALLBACK_PREFIX, OutputStore, paginate
+
+def _lines(count: int) -> str:
+    return "".join(f"line {i:05d} {'error' if i % 10 == 0 else 'ok'}\n" for i in range(count))
+
+def test_paginate_breaks_on_lines_and_covers_the_text():
+    text = _lines(1000)
+    offsets = paginate(text, size=1000)
+    pages = [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+    assert "".join(pages) == text
+    assert all(len(page) <= 1000 and page.endswith("\n") for page in pages)
+    assert list(paginate("")) == [0, 0]
+    assert list(paginate("x" * 25, size=10)) == [0, 10, 20, 25]
+
+def test_render_clamps_pages_and_builds_the_keyboard():
+    store = OutputStore()
+    entry = OutputStore.build(_lines(1000) + "<tag> & done\n", "<b>/cmd seq</b>")
+    assert entry.pages > 3
+    assert store.text(entry).endswith("<tag> & done\n")
+
+    first, keyboard = store.render(entry, 0)
+    assert first.startswith("<b>/cmd seq</b>\n<pre>line 00000 error\n")
+    assert f"Page 1/{entry.pages}," in first
+    assert [button.callback_data for button in keyboard.inline_keyboard[0]] == [
+        f"{CALLBACK_PREFIX}2", f"{CALLBACK_PREFIX}{entry.pages}", f"{CALLBACK_PREFIX}file",
+    ]
+
+    last, keyboard = store.render(entry, entry.pages + 5)
+    assert "&lt;tag&gt; &amp; done" in last
+    assert [button.text for button in keyboard.inline_keyboard[0]] == ["⏮", "◀", "📄 File"]
+
+    single, keyboard = store.render(OutputStore.build("", "t"), 1)
+    assert (single, keyboard) == ("t\n<pre>(no output)</pre>", None)
+
+def test_store_evicts_least_recently_used_entries():
+    entries = [OutputStore.build(_lines(50 + i), f"#{i}") for i in range(4)]
+    store = OutputStore(max_bytes=10**6, max_entries=3)
+    for i, entry in enumerate(entries[:3]):
+        store.add(1, i, entry)
+    assert store.get(1, 0) is entries[0]
+    store.add(1, 3, entries[3])
+    assert store.get(1, 1) is None
+    assert [key[1] for key in store.entries] == [2, 0, 3]
+    assert store.size == sum(len(entries[i].blob) for i in (0, 2, 3))
+
+    small = OutputStore(max_bytes=len(entries[0].blob) - 1)
+    small.add(1, 0, entries[0])
+    assert small.entries == {} and small.size == 0
+
+def test_grep_falls_back_to_a_literal_pattern():
+    text = "a.c\nabc\n[x\nABC\n"
+    assert command_excutor._grep(text, "a.c") == "a.c\nabc\nABC\n"
+    assert command_excutor._grep(text, "[x") == "[x\n"
+
+class _Message:
+    def __init__(self, message_id: int, reply_to=None):
+        self.chat_id = 7
+        self.message_id = message_id
+        self.reply_to_message = reply_to
+        self.text = None
+        self.sent = []
+        self.edits = []
+
+    async def reply_text(self, text, **kwargs):
+        self.sent.append((text, kwargs))
+        return _Message(self.message_id + 100)
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+
+def test_grep_and_page_commands_use_the_stored_output(monkeypatch):
+    store = OutputStore()
+    monkeypatch.setattr(command_excutor, "output_store", store)
+    output = _Message(1)
+    entry = OutputStore.build(_lines(1000), "<b>/cmd seq</b>")
+    store.add(output.chat_id, output.message_id, entry)
+
+    async def main():
+        command = _Message(2, reply_to=output)
+        update = SimpleNamespace(message=command)
+        await command_excutor.cmd_grep(update, SimpleNamespace(args=["error$"]))
+        await command_excutor.cmd_page(update, SimpleNamespace(args=["3"]))
+        return command
+
+    command = asyncio.run(main())
+    (text, kwargs), = command.sent
+    assert "🔎 100 lines matching <code>error$</code>" in text
+    assert "line 00010 error\n" in text and "ok" not in text
+    assert kwargs["parse_mode"] == "HTML"
+    assert store.get(7, 102).pages == 1
+
+    edit, = output.edits
+    assert f"Page 3/{entry.pages}," in edit
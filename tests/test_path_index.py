@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import os
+
+import pytest
+
+from config.settings import Setting
+from utils.path_index import PathIndex
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.setattr(Setting, "INDEX_REFRESH_INTERVAL", 0)
+    for i in range(7):
+        branch = tmp_path / f"dir{i}"
+        (branch / "logs").mkdir(parents=True)
+        for j in range(5):
+            (branch / f"app{j}.log").write_text("")
+            (branch / "logs" / f"old{j}.log").write_text("")
+        (branch / "notes.txt").write_text("")
+    (tmp_path / "skip" / "inner").mkdir(parents=True)
+    (tmp_path / "skip" / "inner" / "hidden.log").write_text("")
+
+    index = PathIndex([str(tmp_path)], [str(tmp_path / "skip" / "inner")])
+    index._run()
+    return tmp_path, index
+
+def test_pages_cover_every_sorted_match_once(tree):
+    root, index = tree
+    everything, total = index.search(".log", limit=10_000)
+    assert total == len(everything) == 70
+    assert everything == sorted(everything)
+
+    pages, offset = [], 0
+    while True:
+        page, page_total = index.search(".log", offset=offset, limit=9)
+        assert page_total == total
+        if not page:
+            break
+        pages.extend(page)
+        offset += 9
+    assert pages == everything
+    assert index.search(".log", offset=total, limit=9) == ([], total)
+
+def test_search_below_a_directory(tree):
+    root, index = tree
+    paths, total = index.search("*.log", under=str(root / "dir3" / "logs"))
+    assert total == 5
+    assert paths == [str(root / "dir3" / "logs" / f"old{j}.log") for j in range(5)]
+    assert index.search("*.log", under=str(root.parent)) == ([], 0)
+    assert index.search("*.log", under=str(root / "missing")) == ([], 0)
+
+def test_globs_match_whole_names_and_mark_directories(tree):
+    root, index = tree
+    paths, total = index.search("LOGS")
+    assert total == 7
+    assert all(path.endswith(os.sep + "logs/") for path in paths)
+    assert index.search("app?.log", under=str(root / "dir0"))[1] == 5
+    assert index.search("app[!0-3].log", under=str(root / "dir0"))[0] == [str(root / "dir0" / "app4.log")]
+    assert index.search("hidden")[1] == 0
+
+def test_refresh_picks_up_changed_directories(tree):
+    root, index = tree
+    directory = root / "dir2" / "logs"
+    (directory / "old0.log").unlink()
+    (directory / "new.log").write_text("")
+    (directory / "fresh").mkdir()
+    (directory / "fresh" / "deep.log").write_text("")
+    stat = os.stat(directory)
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert index.refresh() == 1
+    paths, _ = index.search("*.log", under=str(directory))
+    assert paths == sorted(str(directory / name) for name in (
+        "fresh/deep.log", "new.log", "old1.log", "old2.log", "old3.log", "old4.log",
+    ))
+    assert index.listdir(str(directory))[0] == "fresh/"
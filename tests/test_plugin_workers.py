@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from telegram import Update
+
+from manager import plugin_workers
+from manager.plugin_workers import ProcessPool
+from utils.file_cache import FileIdCache, file_cache
+
+ENTRY = {"files": [["screenshot.png", "AgACAgQAAx"]], "photo": True}
+
+async def cmd_remember(update, context):
+    """Runs in the worker: learns a file_id, then forgets another one."""
+    file_cache.put(dict(ENTRY), *context.args)
+    file_cache.discard({"files": [["old.png", "stale"]], "photo": True})
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = FileIdCache(str(tmp_path / "file_ids.json"))
+    cache.put({"files": [["old.png", "stale"]], "photo": True}, "sha256:old:photo")
+    monkeypatch.setattr(plugin_workers, "file_cache", cache)
+    return cache
+
+def test_file_ids_learned_in_a_worker_reach_the_bot_cache(cache):
+    async def main():
+        pool = ProcessPool(1)
+        context = SimpleNamespace(args=["sha256:abc:photo"], bot=SimpleNamespace(id=1, username="bot"))
+        try:
+            await pool.run("remember", __name__, "cmd_remember", "digest", Update(1), context)
+            # The worker is gone, the bot process still has the entry.
+            for worker in pool.idle:
+                worker.kill()
+                await worker.process.wait()
+        finally:
+            pool.close()
+        while cache._saving is not None and not cache._saving.done():
+            await cache._saving
+
+    asyncio.run(main())
+    assert cache.get("sha256:abc:photo") == ENTRY
+    assert cache.get("sha256:old:photo") is None
+    with open(cache.path, encoding="utf-8") as f:
+        assert json.load(f) == {"sha256:abc:photo": ENTRY}
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from utils.webhook import MAX_BODY, WebhookServer
+
+SECRET = "s3cret"
+UPDATE = json.dumps({"update_id": 7, "message": {
+    "message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"}, "text": "/help",
+}}).encode()
+
+def _server() -> WebhookServer:
+    application = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+    return WebhookServer(application, url="https://bot.example.com/hook", secret=SECRET)
+
+def _request(method="POST", path="/hook", secret=SECRET, body=UPDATE, length=None, extra=""):
+    headers = f"Content-Length: {len(body) if length is None else length}\r\n{extra}"
+    if secret is not None:
+        headers += f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n"
+    return f"{method} {path} HTTP/1.1\r\nHost: bot\r\n{headers}\r\n".encode() + body
+
+async def _handle(server: WebhookServer, raw: bytes, eof: bool = True):
+    reader = asyncio.StreamReader()
+    reader.feed_data(raw)
+    if eof:
+        reader.feed_eof()
+    request_line = await reader.readline()
+    return await asyncio.wait_for(server._handle(reader, request_line), 1)
+
+def test_accepts_an_update_and_keeps_the_connection():
+    async def main():
+        server = _server()
+        result = await _handle(server, _request())
+        return result, server
+    (status, keep_alive), server = asyncio.run(main())
+    assert (status, keep_alive) == (200, True)
+    assert server.received == 1
+    assert server.application.update_queue.get_nowait().update_id == 7
+
+def test_connection_close_is_honoured():
+    status, keep_alive = asyncio.run(_handle(_server(), _request(extra="Connection: close\r\n")))
+    assert (status, keep_alive) == (200, False)
+
+def test_rejections_happen_before_the_body_is_read():
+    # No body and no EOF: reading it would hang until the timeout.
+    cases = {
+        404: [_request(path="/other", body=b""), _request(method="GET", body=b"")],
+        403: [_request(secret="wrong", body=b"", length=10), _request(secret=None, body=b"", length=10)],
+        400: [_request(body=b"", length=-1), _request(body=b"", length="ten")],
+        413: [_request(body=b"", length=MAX_BODY + 1)],
+    }
+
+    async def main():
+        server = _server()
+        results = {}
+        for status, requests in cases.items():
+            results[status] = [(await _handle(server, raw, eof=False))[0] for raw in requests]
+        return results, server
+
+    results, server = asyncio.run(main())
+    assert results == {status: [status] * len(requests) for status, requests in cases.items()}
+    assert server.received == 0
+
+def test_malformed_requests_are_rejected():
+    async def main():
+        server = _server()
+        return [
+            (await _handle(server, raw))[0]
+            for raw in (b"POST\r\n\r\n", _request(body=b"not json"), _request(body=UPDATE[:-3]))
+        ]
+    assert asyncio.run(main()) == [400, 400, 400]
+
+def test_serves_keep_alive_requests_over_a_socket():
+    async def main():
+        server = _server()
+        listener = await asyncio.start_server(server._serve, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(_request() + _request() + _request(secret="wrong"))
+        await writer.drain()
+        responses = (await asyncio.wait_for(reader.read(), 2)).decode()
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return responses, server.received
+
+    responses, received = asyncio.run(main())
+    assert responses.count("200 OK") == 2
+    assert responses.endswith("403 Forbidden\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+    assert received == 2
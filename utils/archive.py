@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import fnmatch
+import os
+import queue
+import tarfile
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple
+
+from config.settings import Setting
+from utils.logger import Logger
+
+class _Stopped(Exception):
+    """Raised in the producer thread when the consumer went away."""
+
+def _gzip_member(block: bytes, level: int) -> bytes:
+    """Deflates one block as a complete gzip member; zlib releases the GIL while it works."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(block) + compressor.flush()
+
+class _BlockSink:
+    """
+    The file object tarfile writes to. It cuts the stream into blocks, hands
+    each block to the compressor pool and queues the pending result in
+    order. The queue is bounded, so the producer waits when the consumer
+    falls behind.
+    """
+
+    def __init__(self, pool: ThreadPoolExecutor, out: "queue.Queue[Optional[Future]]", stop: threading.Event,
+                 block_size: int, level: int):
+        self.pool = pool
+        self.out = out
+        self.stop = stop
+        self.block_size = block_size
+        self.level = level
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            block = bytes(self.buffer[:self.block_size])
+            del self.buffer[:self.block_size]
+            self.put(self.pool.submit(_gzip_member, block, self.level))
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.put(self.pool.submit(_gzip_member, bytes(self.buffer), self.level))
+            self.buffer.clear()
+
+    def put(self, item: Optional[Future]):
+        while True:
+            if self.stop.is_set():
+                raise _Stopped
+            try:
+                self.out.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+class DirectoryArchive:
+    """
+    Streams a directory as a `.tar.gz` without writing it to disk.
+
+    A thread walks the tree and writes a tar stream, which is cut into
+    `Setting.ARCHIVE_BLOCK_SIZE` blocks. Every block is compressed as its own
+    gzip member on `Setting.ARCHIVE_WORKERS` threads, and the members come out
+    in order. Concatenated gzip members are a valid gzip file, so the result
+    unpacks with a plain `tar -xzf`. Only a bounded number of blocks are in
+    flight, so memory stays flat however large the directory is.
+
+    Attributes:
+        files_total, bytes_total (int): What the walk found to archive.
+        files_done, bytes_done (int): What has been read so far.
+        skipped (List[str]): Files that could not be read.
+    """
+
+    def __init__(self, root: str, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None):
+        self.root = os.path.abspath(root)
+        self.name = os.path.basename(self.root.rstrip(os.sep)) or "root"
+        self.include = include or []
+        self.exclude = exclude or []
+        self.files_total = self.bytes_total = 0
+        self.files_done = self.bytes_done = 0
+        self.skipped: List[str] = []
+
+    def _matches(self, patterns: List[str], relative: str) -> bool:
+        name = os.path.basename(relative)
+        return any(fnmatch.fnmatch(relative, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+    def _unreadable(self, error: OSError):
+        self.skipped.append(error.filename or str(error))
+        Logger.debug("Skipped %s: %s", error.filename, error)
+
+    def scan(self) -> List[Tuple[str, str, int]]:
+        """
+        Walks the tree and returns `(path, name in archive, size)` for every entry to archive.
+        Exclude globs prune directories too; include globs only select files. Symlinks,
+        to directories too, are stored as links. Without include globs, empty directories
+        are kept as entries. Directories that cannot be read are added to `skipped`. Blocking.
+        """
+        members = []
+        for current, dirs, files in os.walk(self.root, onerror=self._unreadable):
+            relative_dir = os.path.relpath(current, self.root)
+            relative_dir = "" if relative_dir == "." else relative_dir
+            dirs[:] = sorted(d for d in dirs if not self._matches(self.exclude, os.path.join(relative_dir, d)))
+            # os.walk lists symlinks to directories with the directories but does not enter them.
+            links = [d for d in dirs if os.path.islink(os.path.join(current, d))]
+            dirs[:] = [d for d in dirs if d not in links]
+            before = len(members)
+            for name in sorted(files + links):
+                relative = os.path.join(relative_dir, name)
+                if self._matches(self.exclude, relative):
+                    continue
+                if self.include and not self._matches(self.include, relative):
+                    continue
+                path = os.path.join(current, name)
+                try:
+                    size = os.lstat(path).st_size
+                except OSError:
+                    continue
+                members.append((path, os.path.join(self.name, relative), size))
+            if relative_dir and not dirs and len(members) == before and not self.include:
+                members.append((current, os.path.join(self.name, relative_dir), 0))
+        self.files_total = len(members)
+        self.bytes_total = sum(size for _, _, size in members)
+        return members
+
+    def _produce(self, members: List[Tuple[str, str, int]], sink: _BlockSink):
+        try:
+            with tarfile.open(fileobj=sink, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+                for path, arcname, size in members:
+                    offset = tar.offset
+                    try:
+                        tar.add(path, arcname=arcname, recursive=False)
+                    except _Stopped:
+                        raise
+                    except OSError as e:
+                        # A file that fails to open is skipped; one that fails halfway
+                        # (it shrank while being read) would leave a broken member.
+                        if tar.offset != offset:
+                            raise
+                        self.skipped.append(path)
+                        Logger.debug("Skipped %s: %s", path, e)
+                    self.files_done += 1
+                    self.bytes_done += size
+            sink.flush()
+            sink.put(None)
+        except _Stopped:
+            pass
+        except BaseException as e:
+            failed: Future = Future()
+            failed.set_exception(e)
+            try:
+                sink.put(failed)
+            except _Stopped:
+                pass
+
+    async def stream(self, members: List[Tuple[str, str, int]]) -> AsyncIterator[bytes]:
+        """
+        Yields the compressed archive in order, piece by piece.
+
+        Args:
+            members: The result of `scan`.
+        """
+        workers = max(Setting.ARCHIVE_WORKERS, 1)
+        pending: "queue.Queue[Optional[Future]]" = queue.Queue(maxsize=workers * 2)
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="archive")
+        sink = _BlockSink(pool, pending, stop, Setting.ARCHIVE_BLOCK_SIZE, Setting.UPLOAD_COMPRESS_LEVEL)
+        producer = threading.Thread(target=self._produce, args=(members, sink), name="archive-tar", daemon=True)
+        producer.start()
+        try:
+            while True:
+                future = await asyncio.to_thread(pending.get)
+                if future is None:
+                    return
+                yield await asyncio.wrap_future(future)
+        finally:
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+            # Wake a `pending.get` still waiting on the thread pool after a cancel.
+            try:
+                pending.put_nowait(None)
+            except queue.Full:
+                pass
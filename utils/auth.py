@@ -21,19 +21,179 @@
 #  SOFTWARE.
 
 import os
+import json
+import asyncio
 from functools import wraps
+from typing import Dict, Iterable, Optional, Set
 from telegram import Update
-from telegram.ext import ContextTypes
+from telegram.ext import ApplicationHandlerStop, ContextTypes
 
-AUTHORIZED_USERS = set(filter(None, os.getenv('AUTHORIZED_USERS', '').split(',')))
+from config.settings import Setting
+from utils.logger import Logger
+
+def _parse_ids(values: Iterable) -> Set[int]:
+    ids = set()
+    for value in values:
+        try:
+            ids.add(int(str(value).strip()))
+        except ValueError:
+            if str(value).strip():
+                Logger.warning(f"Ignoring invalid user id: {value}")
+    return ids
+
+AUTHORIZED_USERS = _parse_ids(os.getenv('AUTHORIZED_USERS', '').split(','))
+
+class AccessControl:
+    """
+    Decides which users may use the bot and which commands they may run.
+
+    Users listed in `AUTHORIZED_USERS` are admins and may run every command.
+    The optional ACL file (`Setting.ACL_FILE`) adds roles and per-command
+    allow-lists:
+
+        {
+            "roles": {"operator": [111, 222], "viewer": [333]},
+            "commands": {"cmd": ["operator"], "screenshot": ["operator", "viewer", 444]}
+        }
+
+    Commands that are not listed are open to every known user. Everything is
+    compiled into sets of integer user ids, so a check is one or two set
+    lookups.
+
+    Attributes:
+        path (str): The ACL file.
+        users (Set[int]): Every user allowed to talk to the bot.
+        roles (Dict[str, Set[int]]): The members of every role.
+        command_users (Dict[str, Set[int]]): The users allowed to run each restricted command.
+    """
+
+    def __init__(self, path: str = Setting.ACL_FILE, admins: Set[int] = AUTHORIZED_USERS):
+        self.path = path
+        self.admins = set(admins)
+        self.users: Set[int] = set(self.admins)
+        self.roles: Dict[str, Set[int]] = {"admin": set(self.admins)}
+        self.command_users: Dict[str, Set[int]] = {}
+        self._mtime: Optional[int] = None
+        self.load()
+
+    def load(self):
+        """Reads the ACL file, keeping the current rules if it is invalid."""
+        try:
+            self._mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self._mtime = None
+            self._compile({})
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._compile(json.load(f))
+            Logger.info(f"Loaded access rules for {len(self.users)} user(s) from {self.path}")
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            Logger.error(f"Invalid ACL file {self.path}, keeping the previous rules: {e}")
+
+    def _compile(self, config: Dict):
+        roles = {"admin": set(self.admins)}
+        for role, members in (config.get("roles") or {}).items():
+            roles.setdefault(role, set()).update(_parse_ids(members))
+
+        command_users = {}
+        for command, allowed in (config.get("commands") or {}).items():
+            ids = set(self.admins)
+            for item in allowed:
+                if isinstance(item, str) and item in roles:
+                    ids |= roles[item]
+                else:
+                    ids |= _parse_ids([item])
+            command_users[command.lower()] = ids
+
+        users = set().union(*roles.values(), *command_users.values())
+        self.roles, self.command_users, self.users = roles, command_users, users
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reloads the ACL file if its modification time moved.
+
+        Returns:
+            bool: True if the file was reloaded.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        self.load()
+        return True
+
+    async def watch(self, interval: float = Setting.ACL_RELOAD_INTERVAL):
+        """
+        Polls the ACL file and applies changes without a restart.
+
+        Args:
+            interval (float): Seconds between two checks.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.reload_if_changed()
+
+    def allows(self, user_id: int, command: Optional[str] = None) -> bool:
+        """
+        Checks whether a user may run a command.
+
+        Args:
+            user_id (int): The Telegram user id.
+            command (str, optional): The command name without the leading slash.
+
+        Returns:
+            bool: True if the user is known and allowed to run the command.
+        """
+        if user_id not in self.users:
+            return False
+        if command is None:
+            return True
+        allowed = self.command_users.get(command)
+        return allowed is None or user_id in allowed
+
+acl = AccessControl()
+
+def command_of(update: Update) -> Optional[str]:
+    """
+    The command an update invokes, or None if it is not a command.
+    A document counts as `download`, so the ACL decides who may write files.
+    """
+    message = update.message or update.edited_message
+    if message is not None and message.document is not None:
+        return "download"
+    text = message.text if message is not None else None
+    if not text or text[0] != "/":
+        return None
+    words = text[1:].split(None, 1)
+    command = words[0].split("@", 1)[0].lower() if words else ""
+    return command or None
+
+async def gate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Drops updates from users who may not run them, before any handler sees them.
+
+    Registered in `Setting.AUTH_HANDLER_GROUP`, which runs ahead of every other
+    group. Unauthorized updates are dropped silently, so strangers cannot make
+    the bot do any outbound work.
+    """
+    user = update.effective_user
+    if user is None or user.id not in acl.users:
+        raise ApplicationHandlerStop
+    command = command_of(update)
+    if command is not None and not acl.allows(user.id, command):
+        Logger.debug("User %s is not allowed to run /%s", user.id, command, user=user.id, command=command)
+        raise ApplicationHandlerStop
 
 def authorized(func):
-    """Allow only authorized users to access the handler."""
+    """Allow only authorized users to access the handler (unauthorized calls are ignored)."""
     @wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        uid = str(update.effective_user.id)
-        if uid not in AUTHORIZED_USERS:
-            await update.message.reply_text("Unauthorized.")
+        user = update.effective_user
+        if user is None or not acl.allows(user.id):
             return
         return await func(update, context)
     
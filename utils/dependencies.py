@@ -20,23 +20,37 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+import os
+import re
 import sys
+import site
+import hashlib
 import subprocess
-import pkg_resources
+from importlib import metadata
 
 # from config.settings import Setting
 # from model.exception import DependencyError, RequirementsFileNotFoundError
 
+REQUIREMENTS = "requirements.txt"
+# Runs before `.env` is loaded and before config.settings may be imported,
+# so only a CACHE_DIR from the real environment applies here.
+STAMP_FILE = os.path.join(os.getenv("CACHE_DIR", ".cache"), "dependencies.stamp")
+
+_REQUIREMENT = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*(==)?\s*([^;\s]*)")
+
 def install_dependencies():
     """
     Installs missing dependencies listed in the requirements file.
 
-    This function first checks for any missing dependencies and then attempts 
-    to install them using `pip`. If an installation fails, it raises an exception.
-
-    Raises:
-        DependencyError: If installation of any package fails.
+    The check is skipped entirely when the requirements file, the interpreter
+    and the site-packages directories are unchanged since the last successful
+    check. Otherwise missing packages are installed with `pip`, and the stamp
+    is only written once every requirement is satisfied.
     """
+    stamp = get_stamp()
+    if stamp is not None and _read_stamp() == stamp:
+        return
+
     missing_packages = check_dependencies()
     
     if missing_packages:
@@ -48,7 +62,54 @@ def install_dependencies():
             )
         except subprocess.CalledProcessError as e:
             # raise DependencyError(f"Failed to install dependencies: {e.output.decode()}") from e
-            pass
+            return
+        # pip touched site-packages, so the stamp has to be taken again.
+        stamp = get_stamp()
+
+    if stamp is not None:
+        _write_stamp(stamp)
+
+def get_stamp():
+    """
+    Fingerprints everything the dependency check depends on.
+
+    The stamp covers the content of the requirements file, the interpreter
+    and the modification time of every site-packages directory, which
+    changes whenever a distribution is installed or removed.
+
+    Returns:
+        str: A hex digest, or None if the requirements file cannot be read.
+    """
+    try:
+        with open(REQUIREMENTS, "rb") as f:
+            digest = hashlib.sha256(f.read())
+    except OSError:
+        return None
+
+    digest.update(f"{sys.executable}\0{sys.version}\0".encode("utf-8"))
+    paths = list(site.getsitepackages()) if hasattr(site, "getsitepackages") else []
+    paths.append(site.getusersitepackages())
+    for path in sorted(set(paths)):
+        try:
+            digest.update(f"{path}\0{os.stat(path).st_mtime_ns}\0".encode("utf-8"))
+        except OSError:
+            digest.update(f"{path}\0-\0".encode("utf-8"))
+    return digest.hexdigest()
+
+def _read_stamp():
+    try:
+        with open(STAMP_FILE, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _write_stamp(stamp: str):
+    try:
+        os.makedirs(os.path.dirname(STAMP_FILE) or ".", exist_ok=True)
+        with open(STAMP_FILE, "w", encoding="utf-8") as f:
+            f.write(stamp)
+    except OSError:
+        pass
 
 def get_dependencies():
     """
@@ -62,7 +123,7 @@ def get_dependencies():
         IOError: If there is an error reading the file.
     """
     try: 
-        with open('requirements.txt', 'r', encoding="utf-8") as f:
+        with open(REQUIREMENTS, 'r', encoding="utf-8") as f:
             return [line.strip() for line in f if line.strip() and not line.startswith("#")]
     except FileNotFoundError as e:    
         # raise RequirementsFileNotFoundError(f"Requirements file not found: {Setting.REQUIREMENTS}") from e
@@ -76,21 +137,28 @@ def check_dependencies():
     Checks if all required dependencies are installed.
 
     This function reads the dependencies from the `requirements.txt` file and 
-    verifies if they are installed. It returns a list of missing dependencies.
+    verifies them with `importlib.metadata`. Pinned requirements (`name==version`)
+    must match the installed version; any other specifier only requires the
+    distribution to be present.
 
     Returns:
         list[str]: A list of missing package names.
     """
-    dependencies = get_dependencies()
+    dependencies = get_dependencies() or []
     missing_packages = []
     
     for package in dependencies:
+        match = _REQUIREMENT.match(package)
+        if not match:
+            continue
+        name, pinned, wanted = match.groups()
         try:
-            pkg_resources.require(package)
-        except pkg_resources.DistributionNotFound:
+            installed = metadata.version(name)
+        except metadata.PackageNotFoundError:
             missing_packages.append(package)
-        except pkg_resources.VersionConflict as e:
-            print(f"Version conflict detected for {package}: {e}")
+            continue
+        if pinned and wanted and installed != wanted:
+            print(f"Version conflict detected for {package}: {installed} is installed")
             missing_packages.append(package)
             
-    return missing_packages
\ No newline at end of file
+    return missing_packages
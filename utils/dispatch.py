@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config.settings import Setting
+from utils.auth import acl, command_of
+from utils.logger import Logger
+
+class _Slot:
+    """A lock shared by the updates of one key, dropped once nobody uses it."""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class ConcurrentDispatcher(BaseUpdateProcessor):
+    """
+    Processes updates concurrently while keeping each chat in order.
+
+    Updates from the same chat run one after the other, updates from
+    different chats run in parallel on up to `workers` slots. A command can be
+    capped to a number of simultaneous runs (see `PluginManager.scan_limits`);
+    an update waiting for its cap keeps its chat's place in line but not a
+    worker slot. When `backlog` updates are already queued or running, new
+    updates are dropped instead of piling up.
+
+    Updates from users who may not use the bot are dropped before any of
+    that, so strangers cannot fill the backlog. Caps only hold while the
+    handler runs: a command started as a background job (`/cmd ... &`)
+    returns at once and is bounded by `Setting.JOBS_WORKERS` instead.
+
+    Attributes:
+        backlog (int): The maximum number of updates queued or running.
+        pending (int): The number of updates queued or running.
+        shed (int): The number of updates dropped because the backlog was full.
+        rejected (int): The number of updates dropped because the sender is unknown.
+    """
+
+    def __init__(self, workers: int = Setting.UPDATE_WORKERS, backlog: int = Setting.UPDATE_BACKLOG,
+                 command_limit: Optional[Callable[[str], Optional[int]]] = None):
+        """
+        Args:
+            workers (int): The number of updates processed at the same time.
+            backlog (int): The maximum number of updates queued or running.
+            command_limit (Callable[[str], Optional[int]], optional): Returns the cap of a command, if any.
+        """
+        super().__init__(workers)
+        self.backlog = max(workers, backlog)
+        self.command_limit = command_limit or (lambda command: None)
+        self.pending = 0
+        self.shed = 0
+        self.rejected = 0
+        self._workers = asyncio.Semaphore(self.max_concurrent_updates)
+        self._chats: Dict[int, _Slot] = {}
+        self._commands: Dict[str, Tuple[int, asyncio.Semaphore]] = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def process_update(self, update: object, coroutine: Awaitable) -> None:
+        """
+        Overrides the base implementation, which waits for a worker slot first,
+        so that the backlog is enforced and chat ordering is settled before an
+        update takes a worker slot.
+        """
+        if isinstance(update, Update):
+            user = update.effective_user
+            if user is None or user.id not in acl.users:
+                self.rejected += 1
+                coroutine.close()
+                return
+
+        if self.pending >= self.backlog:
+            self.shed += 1
+            coroutine.close()
+            if self.shed == 1 or self.shed % 100 == 0:
+                Logger.warning("Update backlog full (%d), %d update(s) dropped so far", self.backlog, self.shed)
+            return
+
+        self.pending += 1
+        chat = update.effective_chat if isinstance(update, Update) else None
+        slot = None
+        if chat is not None:
+            slot = self._chats.get(chat.id)
+            if slot is None:
+                slot = self._chats[chat.id] = _Slot()
+            slot.users += 1
+        try:
+            if slot is None:
+                await self._run(update, coroutine)
+            else:
+                async with slot.lock:
+                    await self._run(update, coroutine)
+        except BaseException:
+            # Never leave the handler coroutine unawaited, whatever failed first.
+            coroutine.close()
+            raise
+        finally:
+            self.pending -= 1
+            if slot is not None:
+                slot.users -= 1
+                if not slot.users:
+                    del self._chats[chat.id]
+
+    async def _run(self, update: object, coroutine: Awaitable):
+        try:
+            limiter = self._command_semaphore(update)
+        except Exception as e:
+            Logger.error("Could not look up the command cap of an update: %s", e)
+            limiter = None
+        if limiter is None:
+            async with self._workers:
+                await self.do_process_update(update, coroutine)
+            return
+        async with limiter:
+            async with self._workers:
+                await self.do_process_update(update, coroutine)
+
+    def _command_semaphore(self, update: object) -> Optional[asyncio.Semaphore]:
+        if not isinstance(update, Update):
+            return None
+        command = command_of(update)
+        limit = self.command_limit(command) if command else None
+        if not limit:
+            return None
+        current = self._commands.get(command)
+        if current is None or current[0] != limit:
+            # A reload changed the cap: new runs use a fresh semaphore, the
+            # ones already running finish on the old one.
+            current = self._commands[command] = (limit, asyncio.Semaphore(limit))
+        return current[1]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        await coroutine
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from typing import BinaryIO, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from telegram import Document, Update
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+
+from config.settings import Setting
+from utils.logger import Logger
+from utils.outbound import COALESCE
+
+SHA256 = re.compile(r"^sha256=([0-9a-fA-F]{64})$")
+USAGE = "Send a document with an optional caption: [-f] [path or dir/] [sha256=<hex>]"
+
+_slots: Optional[asyncio.Semaphore] = None
+
+class DownloadError(Exception):
+    """A document could not be saved; the message is shown to the user."""
+
+def allowed_dirs() -> List[str]:
+    dirs = [d for d in Setting.DOWNLOAD_ALLOWED_DIRS.split(os.pathsep) if d] or [Setting.DOWNLOAD_DIR]
+    return [os.path.realpath(d) for d in dirs]
+
+def resolve_target(path: Optional[str], file_name: str) -> str:
+    """
+    Works out where a document goes and checks it against the directory policy.
+
+    Relative paths are taken from `Setting.DOWNLOAD_DIR`; a path ending in a
+    separator, or naming an existing directory, receives the document under its
+    own name. The real path, with symlinks resolved, has to stay inside one of
+    `Setting.DOWNLOAD_ALLOWED_DIRS` (by default only `Setting.DOWNLOAD_DIR`).
+
+    Raises:
+        DownloadError: If the target is outside the allowed directories.
+    """
+    name = os.path.basename(file_name.replace("\\", "/"))
+    if name in ("", ".", ".."):
+        raise DownloadError("The document has no usable file name, give a full path in the caption")
+    path = os.path.join(Setting.DOWNLOAD_DIR, os.path.expanduser(path or ""))
+    if path.endswith(("/", os.sep)) or os.path.isdir(path):
+        path = os.path.join(path, name)
+    target = os.path.realpath(path)
+    for root in allowed_dirs():
+        if os.path.commonpath([root, target]) == root and target != root:
+            return target
+    raise DownloadError(f"{target} is outside the allowed directories")
+
+def parse_caption(caption: Optional[str]) -> Tuple[Optional[str], Optional[str], bool]:
+    """Splits a caption into (path, sha256, overwrite)."""
+    path, checksum, overwrite = [], None, False
+    for word in (caption or "").split():
+        match = SHA256.match(word)
+        if match:
+            checksum = match.group(1).lower()
+        elif word == "-f" and not path:
+            overwrite = True
+        else:
+            path.append(word)
+    return " ".join(path) or None, checksum, overwrite
+
+def _write(file: BinaryIO, digest, chunk: bytes):
+    file.write(chunk)
+    digest.update(chunk)
+
+def _finish(file: BinaryIO, temp: str, target: str):
+    """Flushes the temporary file to disk, gives it the target's mode and renames it into place."""
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+    try:
+        mode = os.stat(target).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(temp, mode)
+    os.replace(temp, target)
+
+async def _chunks(file_path: str):
+    """Yields the content of a Telegram file piece by piece, from the Bot API or from local disk."""
+    if urlsplit(file_path).scheme in ("http", "https"):
+        timeout = httpx.Timeout(30, read=Setting.DOWNLOAD_TIMEOUT)
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            async with client.stream("GET", file_path) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(Setting.DOWNLOAD_CHUNK_SIZE):
+                    yield chunk
+        return
+
+    # A local Bot API server (--local) hands out paths on its own disk.
+    with open(file_path, "rb") as source:
+        while True:
+            chunk = await asyncio.to_thread(source.read, Setting.DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+async def download_document(bot, document: Document, target: str,
+                            checksum: Optional[str] = None, overwrite: bool = False) -> Tuple[int, str]:
+    """
+    Streams a document to `target` without holding it in memory.
+
+    The content is written to a temporary file next to the target in chunks
+    of `Setting.DOWNLOAD_CHUNK_SIZE`, hashed on the way, and renamed over the
+    target only once the size and checksum are right, so the target is never
+    seen half-written. At most `Setting.DOWNLOAD_PARALLEL` downloads run at once.
+
+    Args:
+        bot: The bot that received the document.
+        document (Document): The document to save.
+        target (str): The final path, see `resolve_target`.
+        checksum (str, optional): Expected SHA-256 as hex.
+        overwrite (bool): Replace an existing file.
+
+    Returns:
+        Tuple[int, str]: The size in bytes and the SHA-256 of what was written.
+
+    Raises:
+        DownloadError: If the target exists, or the content does not match.
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(Setting.DOWNLOAD_PARALLEL)
+
+    if os.path.isdir(target):
+        raise DownloadError(f"{target} is a directory")
+    if os.path.exists(target) and not overwrite:
+        raise DownloadError(f"{target} already exists, add -f to the caption to replace it")
+
+    async with _slots:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        telegram_file = await bot.get_file(document.file_id)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(target), prefix=f".{os.path.basename(target)}.", suffix=".part")
+        file = os.fdopen(fd, "wb")
+        digest, size = hashlib.sha256(), 0
+        try:
+            async for chunk in _chunks(telegram_file.file_path):
+                await asyncio.to_thread(_write, file, digest, chunk)
+                size += len(chunk)
+            if document.file_size and size != document.file_size:
+                raise DownloadError(f"Received {size} bytes, expected {document.file_size}")
+            if checksum and digest.hexdigest() != checksum:
+                raise DownloadError(f"Checksum mismatch: got sha256={digest.hexdigest()}")
+            await asyncio.to_thread(_finish, file, temp, target)
+        except BaseException:
+            file.close()
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+            raise
+    return size, digest.hexdigest()
+
+def _redact(error: BaseException, token: str) -> str:
+    """The text of an error without the bot token, which file URLs embed."""
+    return str(error).replace(token, "<token>") if token else str(error)
+
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Saves a document sent to the bot on this host."""
+    message = update.effective_message
+    document = message.document
+    path, checksum, overwrite = parse_caption(message.caption)
+    try:
+        target = resolve_target(path, document.file_name or document.file_unique_id)
+        size, sha256 = await download_document(context.bot, document, target, checksum, overwrite)
+    except DownloadError as e:
+        await message.reply_text(f"⚠️ {e}\n{USAGE}", rate_limit_args=COALESCE)
+        return
+    except TelegramError as e:
+        # get_file refuses files over 20 MB on the public Bot API, among others.
+        Logger.error("Telegram refused %s: %s", document.file_name, _redact(e, context.bot.token))
+        hint = "\nLarger files need a local Bot API server (BOT_API_URL)." if "too big" in str(e).lower() else ""
+        await message.reply_text(
+            f"⚠️ Telegram refused the download: {_redact(e, context.bot.token)}{hint}", rate_limit_args=COALESCE
+        )
+        return
+    except (OSError, httpx.HTTPError) as e:
+        error = _redact(e, context.bot.token)
+        Logger.error("Failed to save %s: %s", document.file_name, error)
+        await message.reply_text(f"⚠️ Failed to save the document: {error}", rate_limit_args=COALESCE)
+        return
+    Logger.info("Saved %s (%d bytes)", target, size, path=target, size=size)
+    await message.reply_text(f"✅ Saved {target} ({size} bytes)\nsha256={sha256}")
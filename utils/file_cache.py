@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from telegram.error import BadRequest
+
+from config.settings import Setting
+from utils.logger import Logger
+
+class StaleFileId(BadRequest):
+    """
+    Telegram rejected a cached file_id.
+
+    Attributes:
+        sent (List): The messages of the entry delivered before the rejected one.
+    """
+
+    def __init__(self, message: str, sent: List):
+        super().__init__(message)
+        self.sent = sent
+
+class FileIdCache:
+    """
+    Remembers the Telegram file_id of content that was already uploaded.
+
+    A file_id can be sent again to any chat without uploading the bytes. An
+    entry is stored under up to two keys: the stat key of a file (path, size,
+    mtime) for instant hits on unchanged files, and the SHA-256 of the
+    content, for the same bytes under another name or generated again (e.g.
+    identical screenshots). Entries are kept in LRU order in a small JSON
+    index, capped at `Setting.FILE_CACHE_ENTRIES` keys.
+
+    An entry is a dict with "files", the [filename, file_id] of every
+    document that makes up the upload, in the order they were sent.
+
+    The index is read on first use. Only the bot process writes it: plugin
+    worker processes set `persist` to False and `forward` every change to
+    the bot process, which applies it to its own cache and saves it.
+
+    Attributes:
+        path (str): The JSON index.
+        entries (OrderedDict): The entries, least recently used first.
+        persist (bool): Whether changes are written back to `path`.
+        forward (Callable[[str, tuple], None], optional): Called with "put" or
+            "discard" and the arguments of every change.
+    """
+
+    def __init__(self, path: str = Setting.FILE_CACHE, max_entries: int = Setting.FILE_CACHE_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.persist = True
+        self.forward: Optional[Callable[[str, tuple], None]] = None
+        self._loaded = False
+        self._dirty = False
+        self._saving: Optional[asyncio.Task] = None
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Entries added before the first read are the most recent.
+        loaded.update(self.entries)
+        self.entries = OrderedDict(loaded)
+
+    @staticmethod
+    def stat_key(path: str, stat: os.stat_result, variant: str = "") -> str:
+        return f"stat:{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{variant}"
+
+    @staticmethod
+    def content_key(sha256: str, variant: str = "") -> str:
+        return f"sha256:{sha256}:{variant}"
+
+    def get(self, *keys: Optional[str]) -> Optional[Dict]:
+        """Returns the entry of the first key found, marking it recently used."""
+        if self.max_entries <= 0:
+            return None
+        self._load()
+        for key in keys:
+            if key and key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        return None
+
+    def put(self, entry: Dict, *keys: Optional[str]):
+        """Stores an entry under every given key and saves the index in the background."""
+        if self.max_entries <= 0 or not entry.get("files"):
+            return
+        self._load()
+        for key in keys:
+            if key:
+                self.entries[key] = entry
+                self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self._schedule_save()
+        if self.forward is not None:
+            self.forward("put", (entry, *keys))
+
+    def discard(self, entry: Dict):
+        """Drops every key of an entry, e.g. when Telegram no longer accepts its file_id."""
+        self._load()
+        for key in [key for key, value in self.entries.items() if value is entry or value == entry]:
+            del self.entries[key]
+        self._schedule_save()
+        if self.forward is not None:
+            self.forward("discard", (entry,))
+
+    def _schedule_save(self):
+        if not self.persist:
+            return
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._dirty = False
+            self._write(dict(self.entries))
+            return
+        if self._saving is None or self._saving.done():
+            self._saving = loop.create_task(self._save())
+
+    async def _save(self):
+        # The snapshot is taken on the loop, only the write runs in a thread.
+        while self._dirty:
+            self._dirty = False
+            await asyncio.to_thread(self._write, dict(self.entries))
+
+    def _write(self, snapshot: Dict):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            Logger.warning("Could not write file cache %s: %s", self.path, e)
+
+    async def send(self, bot, chat_id: int, entry: Dict, caption: Optional[str] = None) -> List:
+        """
+        Sends every document of an entry by file_id.
+
+        Args:
+            bot: The bot used to send.
+            chat_id (int): Destination chat.
+            entry (Dict): A cache entry.
+            caption (str, optional): Caption of the first document.
+
+        Returns:
+            List: The messages sent.
+
+        Raises:
+            StaleFileId: If Telegram rejects a file_id; the entry is discarded.
+        """
+        messages = []
+        try:
+            for index, (filename, file_id) in enumerate(entry["files"]):
+                kwargs = {"caption": caption} if caption and index == 0 else {}
+                if entry.get("photo"):
+                    messages.append(await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs))
+                else:
+                    messages.append(await bot.send_document(chat_id=chat_id, document=file_id, **kwargs))
+        except BadRequest as e:
+            self.discard(entry)
+            raise StaleFileId(e.message, messages) from e
+        return messages
+
+file_cache = FileIdCache()
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import fnmatch
+import hashlib
+import hmac
+import itertools
+import json
+import math
+import os
+import secrets
+import socket
+import ssl
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+from config.settings import Setting
+from utils.logger import Logger
+from utils.process import CommandResult, run_command
+
+MAX_FRAME = 16 * 1024 * 1024
+HEADER = struct.Struct(">I")
+HANDSHAKE_TIMEOUT = 10
+PING_INTERVAL = 30
+# Extra seconds the coordinator waits for a result after the command timeout.
+RESULT_GRACE = 10
+
+class FleetError(Exception):
+    """A host could not run a command (disconnected, timed out, protocol error)."""
+
+def _decode(data: bytes) -> Dict:
+    message = json.loads(data)
+    if not isinstance(message, dict):
+        raise FleetError("malformed message")
+    return message
+
+async def _read_payload(reader: asyncio.StreamReader) -> bytes:
+    size, = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if size > MAX_FRAME:
+        raise FleetError(f"frame of {size} bytes is too large")
+    return await reader.readexactly(size)
+
+async def read_frame(reader: asyncio.StreamReader) -> Dict:
+    """Reads one length-prefixed JSON message."""
+    return _decode(await _read_payload(reader))
+
+def write_frame(writer: asyncio.StreamWriter, message: Dict):
+    """Queues one length-prefixed JSON message; await writer.drain() to flush it."""
+    data = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    writer.write(HEADER.pack(len(data)) + data)
+
+def _mac(token: str, role: str, nonce: str) -> str:
+    return hmac.new(token.encode("utf-8"), f"{role}:{nonce}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+def session_key(token: str, challenge: str, nonce: str) -> bytes:
+    """The key of one connection, derived from the token and the nonces of both sides."""
+    return hmac.new(token.encode("utf-8"), f"session:{challenge}:{nonce}".encode("utf-8"), hashlib.sha256).digest()
+
+class Channel:
+    """
+    The messages of a connection after the handshake.
+
+    Every frame carries an HMAC under the session key over the sender's role,
+    a per-direction sequence number and the payload, so a frame injected,
+    replayed or reordered on the way is rejected even without TLS.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, key: bytes, role: str, peer: str):
+        self.reader = reader
+        self.writer = writer
+        self.key = key
+        self.role = role
+        self.peer = peer
+        self._sent = 0
+        self._received = 0
+
+    def _sign(self, role: str, seq: int, payload: bytes) -> bytes:
+        return hmac.new(self.key, f"{role}:{seq}:".encode("utf-8") + payload, hashlib.sha256).digest()
+
+    async def send(self, message: Dict):
+        payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        mac = self._sign(self.role, self._sent, payload)
+        self._sent += 1
+        self.writer.write(HEADER.pack(len(mac) + len(payload)) + mac + payload)
+        await self.writer.drain()
+
+    async def recv(self) -> Dict:
+        data = await _read_payload(self.reader)
+        mac, payload = data[:hashlib.sha256().digest_size], data[hashlib.sha256().digest_size:]
+        if not hmac.compare_digest(mac, self._sign(self.peer, self._received, payload)):
+            raise FleetError("frame failed authentication")
+        self._received += 1
+        return _decode(payload)
+
+def _parse_timeout(value) -> float:
+    """The timeout of a run request: the default when absent, otherwise a finite positive number."""
+    if value is None:
+        return Setting.CMD_TIMEOUT
+    timeout = float(value)
+    if not math.isfinite(timeout) or timeout <= 0:
+        raise ValueError(f"invalid timeout {value!r}")
+    return timeout
+
+@dataclass
+class AgentConnection:
+    """An agent connected to the coordinator."""
+    name: str
+    address: str
+    channel: Channel
+    connected: float = field(default_factory=time.time)
+    pending: Dict[int, asyncio.Future] = field(default_factory=dict)
+
+    def close(self, reason: str):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(FleetError(reason))
+        self.pending.clear()
+        self.channel.writer.close()
+
+class Coordinator:
+    """
+    Accepts agents from other hosts and runs commands on them.
+
+    Agents keep one persistent connection each. Both sides prove they know
+    `Setting.FLEET_TOKEN` with an HMAC over a nonce chosen by the other side,
+    so the token itself never travels and an agent never obeys a server that
+    does not know it. Every later message is authenticated with a key derived
+    from both nonces (see `Channel`). With `Setting.FLEET_CERT` the
+    connection is also encrypted with TLS. Messages are length-prefixed JSON.
+
+    Attributes:
+        agents (Dict[str, AgentConnection]): The connected agents by name.
+    """
+
+    def __init__(self, token: Optional[str] = Setting.FLEET_TOKEN):
+        self.token = token
+        self.agents: Dict[str, AgentConnection] = {}
+        self._ids = itertools.count(1)
+
+    async def serve(self, host: str = Setting.FLEET_LISTEN, port: int = Setting.FLEET_PORT):
+        """Accepts agents until cancelled."""
+        if not self.token:
+            Logger.error("FLEET_TOKEN not set, agent mode disabled")
+            return
+        context = None
+        if Setting.FLEET_CERT:
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(Setting.FLEET_CERT, Setting.FLEET_KEY)
+        try:
+            server = await asyncio.start_server(self._accept, host, port, ssl=context, limit=MAX_FRAME)
+        except OSError as e:
+            Logger.error("Could not listen for agents on %s:%s: %s", host, port, e)
+            return
+        Logger.info(f"Waiting for agents on {host}:{port}{' (TLS)' if context else ''}")
+        if context is None:
+            Logger.warning("FLEET_CERT not set: agent traffic is authenticated but not encrypted")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for agent in list(self.agents.values()):
+                agent.close("coordinator stopped")
+
+    async def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        address = f"{peer[0]}:{peer[1]}" if peer else "?"
+        try:
+            nonce = secrets.token_hex(16)
+            write_frame(writer, {"type": "challenge", "nonce": nonce})
+            await writer.drain()
+            hello = await asyncio.wait_for(read_frame(reader), HANDSHAKE_TIMEOUT)
+            name = str(hello.get("name", ""))
+            agent_nonce = str(hello.get("nonce", ""))
+            if hello.get("type") != "hello" or not name or not hmac.compare_digest(
+                str(hello.get("mac", "")), _mac(self.token, "agent", nonce)
+            ):
+                Logger.warning("Rejected agent connection from %s", address)
+                writer.close()
+                return
+            write_frame(writer, {"type": "welcome", "mac": _mac(self.token, "coordinator", agent_nonce)})
+            await writer.drain()
+        except (asyncio.CancelledError, asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError, FleetError, ssl.SSLError):
+            writer.close()
+            return
+
+        channel = Channel(reader, writer, session_key(self.token, nonce, agent_nonce), "coordinator", "agent")
+        agent = AgentConnection(name, address, channel)
+        previous = self.agents.get(name)
+        if previous is not None:
+            previous.close("replaced by a new connection")
+        self.agents[name] = agent
+        Logger.info(f"Agent {name} connected from {address}")
+
+        pinger = asyncio.ensure_future(self._ping(agent))
+        try:
+            while True:
+                message = await channel.recv()
+                if message.get("type") == "result":
+                    future = agent.pending.pop(message.get("id"), None)
+                    if future is not None and not future.done():
+                        future.set_result(message)
+        except FleetError as e:
+            Logger.warning("Dropping agent %s: %s", name, e)
+        except (asyncio.CancelledError, asyncio.IncompleteReadError, ConnectionError, ValueError, ssl.SSLError):
+            pass
+        finally:
+            pinger.cancel()
+            agent.close("disconnected")
+            if self.agents.get(name) is agent:
+                del self.agents[name]
+                Logger.info(f"Agent {name} disconnected")
+
+    async def _ping(self, agent: AgentConnection):
+        try:
+            while True:
+                await asyncio.sleep(PING_INTERVAL)
+                await agent.channel.send({"type": "ping"})
+        except (ConnectionError, RuntimeError):
+            # The read loop notices the disconnect and cleans up.
+            pass
+
+    def match(self, patterns: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        Resolves host patterns (`web*`, `db1`, `all`) against the connected agents.
+
+        Returns:
+            Tuple[List[str], List[str]]: The matching agent names, and the patterns that matched nothing.
+        """
+        names, unmatched = [], []
+        for pattern in patterns:
+            found = sorted(self.agents) if pattern == "all" else fnmatch.filter(sorted(self.agents), pattern)
+            if not found:
+                unmatched.append(pattern)
+            names.extend(name for name in found if name not in names)
+        return names, unmatched
+
+    async def run(self, names: List[str], command: str, timeout: Optional[float] = None) -> Dict[str, Union[CommandResult, Exception]]:
+        """
+        Runs a command on several agents in parallel.
+
+        Args:
+            names (List[str]): The agents to run the command on.
+            command (str): The shell command line.
+            timeout (float, optional): Seconds before each host kills the command (default `Setting.CMD_TIMEOUT`).
+
+        Returns:
+            Dict[str, Union[CommandResult, Exception]]: The result of every host, or why it has none.
+        """
+        timeout = Setting.CMD_TIMEOUT if timeout is None else timeout
+        results = await asyncio.gather(*(self._run_on(name, command, timeout) for name in names), return_exceptions=True)
+        return dict(zip(names, results))
+
+    async def _run_on(self, name: str, command: str, timeout: float) -> CommandResult:
+        agent = self.agents.get(name)
+        if agent is None:
+            raise FleetError("not connected")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        agent.pending[request_id] = future
+        try:
+            await agent.channel.send({"type": "run", "id": request_id, "command": command, "timeout": timeout})
+            message = await asyncio.wait_for(future, timeout + RESULT_GRACE)
+        except asyncio.TimeoutError:
+            raise FleetError("no answer") from None
+        except ConnectionError as e:
+            raise FleetError(str(e)) from None
+        finally:
+            agent.pending.pop(request_id, None)
+        return CommandResult(
+            output=str(message.get("output", "")),
+            returncode=message.get("returncode"),
+            timed_out=bool(message.get("timed_out")),
+            truncated=bool(message.get("truncated")),
+        )
+
+class Agent:
+    """
+    Connects to a coordinator and runs the commands it sends.
+
+    Reconnects with exponential backoff when the connection drops. The
+    coordinator has to prove it knows the token before any command is
+    accepted.
+    """
+
+    def __init__(self, host: str, port: int, token: str, name: Optional[str] = None,
+                 tls: bool = False, cafile: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.name = name or socket.gethostname()
+        self.context = None
+        if tls or cafile:
+            self.context = ssl.create_default_context(cafile=cafile)
+
+    async def run_forever(self):
+        delay = 1.0
+        while True:
+            try:
+                await self._session()
+                delay = 1.0
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, FleetError) as e:
+                Logger.warning("Connection to %s:%s lost: %s", self.host, self.port, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+
+    async def _session(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.context, limit=MAX_FRAME)
+        tasks = set()
+        try:
+            challenge = await asyncio.wait_for(read_frame(reader), HANDSHAKE_TIMEOUT)
+            challenge_nonce = str(challenge.get("nonce", ""))
+            nonce = secrets.token_hex(16)
+            write_frame(writer, {
+                "type": "hello", "name": self.name, "nonce": nonce,
+                "mac": _mac(self.token, "agent", challenge_nonce),
+            })
+            await writer.drain()
+            welcome = await asyncio.wait_for(read_frame(reader), HANDSHAKE_TIMEOUT)
+            if not hmac.compare_digest(str(welcome.get("mac", "")), _mac(self.token, "coordinator", nonce)):
+                raise FleetError("coordinator failed authentication")
+            Logger.info(f"Connected to {self.host}:{self.port} as {self.name}")
+
+            channel = Channel(reader, writer, session_key(self.token, challenge_nonce, nonce), "agent", "coordinator")
+            while True:
+                message = await channel.recv()
+                if message.get("type") == "run":
+                    task = asyncio.ensure_future(self._run(channel, message))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _run(self, channel: Channel, message: Dict):
+        command = str(message.get("command", ""))
+        Logger.info("Running: %s", command)
+        try:
+            result = await run_command(command, timeout=_parse_timeout(message.get("timeout")))
+            reply = {"output": result.output, "returncode": result.returncode,
+                     "timed_out": result.timed_out, "truncated": result.truncated}
+        except Exception as e:
+            reply = {"output": f"agent error: {e}", "returncode": None}
+        try:
+            await channel.send({"type": "result", "id": message.get("id"), **reply})
+        except (ConnectionError, RuntimeError) as e:
+            # The connection dropped while the command ran; the coordinator gave up on it.
+            Logger.debug("Could not send the result of %s: %s", command, e)
+
+fleet = Coordinator()
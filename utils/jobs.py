@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import contextvars
+import html
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+from config.settings import Setting
+from utils.logger import Logger
+
+HTML_TAG = re.compile(r"<[^>]+>")
+
+current_job: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("current_job", default=None)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    command TEXT NOT NULL,
+    args TEXT NOT NULL,
+    chat_id INTEGER,
+    user_id INTEGER,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_chat ON jobs (chat_id, id);
+CREATE TABLE IF NOT EXISTS job_output (
+    job_id INTEGER NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    message_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (job_id, message_id)
+);
+"""
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"
+
+@dataclass
+class Job:
+    """A row of the jobs table."""
+    id: int
+    command: str
+    args: List[str]
+    chat_id: Optional[int]
+    user_id: Optional[int]
+    status: str
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+class JobManager:
+    """
+    Runs command handlers as background jobs and keeps their results.
+
+    A job is a command handler run in its own task: the command returns a
+    job id right away and the handler runs on one of `Setting.JOBS_WORKERS`
+    slots. Commands opt in per invocation with a trailing `&` argument.
+    Every message the handler sends or edits is captured by the outbound
+    limiter (through the `current_job` context variable) and kept, together
+    with the job status, in a SQLite database, so `/job <id>` still shows
+    the result after a restart. The database is opened on first use;
+    `open` is called once by the bot at startup and marks the jobs still
+    queued or running when it last stopped as interrupted. Importing this
+    module (as plugin worker processes do) touches nothing.
+
+    Attributes:
+        path (str): The SQLite database.
+        tasks (Dict[int, asyncio.Task]): The jobs of this process that have not finished.
+    """
+
+    def __init__(self, path: str = Setting.JOBS_DB, workers: int = Setting.JOBS_WORKERS):
+        self.path = path
+        self.workers = max(1, workers)
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._output_size: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Opens the database on first use; the caller holds `_lock`."""
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA foreign_keys=ON")
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def _insert(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            return self._connection().execute(sql, params).lastrowid
+
+    def open(self):
+        """
+        Opens the database and recovers from the previous run. Only the bot
+        process calls this, once, before it accepts commands.
+        """
+        self._recover()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    async def _run_sql(self, sql: str, params: tuple = ()) -> List[tuple]:
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    def _recover(self):
+        """Marks the jobs of the previous run as interrupted and drops the expired ones."""
+        self._execute(
+            "UPDATE jobs SET status = ?, finished = COALESCE(finished, ?) WHERE status IN (?, ?)",
+            (INTERRUPTED, time.time(), QUEUED, RUNNING),
+        )
+        if Setting.JOBS_RETENTION_DAYS > 0:
+            self._execute("DELETE FROM jobs WHERE created < ?", (time.time() - Setting.JOBS_RETENTION_DAYS * 86400,))
+
+    async def submit(self, command: str, handler: Callable, update, context) -> int:
+        """
+        Queues a handler call as a job.
+
+        Args:
+            command (str): The command name, for listings.
+            handler (Callable): The async handler to run.
+            update: The update that triggered the command.
+            context: The callback context of the update.
+
+        Returns:
+            int: The job id.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        args = list(context.args or [])
+        chat = update.effective_chat
+        user = update.effective_user
+        job_id = await asyncio.to_thread(
+            self._insert,
+            "INSERT INTO jobs (command, args, chat_id, user_id, status, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (command, json.dumps(args), chat.id if chat else None, user.id if user else None, QUEUED, time.time()),
+        )
+        self.tasks[job_id] = asyncio.ensure_future(self._run(job_id, command, handler, update, context))
+        return job_id
+
+    async def _run(self, job_id: int, command: str, handler: Callable, update, context):
+        current_job.set(job_id)
+        status, error = DONE, None
+        try:
+            async with self._slots:
+                await self._run_sql("UPDATE jobs SET status = ?, started = ? WHERE id = ?", (RUNNING, time.time(), job_id))
+                await handler(update, context)
+        except asyncio.CancelledError:
+            status = CANCELLED
+        except Exception as e:
+            status, error = FAILED, str(e)
+            Logger.error("Job #%s (/%s) failed: %s", job_id, command, e, job=job_id, command=command)
+        finally:
+            self.tasks.pop(job_id, None)
+            self._output_size.pop(job_id, None)
+            await asyncio.shield(self._run_sql(
+                "UPDATE jobs SET status = ?, finished = ?, error = ? WHERE id = ?", (status, time.time(), error, job_id)
+            ))
+
+    def wrap(self, command: str, handler: Callable) -> Callable:
+        """
+        Builds a handler that runs `handler` inline, or as a job when the last
+        argument is `&` (`/cmd make &`), answering with the job id.
+
+        Args:
+            command (str): The command name.
+            handler (Callable): The async handler.
+
+        Returns:
+            Callable: The handler to register instead.
+        """
+        @wraps(handler)
+        async def submit(update, context):
+            args = context.args
+            if not args or args[-1] != "&":
+                await handler(update, context)
+                return
+            context.args = args[:-1]
+            job_id = await self.submit(command, handler, update, context)
+            if update.effective_message:
+                await update.effective_message.reply_text(
+                    f"🧵 Job #{job_id} started, /job {job_id} for its result, /cancel {job_id} to stop it."
+                )
+
+        return submit
+
+    def record(self, endpoint: str, data: Dict[str, Any], result: Any):
+        """
+        Captures a request sent by the current job, if any.
+
+        Called by the outbound limiter once Telegram accepted the request.
+        Texts are kept per message, so an edited message keeps its last text.
+        Output beyond `Setting.JOBS_MAX_OUTPUT` characters per job is dropped.
+
+        Args:
+            endpoint (str): The Bot API method.
+            data (Dict[str, Any]): The request parameters.
+            result (Any): The decoded result returned by Telegram.
+        """
+        job_id = current_job.get()
+        if job_id is None or not isinstance(result, dict):
+            return
+        message_id = result.get("message_id", data.get("message_id"))
+        if message_id is None:
+            return
+        if endpoint in ("sendMessage", "editMessageText"):
+            kind, content = "text", str(data.get("text", ""))
+            if str(data.get("parse_mode", "")).upper() == "HTML":
+                content = html.unescape(HTML_TAG.sub("", content))
+        elif "document" in result:
+            kind, content = "document", json.dumps({
+                "file_id": result["document"].get("file_id"), "file_name": result["document"].get("file_name"),
+            })
+        elif "photo" in result:
+            kind, content = "photo", json.dumps({"file_id": result["photo"][-1].get("file_id")})
+        else:
+            return
+
+        size = self._output_size.get(job_id, 0) + len(content)
+        if size > Setting.JOBS_MAX_OUTPUT and kind == "text":
+            return
+        self._output_size[job_id] = size
+        asyncio.ensure_future(self._run_sql(
+            "INSERT INTO job_output (job_id, message_id, kind, content) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (job_id, message_id) DO UPDATE SET kind = excluded.kind, content = excluded.content",
+            (job_id, message_id, kind, content),
+        ))
+
+    async def get(self, job_id: int) -> Optional[Job]:
+        rows = await self._run_sql("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._job(rows[0]) if rows else None
+
+    async def list(self, chat_id: Optional[int] = None, limit: int = 20) -> List[Job]:
+        """The latest jobs, of one chat or of every chat."""
+        if chat_id is None:
+            rows = await self._run_sql("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+        else:
+            rows = await self._run_sql("SELECT * FROM jobs WHERE chat_id = ? ORDER BY id DESC LIMIT ?", (chat_id, limit))
+        return [self._job(row) for row in rows]
+
+    async def output(self, job_id: int) -> List[tuple]:
+        """The (kind, content) of every message a job sent, in order."""
+        return await self._run_sql(
+            "SELECT kind, content FROM job_output WHERE job_id = ? ORDER BY message_id", (job_id,)
+        )
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancels a job of this process.
+
+        Returns:
+            bool: False if the job is not queued or running here.
+        """
+        task = self.tasks.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    @staticmethod
+    def _job(row: tuple) -> Job:
+        job = Job(*row)
+        job.args = json.loads(job.args)
+        return job
+
+jobs = JobManager()
@@ -20,11 +20,28 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 import sys
+import time
+
+from config.settings import Setting
 # from utils.file_logger import FileLogger
 
 class Logger:
+    """
+    Application logger.
+
+    Records are handed to a queue and written by a background thread, so a
+    slow terminal, pipe or disk never blocks the event loop. Messages are
+    formatted lazily: pass %-style arguments (`Logger.debug("x=%s", x)`)
+    and nothing is formatted for records below `Setting.LOG_LEVEL`. Keyword
+    arguments are kept as structured fields and written out by the JSON
+    format (`Setting.LOG_FORMAT=json`).
+    """
     _instance = None 
 
     class CustomFormatter(logging.Formatter):
@@ -39,6 +56,26 @@ class Logger:
                 return f"Debug: {record.getMessage()}"
             return f"{record.levelname} - {record.getMessage()}"
 
+    class JsonFormatter(logging.Formatter):
+        """One JSON object per line, with the structured fields of the record."""
+
+        def format(self, record):
+            entry = {
+                "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+                "level": record.levelname.lower(),
+                "msg": record.getMessage(),
+            }
+            entry.update(getattr(record, "fields", None) or {})
+            if record.exc_info:
+                entry["exc"] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+    class _QueueHandler(logging.handlers.QueueHandler):
+        def prepare(self, record):
+            # The default prepare() formats the message in the calling thread,
+            # which is exactly what the queue is meant to avoid.
+            return record
+
     def __new__(cls, log_file=None):
         if cls._instance is None:
             cls._instance = super(Logger, cls).__new__(cls)
@@ -47,41 +84,62 @@ class Logger:
 
     def _initialize(self, log_file):
         self.logger = logging.getLogger("AppLogger")
-        self.logger.setLevel(logging.DEBUG)  
+        self.logger.setLevel(getattr(logging, Setting.LOG_LEVEL, logging.INFO))
+        self.logger.propagate = False
 
         if self.logger.hasHandlers():
             self.logger.handlers.clear()
 
+        formatter = self.JsonFormatter() if Setting.LOG_FORMAT == "json" else self.CustomFormatter()
+        handlers = []
+
         console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setFormatter(self.CustomFormatter())
-        self.logger.addHandler(console_handler)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
 
+        log_file = log_file or Setting.LOG_FILE
         if log_file:
-            file_handler = logging.FileHandler(log_file, encoding="utf-8")
-            file_handler.setFormatter(self.CustomFormatter())
-            self.logger.addHandler(file_handler)
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=Setting.LOG_MAX_BYTES, backupCount=Setting.LOG_BACKUPS, encoding="utf-8"
+            )
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+        log_queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(log_queue, *handlers)
+        self.listener.start()
+        self.logger.addHandler(self._QueueHandler(log_queue))
+        atexit.register(self.listener.stop)
 
     @classmethod
-    def log(cls, level, message):
+    def log(cls, level, message, *args, **fields):
         instance = cls._instance or cls()
-        instance.logger.log(level, message)
+        if not instance.logger.isEnabledFor(level):
+            return
+        instance.logger.log(level, message, *args, extra={"fields": fields} if fields else None)
 
     @classmethod
-    def info(cls, message):
-        cls.log(logging.INFO, message)
+    def info(cls, message, *args, **fields):
+        cls.log(logging.INFO, message, *args, **fields)
 
     @classmethod
-    def warning(cls, message):
-        cls.log(logging.WARNING, message)
+    def warning(cls, message, *args, **fields):
+        cls.log(logging.WARNING, message, *args, **fields)
 
     @classmethod
-    def error(cls, message):
-        cls.log(logging.ERROR, message)
+    def error(cls, message, *args, **fields):
+        cls.log(logging.ERROR, message, *args, **fields)
 
     @classmethod
-    def debug(cls, message):
-        cls.log(logging.DEBUG, message)
+    def debug(cls, message, *args, **fields):
+        cls.log(logging.DEBUG, message, *args, **fields)
+
+    @classmethod
+    def enabled(cls, level) -> bool:
+        """Whether records of `level` are written, to skip building expensive fields."""
+        instance = cls._instance or cls()
+        return instance.logger.isEnabledFor(level)
     
     # @classmethod
     # def log_to_file(cls, file_path, message):
-    #     FileLogger.log(file_path, message)
\ No newline at end of file
+    #     FileLogger.log(file_path, message)
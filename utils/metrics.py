@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import logging
+import time
+import bisect
+import contextvars
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+from config.settings import Setting
+from utils.logger import Logger
+
+# Upper bounds of the latency buckets, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+# Upper bounds of the event loop lag buckets, in seconds.
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+current_command: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_command", default=None)
+
+class Histogram:
+    """
+    Cumulative-friendly histogram with fixed bucket bounds, as Prometheus expects.
+
+    Attributes:
+        bounds (tuple): Upper bound of every bucket; a last +Inf bucket is implied.
+        counts (List[int]): Observations per bucket (not cumulative).
+        total (float): Sum of all observations.
+        count (int): Number of observations.
+        max (float): Largest observation.
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile by interpolating inside the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+class CommandStats:
+    """Counters of one command."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.latency = Histogram()
+
+class Metrics:
+    """
+    Process-wide counters: per-command calls, errors, latency and bytes sent,
+    plus the lag of the event loop.
+
+    Commands are measured by wrapping their handler with `instrument`. Bytes
+    sent are reported by the outbound limiter and attributed to the command
+    whose handler made the request, through the `current_command` context
+    variable. The loop lag is the delay with which a task sleeping
+    `Setting.METRICS_LAG_INTERVAL` seconds gets woken up.
+
+    Attributes:
+        commands (Dict[str, CommandStats]): Counters of every command that ran.
+        loop_lag (Histogram): Event loop lag samples.
+        bytes_sent (int): Bytes of every request sent to a chat.
+        started (float): When the metrics were created (time.time()).
+    """
+
+    def __init__(self):
+        self.commands: Dict[str, CommandStats] = {}
+        self.loop_lag = Histogram(LAG_BUCKETS)
+        self.bytes_sent = 0
+        self.started = time.time()
+
+    def _stats(self, command: str) -> CommandStats:
+        stats = self.commands.get(command)
+        if stats is None:
+            stats = self.commands[command] = CommandStats()
+        return stats
+
+    def instrument(self, command: str, func: Callable) -> Callable:
+        """
+        Wraps a handler so that every call is counted and timed.
+
+        Args:
+            command (str): The command name the handler serves.
+            func (Callable): The async handler.
+
+        Returns:
+            Callable: The wrapped handler.
+        """
+        @wraps(func)
+        async def wrapper(update, context):
+            stats = self._stats(command)
+            stats.calls += 1
+            token = current_command.set(command)
+            started = time.perf_counter()
+            try:
+                return await func(update, context)
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                latency = time.perf_counter() - started
+                stats.latency.observe(latency)
+                current_command.reset(token)
+                if Logger.enabled(logging.DEBUG):
+                    user = getattr(update, "effective_user", None)
+                    Logger.debug("/%s took %.0f ms", command, latency * 1000, command=command,
+                                 user=user.id if user else None, latency=round(latency, 4))
+
+        return wrapper
+
+    def record_sent(self, data: Dict):
+        """
+        Counts the payload of a request sent to Telegram.
+
+        Args:
+            data (Dict): The request parameters; text and file contents are counted.
+        """
+        size = 0
+        for value in data.values():
+            if isinstance(value, str):
+                size += len(value.encode("utf-8"))
+            elif isinstance(value, (bytes, bytearray)):
+                size += len(value)
+            else:
+                content = getattr(value, "input_file_content", None)
+                if isinstance(content, (bytes, bytearray)):
+                    size += len(content)
+        self.bytes_sent += size
+        command = current_command.get()
+        if command is not None:
+            self._stats(command).bytes_sent += size
+
+    async def sample_loop_lag(self, interval: float = Setting.METRICS_LAG_INTERVAL):
+        """Records the event loop lag every `interval` seconds, forever."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - started - interval)
+            self.loop_lag.observe(lag)
+            if lag > Setting.METRICS_LAG_WARNING:
+                Logger.warning("Event loop was blocked for %.0f ms", lag * 1000)
+
+    def summary(self) -> str:
+        """
+        Formats the counters as a plain text table.
+
+        Returns:
+            str: One line per command, then the loop lag.
+        """
+        uptime = time.time() - self.started
+        lines = [f"Uptime {uptime / 3600:.1f} h, sent {self.bytes_sent / 1024:.0f} KiB", ""]
+        lines.append(f"{'command':<12}{'calls':>6}{'err':>5}{'p50':>8}{'p95':>8}{'max':>8}{'KiB':>7}")
+        for command, stats in sorted(self.commands.items(), key=lambda item: -item[1].calls):
+            latency = stats.latency
+            lines.append(
+                f"{command[:12]:<12}{stats.calls:>6}{stats.errors:>5}"
+                f"{_ms(latency.quantile(0.5)):>8}{_ms(latency.quantile(0.95)):>8}{_ms(latency.max):>8}"
+                f"{stats.bytes_sent / 1024:>7.0f}"
+            )
+        lag = self.loop_lag
+        lines.append("")
+        lines.append(f"Loop lag p50 {_ms(lag.quantile(0.5))}, p99 {_ms(lag.quantile(0.99))}, max {_ms(lag.max)}")
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        """
+        Renders the counters in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics page.
+        """
+        commands = sorted(self.commands.items())
+        labels = {command: f'command="{_escape(command)}"' for command, _ in commands}
+        lines = []
+        # Every sample of a metric family has to follow its TYPE line in one block.
+        for name, field in (("waibot_command_calls_total", "calls"),
+                            ("waibot_command_errors_total", "errors"),
+                            ("waibot_command_bytes_sent_total", "bytes_sent")):
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f"{name}{{{labels[command]}}} {getattr(stats, field)}" for command, stats in commands)
+        lines.append("# TYPE waibot_command_latency_seconds histogram")
+        for command, stats in commands:
+            lines.extend(_histogram_lines("waibot_command_latency_seconds", stats.latency, labels[command]))
+        lines.append("# TYPE waibot_loop_lag_seconds histogram")
+        lines.extend(_histogram_lines("waibot_loop_lag_seconds", self.loop_lag))
+        lines.append("# TYPE waibot_bytes_sent_total counter")
+        lines.append(f"waibot_bytes_sent_total {self.bytes_sent}")
+        lines.append("# TYPE waibot_start_time_seconds gauge")
+        lines.append(f"waibot_start_time_seconds {self.started:.3f}")
+        return "\n".join(lines) + "\n"
+
+    async def serve_prometheus(self, host: str = Setting.METRICS_LISTEN, port: int = Setting.METRICS_PORT):
+        """
+        Serves `prometheus()` over HTTP on every path until cancelled.
+
+        Args:
+            host (str): The address to listen on.
+            port (int): The port to listen on.
+        """
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                body = self.prometheus().encode("utf-8")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                    + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+                )
+                await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+
+        try:
+            server = await asyncio.start_server(handle, host, port)
+        except OSError as e:
+            Logger.error(f"Could not serve metrics on {host}:{port}: {e}")
+            return
+        Logger.info(f"Metrics available on http://{host}:{port}/metrics")
+        async with server:
+            await server.serve_forever()
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}ms" if seconds < 10 else f"{seconds:.0f}s"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _histogram_lines(name: str, histogram: Histogram, label: str = "") -> List[str]:
+    prefix = f"{label}," if label else ""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+    suffix = f"{{{label}}}" if label else ""
+    lines.append(f"{name}_sum{suffix} {histogram.total}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+metrics = Metrics()
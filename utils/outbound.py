@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config.settings import Setting
+from utils.logger import Logger
+from utils.metrics import metrics
+
+# Priority lanes, lower goes first.
+TEXT = 0
+BULK = 1
+
+BULK_ENDPOINTS = {
+    "sendDocument", "sendPhoto", "sendVideo", "sendAudio", "sendAnimation",
+    "sendVoice", "sendVideoNote", "sendMediaGroup", "sendSticker",
+}
+
+# Pass as `rate_limit_args` to let a message be merged into the previous
+# queued message to the same chat. Only for callers that ignore the Message
+# returned, since coalesced callers all get the merged message back.
+COALESCE = {"coalesce": True}
+
+MAX_MESSAGE_LENGTH = 4096
+MAX_IDLE_LANES = 1024
+
+def _seconds(retry_after) -> float:
+    """RetryAfter.retry_after is an int or a timedelta depending on the version."""
+    return float(retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after)
+
+class TokenBucket:
+    """
+    Classic token bucket, refilled continuously at `rate` tokens per second.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens, i.e. the allowed burst.
+        tokens (float): Tokens currently available.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def delay(self) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """Refuses tokens for `seconds`, as asked by a RetryAfter from Telegram."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    @property
+    def full(self) -> bool:
+        return self.delay() == 0 and self.tokens >= self.capacity
+
+    async def acquire(self):
+        while True:
+            delay = self.delay()
+            if delay <= 0:
+                self.consume()
+                return
+            await asyncio.sleep(delay)
+
+class PriorityBucket:
+    """
+    A token bucket shared by several lanes: when tokens are scarce, waiters of
+    a lower priority value are served first, FIFO within a lane.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.bucket = TokenBucket(rate, capacity)
+        self._waiters: List = []
+        self._sequence = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    async def acquire(self, priority: int = TEXT):
+        if not self._waiters and self.bucket.delay() <= 0:
+            self.bucket.consume()
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._grant())
+        await future
+
+    async def _grant(self):
+        while self._waiters:
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+                continue
+            delay = self.bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self.bucket.consume()
+            heapq.heappop(self._waiters)[2].set_result(None)
+
+class _Request:
+    """A queued sendMessage that later messages may still be merged into."""
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self.future = asyncio.get_running_loop().create_future()
+
+    def can_merge(self, data: Dict) -> bool:
+        if set(data) != set(self.data):
+            return False
+        if any(data[key] != self.data[key] for key in data if key != "text"):
+            return False
+        return len(self.data["text"]) + 1 + len(data["text"]) <= MAX_MESSAGE_LENGTH
+
+class _ChatLane:
+    def __init__(self, rate: float, capacity: float):
+        self.bucket = TokenBucket(rate, capacity)
+        self.lock = asyncio.Lock()
+        self.mergeable: Optional[_Request] = None
+        self.waiting = 0
+
+class OutboundLimiter(BaseRateLimiter):
+    """
+    Schedules every request the bot sends to Telegram.
+
+    Requests addressed to a chat are admitted in order through a per-chat
+    token bucket (private chats and groups have different limits) and then
+    a global token bucket shared by all chats. When the global budget is
+    short, text requests are admitted before media uploads. A `RetryAfter`
+    from Telegram pauses the bucket it applies to and the request is retried.
+    Queued `sendMessage` calls made with `rate_limit_args=COALESCE` are merged
+    with the previous queued message to the same chat when possible.
+
+    Requests that are not addressed to a chat (getUpdates, answerCallbackQuery,
+    ...) are never delayed.
+    """
+
+    def __init__(self, on_sent: Optional[Callable[[str, Dict[str, Any], Any], None]] = None):
+        """
+        Args:
+            on_sent (Callable, optional): Called with the endpoint, the parameters and
+                the result of every request Telegram accepted (the bot passes
+                `utils.jobs.JobManager.record`).
+        """
+        self.on_sent = on_sent
+        self._global = PriorityBucket(Setting.SEND_GLOBAL_RATE, Setting.SEND_GLOBAL_BURST)
+        self._lanes: Dict[Union[int, str], _ChatLane] = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._lanes.clear()
+
+    def _lane(self, chat_id) -> _ChatLane:
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            if len(self._lanes) >= MAX_IDLE_LANES:
+                self._prune()
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                lane = _ChatLane(Setting.SEND_GROUP_RATE, Setting.SEND_GROUP_BURST)
+            else:
+                lane = _ChatLane(Setting.SEND_CHAT_RATE, Setting.SEND_CHAT_BURST)
+            self._lanes[chat_id] = lane
+        return lane
+
+    def _prune(self):
+        for chat_id, lane in list(self._lanes.items()):
+            if not lane.waiting and lane.bucket.full:
+                del self._lanes[chat_id]
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+        metrics.record_sent(data)
+
+        options = rate_limit_args or {}
+        priority = options.get("priority", BULK if endpoint in BULK_ENDPOINTS else TEXT)
+        lane = self._lane(chat_id)
+
+        request = None
+        if options.get("coalesce") and endpoint == "sendMessage" and isinstance(data.get("text"), str):
+            pending = lane.mergeable
+            if pending is not None and not pending.future.done() and pending.can_merge(data):
+                pending.data["text"] += "\n" + data["text"]
+                return await asyncio.shield(pending.future)
+            request = _Request(data)
+        lane.mergeable = request
+
+        for attempt in range(Setting.SEND_MAX_RETRIES + 1):
+            lane.waiting += 1
+            try:
+                async with lane.lock:
+                    if lane.mergeable is request:
+                        lane.mergeable = None
+                    await lane.bucket.acquire()
+                    await self._global.acquire(priority)
+            finally:
+                lane.waiting -= 1
+
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                seconds = _seconds(e.retry_after)
+                lane.bucket.pause(seconds)
+                if attempt == Setting.SEND_MAX_RETRIES:
+                    self._fail(request, e)
+                    raise
+                Logger.warning("Flood limit hit in chat %s (%s), retrying in %gs", chat_id, endpoint, seconds)
+                continue
+            except BaseException as e:
+                self._fail(request, e)
+                raise
+
+            if request is not None and not request.future.done():
+                request.future.set_result(result)
+            if self.on_sent is not None:
+                self.on_sent(endpoint, data, result)
+            return result
+
+    @staticmethod
+    def _fail(request: Optional[_Request], error: BaseException):
+        if request is not None and not request.future.done():
+            if isinstance(error, asyncio.CancelledError):
+                request.future.cancel()
+            else:
+                request.future.set_exception(error)
+                # Mark it retrieved: nobody may have been merged into this request.
+                request.future.exception()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import html
+import zlib
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import ContextTypes
+
+from config.settings import Setting
+from utils.logger import Logger
+
+# Characters of output per page; Telegram caps a message at 4096 after entities are parsed.
+PAGE_CHARS = 3500
+CALLBACK_PREFIX = "out:"
+
+@dataclass
+class StoredOutput:
+    """
+    The complete output of a command, compressed.
+
+    Attributes:
+        title (str): HTML shown above every page.
+        blob (bytes): The output, UTF-8 encoded and zlib compressed.
+        offsets (array): Where every page starts in the text, followed by its length.
+    """
+    title: str
+    blob: bytes
+    offsets: array
+
+    @property
+    def pages(self) -> int:
+        return max(len(self.offsets) - 1, 1)
+
+    @property
+    def length(self) -> int:
+        return self.offsets[-1]
+
+def paginate(text: str, size: int = PAGE_CHARS) -> array:
+    """Splits text into pages of at most `size` characters, on line boundaries where possible."""
+    offsets, start = array("I", [0]), 0
+    while start < len(text):
+        end = start + size
+        if end < len(text):
+            newline = text.rfind("\n", start, end)
+            if newline > start:
+                end = newline + 1
+        start = min(end, len(text))
+        offsets.append(start)
+    if len(offsets) == 1:
+        offsets.append(0)
+    return offsets
+
+class OutputStore:
+    """
+    Keeps recent command outputs so they can be paged without running the command again.
+
+    Outputs are kept zlib compressed, keyed by the chat and message that shows
+    them, in an LRU bounded by `Setting.OUTPUT_STORE_BYTES` compressed bytes and
+    `Setting.OUTPUT_STORE_ENTRIES` entries. The last decompressed output is
+    cached, so flipping through pages only decompresses once.
+    """
+
+    def __init__(self, max_bytes: int = Setting.OUTPUT_STORE_BYTES, max_entries: int = Setting.OUTPUT_STORE_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[int, int], StoredOutput]" = OrderedDict()
+        self.size = 0
+        self._cached: Tuple[Optional[StoredOutput], str] = (None, "")
+
+    @staticmethod
+    def build(text: str, title: str) -> StoredOutput:
+        """Compresses an output. Blocking for large outputs, run it off the event loop."""
+        return StoredOutput(title, zlib.compress(text.encode("utf-8"), 6), paginate(text))
+
+    def add(self, chat_id: int, message_id: int, entry: StoredOutput):
+        key = (chat_id, message_id)
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous.blob)
+        if len(entry.blob) > self.max_bytes or self.max_entries <= 0:
+            return
+        self.entries[key] = entry
+        self.size += len(entry.blob)
+        while self.size > self.max_bytes or len(self.entries) > self.max_entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted.blob)
+
+    def get(self, chat_id: int, message_id: int) -> Optional[StoredOutput]:
+        entry = self.entries.get((chat_id, message_id))
+        if entry is not None:
+            self.entries.move_to_end((chat_id, message_id))
+        return entry
+
+    def text(self, entry: StoredOutput) -> str:
+        if self._cached[0] is not entry:
+            self._cached = (entry, zlib.decompress(entry.blob).decode("utf-8"))
+        return self._cached[1]
+
+    def render(self, entry: StoredOutput, page: int) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+        """
+        The HTML of one page (1-based, clamped to the valid range) and its paging keyboard.
+        """
+        page = min(max(page, 1), entry.pages)
+        text = self.text(entry)[entry.offsets[page - 1]:entry.offsets[page]]
+        body = f"{entry.title}\n<pre>{html.escape(text or '(no output)')}</pre>"
+        if entry.pages == 1:
+            return body, None
+        body += f"\nPage {page}/{entry.pages}, reply /page N or /grep pattern"
+        buttons, targets = [], set()
+        for label, target in (("⏮", 1), ("◀", page - 1), ("▶", page + 1), ("⏭", entry.pages)):
+            if 1 <= target <= entry.pages and target != page and target not in targets:
+                targets.add(target)
+                buttons.append(InlineKeyboardButton(label, callback_data=f"{CALLBACK_PREFIX}{target}"))
+        buttons.append(InlineKeyboardButton("📄 File", callback_data=f"{CALLBACK_PREFIX}file"))
+        return body, InlineKeyboardMarkup([buttons])
+
+    async def show(self, message, entry: StoredOutput, page: int):
+        """Edits a message to show a page of an output stored for it."""
+        self.add(message.chat_id, message.message_id, entry)
+        text, keyboard = self.render(entry, page)
+        await message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+    async def reply(self, message, entry: StoredOutput, page: int = 1):
+        """Replies to a message with a page of an output and stores it for the reply."""
+        text, keyboard = self.render(entry, page)
+        sent = await message.reply_text(text, parse_mode="HTML", reply_markup=keyboard)
+        self.add(sent.chat_id, sent.message_id, entry)
+        return sent
+
+    async def send_file(self, bot, chat_id: int, entry: StoredOutput, reply_to: Optional[int] = None):
+        data = await asyncio.to_thread(zlib.decompress, entry.blob)
+        await bot.send_document(chat_id, BytesIO(data), filename="output.txt", reply_to_message_id=reply_to)
+
+    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Answers the paging buttons of a stored output."""
+        query = update.callback_query
+        message = query.message
+        entry = self.get(message.chat_id, message.message_id) if message else None
+        if entry is None:
+            await query.answer("This output is no longer stored, run the command again.", show_alert=True)
+            return
+        action = query.data[len(CALLBACK_PREFIX):]
+        await query.answer()
+        try:
+            if action == "file":
+                await self.send_file(context.bot, message.chat_id, entry, reply_to=message.message_id)
+            elif action.isdigit():
+                text, keyboard = self.render(entry, int(action))
+                await message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+        except Exception as e:
+            Logger.debug("Failed to page output: %s", e)
+
+output_store = OutputStore()
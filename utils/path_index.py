@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import heapq
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import Setting
+from utils.logger import Logger
+
+def glob_regex(pattern: str) -> "re.Pattern":
+    """
+    Compiles a shell glob (`*.log`, `access?.[0-9]`) into a regex that
+    matches whole lines of an index blob, directories included.
+    """
+    parts, i = [], 0
+    while i < len(pattern):
+        c = pattern[i]
+        i += 1
+        if c == "*":
+            parts.append("[^\n]*")
+        elif c == "?":
+            parts.append("[^\n]")
+        elif c == "[":
+            j = i + 1 if pattern[i:i + 1] == "!" else i
+            j = j + 1 if pattern[j:j + 1] == "]" else j
+            end = pattern.find("]", j)
+            if end < 0:
+                parts.append(re.escape(c))
+                continue
+            body = pattern[i:end].replace("\\", "\\\\")
+            i = end + 1
+            parts.append("[^\n" + body[1:] + "]" if body.startswith("!") else "[" + body + "]")
+        else:
+            parts.append(re.escape(c))
+    return re.compile("^" + "".join(parts) + "/?$", re.MULTILINE | re.IGNORECASE)
+
+class PathIndex:
+    """
+    In-memory index of the directory trees under `Setting.INDEX_ROOTS`.
+
+    Every directory is one slot in a set of parallel arrays: its parent slot,
+    its own name (interned, so repeated names like `log` or `src` are stored
+    once), its mtime, and a blob with the names of its entries joined by
+    newlines (sub-directories end in `/`). A query is a regex run over each
+    blob, so it stays in C instead of testing millions of names one by one.
+
+    A background thread builds the index with `os.scandir` and then
+    re-stats every known directory every `Setting.INDEX_REFRESH_INTERVAL`
+    seconds. Creating, removing or renaming an entry changes the mtime of its
+    directory, so only directories whose mtime moved are read again.
+    """
+
+    def __init__(self, roots: List[str], exclude: List[str]):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.exclude = {os.path.abspath(path) for path in exclude}
+        self._parent = array("i")
+        self._name: List[Optional[str]] = []
+        self._mtime = array("q")
+        self._blob: List[str] = []
+        self._children: List[Optional[Dict[str, int]]] = []
+        self._free: List[int] = []
+        self._roots: Dict[str, int] = {}
+        # Readers hold _lock; writers also hold _scan_lock for a whole directory.
+        self._lock = threading.Lock()
+        self._scan_lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.ready = False
+        self.built_at = 0.0
+
+    def start(self):
+        if self._thread is None and self.roots:
+            self._thread = threading.Thread(target=self._run, name="path-index", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        started = time.monotonic()
+        for root in self.roots:
+            if os.path.isdir(root):
+                with self._lock:
+                    self._roots[root] = self._alloc(-1, root)
+                self._scan_tree(self._roots[root])
+        self.ready = True
+        self.built_at = time.time()
+        Logger.info(
+            "Indexed %d directories in %.1fs", self.directories, time.monotonic() - started,
+            directories=self.directories,
+        )
+        interval = Setting.INDEX_REFRESH_INTERVAL
+        while interval > 0 and not self._stop.wait(interval):
+            changed = self.refresh()
+            if changed:
+                Logger.debug("Path index refreshed %d directories", changed)
+
+    @property
+    def directories(self) -> int:
+        return len(self._name) - len(self._free)
+
+    def _alloc(self, parent: int, name: str) -> int:
+        """Takes a slot for a new directory. Caller holds the lock."""
+        if self._free:
+            slot = self._free.pop()
+            self._parent[slot] = parent
+            self._name[slot] = name
+            self._mtime[slot] = 0
+            self._blob[slot] = ""
+            self._children[slot] = {}
+        else:
+            slot = len(self._name)
+            self._parent.append(parent)
+            self._name.append(name)
+            self._mtime.append(0)
+            self._blob.append("")
+            self._children.append({})
+        return slot
+
+    def _drop(self, slot: int):
+        """Frees a directory and everything below it. Caller holds the lock."""
+        stack = [slot]
+        while stack:
+            slot = stack.pop()
+            stack.extend(self._children[slot].values())
+            self._name[slot] = None
+            self._blob[slot] = ""
+            self._children[slot] = None
+            self._free.append(slot)
+
+    def path(self, slot: int) -> str:
+        names = []
+        while slot >= 0:
+            names.append(self._name[slot])
+            slot = self._parent[slot]
+        return os.path.join(*reversed(names))
+
+    def _scan_tree(self, slot: int):
+        stack = [slot]
+        while stack and not self._stop.is_set():
+            stack.extend(self._scan_dir(stack.pop()))
+
+    def _scan_dir(self, slot: int) -> List[int]:
+        """Re-reads one directory and returns the slots of sub-directories that are new."""
+        with self._scan_lock:
+            if self._children[slot] is None:
+                return []
+            return self._read_dir(slot, self.path(slot))
+
+    def _read_dir(self, slot: int, path: str) -> List[int]:
+        entries, subdirs = [], []
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                for entry in it:
+                    if "\n" in entry.name:
+                        continue
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if entry.path in self.exclude:
+                            continue
+                        subdirs.append(sys.intern(entry.name))
+                        entries.append(entry.name + "/")
+                    else:
+                        entries.append(entry.name)
+        except OSError:
+            mtime = -1
+
+        entries.sort()
+        new = []
+        with self._lock:
+            self._mtime[slot] = mtime
+            self._blob[slot] = "\n".join(entries)
+            children = self._children[slot]
+            keep = set(subdirs)
+            for name in [name for name in children if name not in keep]:
+                self._drop(children.pop(name))
+            for name in subdirs:
+                if name not in children:
+                    child = self._alloc(slot, name)
+                    children[name] = child
+                    new.append(child)
+        return new
+
+    def refresh(self) -> int:
+        """Re-reads the directories whose mtime changed; returns how many there were."""
+        changed = 0
+        for slot in range(len(self._name)):
+            if self._stop.is_set():
+                break
+            with self._scan_lock:
+                if self._children[slot] is None:
+                    continue
+                try:
+                    stale = os.stat(self.path(slot)).st_mtime_ns != self._mtime[slot]
+                except OSError:
+                    continue
+            if stale:
+                changed += 1
+                for child in self._scan_dir(slot):
+                    self._scan_tree(child)
+        return changed
+
+    def lookup(self, path: str) -> Optional[int]:
+        with self._lock:
+            return self._lookup(path)
+
+    def _lookup(self, path: str) -> Optional[int]:
+        """The slot of an indexed directory; the caller holds `_lock`."""
+        path = os.path.abspath(path)
+        for root in self.roots:
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                break
+        else:
+            return None
+        slot = self._roots.get(root)
+        rest = path[len(root):].strip(os.sep)
+        for name in rest.split(os.sep) if rest else []:
+            if slot is None:
+                break
+            slot = self._children[slot].get(name)
+        return slot
+
+    def search(self, pattern: str, under: Optional[str] = None, offset: int = 0,
+               limit: int = 1000) -> Tuple[List[str], int]:
+        """
+        Finds entries whose name contains `pattern`, or matches it if it is a glob.
+        Matching ignores case; directories are returned with a trailing `/`.
+
+        Every match is collected and sorted by path before the page is cut, so
+        consecutive pages neither repeat nor skip entries.
+
+        Args:
+            pattern (str): A substring, or a glob with `*`, `?` or `[...]`.
+            under (str, optional): Only search below this directory.
+            offset (int): How many sorted matches to skip.
+            limit (int): How many sorted matches to return.
+
+        Returns:
+            Tuple[List[str], int]: The matching paths from `offset` on, and how many matched in total.
+        """
+        if any(c in pattern for c in "*?["):
+            regex = glob_regex(pattern)
+        else:
+            regex = re.compile(re.escape(pattern), re.IGNORECASE)
+
+        paths = []
+        # One lock hold: slots freed by a refresh in between could be reused.
+        with self._lock:
+            if under is not None:
+                start = self._lookup(under)
+                if start is None:
+                    return [], 0
+                slots, stack = [], [start]
+                while stack:
+                    slot = stack.pop()
+                    slots.append(slot)
+                    stack.extend(self._children[slot].values())
+            else:
+                slots = range(len(self._name))
+
+            for slot in slots:
+                blob = self._blob[slot]
+                if not blob:
+                    continue
+                directory = None
+                last = -1
+                for match in regex.finditer(blob):
+                    begin = blob.rfind("\n", 0, match.start()) + 1
+                    if begin == last:
+                        continue
+                    last = begin
+                    end = blob.find("\n", match.end())
+                    if directory is None:
+                        directory = self.path(slot)
+                    paths.append(os.path.join(directory, blob[begin:end if end >= 0 else len(blob)]))
+        total = len(paths)
+        return heapq.nsmallest(offset + limit, paths)[offset:], total
+
+    def listdir(self, path: str) -> Optional[List[str]]:
+        """
+        Lists a directory from the index after refreshing it if its mtime moved,
+        or returns None if it is not indexed. Directories come first and end in `/`.
+        """
+        slot = self.lookup(path)
+        if slot is None:
+            return None
+        try:
+            if os.stat(path).st_mtime_ns != self._mtime[slot]:
+                for child in self._scan_dir(slot):
+                    self._scan_tree(child)
+        except OSError:
+            pass
+        with self._lock:
+            names = self._blob[slot].split("\n") if self._blob[slot] else []
+        return sorted(names, key=lambda name: (not name.endswith("/"), name.lower()))
+
+path_index = PathIndex(
+    [root for root in Setting.INDEX_ROOTS.split(os.pathsep) if root],
+    [path for path in Setting.INDEX_EXCLUDE.split(os.pathsep) if path],
+)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import codecs
+import os
+import signal
+import subprocess
+import weakref
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from config.settings import Setting
+
+READ_SIZE = 64 * 1024
+
+# One limiter per event loop: plugins in thread mode run their own loops.
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+@dataclass
+class CommandResult:
+    """
+    Outcome of a command run through `run_command`.
+
+    Attributes:
+        output (str): Combined stdout/stderr, in the order it was produced.
+        returncode (Optional[int]): Exit status, or None if the process was killed before exiting.
+        timed_out (bool): True if the command was killed because it exceeded its timeout.
+        truncated (bool): True if output beyond `Setting.CMD_MAX_OUTPUT` was discarded.
+    """
+    output: str
+    returncode: Optional[int]
+    timed_out: bool = False
+    truncated: bool = False
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """The concurrency limiter of the running loop, created on first use."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(Setting.CMD_MAX_CONCURRENT)
+    return semaphore
+
+def _kill(process: asyncio.subprocess.Process):
+    """Kill the process group started for a command, including its children."""
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+async def run_command(
+    command: str,
+    on_output: Optional[Callable[[str], None]] = None,
+    timeout: Optional[float] = None,
+) -> CommandResult:
+    """
+    Runs a shell command without blocking the event loop.
+
+    Output is read as it arrives and passed to `on_output` chunk by chunk. The
+    command runs in its own process group so that a timeout or cancellation
+    kills everything it spawned. At most `Setting.CMD_MAX_CONCURRENT` commands
+    run at once; extra calls wait for a free slot.
+
+    Args:
+        command (str): The shell command line to execute.
+        on_output (Callable[[str], None], optional): Called with each decoded chunk of output.
+        timeout (float, optional): Seconds before the command is killed (default `Setting.CMD_TIMEOUT`).
+
+    Returns:
+        CommandResult: The collected output and exit status.
+    """
+    timeout = Setting.CMD_TIMEOUT if timeout is None else timeout
+    if os.name == "posix":
+        group_kwargs = {"start_new_session": True}
+    else:
+        group_kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+    async with _get_semaphore():
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            **group_kwargs
+        )
+
+        chunks = []
+        size = 0
+        truncated = False
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        async def communicate():
+            nonlocal size, truncated
+            while True:
+                data = await process.stdout.read(READ_SIZE)
+                text = decoder.decode(data, final=not data)
+                if text and not truncated:
+                    if size + len(text) > Setting.CMD_MAX_OUTPUT:
+                        text = text[:Setting.CMD_MAX_OUTPUT - size]
+                        truncated = True
+                    chunks.append(text)
+                    size += len(text)
+                    if on_output:
+                        on_output(text)
+                if not data:
+                    break
+            await process.wait()
+
+        completed = False
+        timed_out = False
+        try:
+            await asyncio.wait_for(communicate(), timeout)
+            completed = True
+        except asyncio.TimeoutError:
+            timed_out = True
+        finally:
+            if not completed:
+                _kill(process)
+                # Reap it, also when the run was cancelled.
+                await process.wait()
+
+        return CommandResult(
+            output="".join(chunks),
+            returncode=None if timed_out else process.returncode,
+            timed_out=timed_out,
+            truncated=truncated,
+        )
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import codecs
+import os
+import secrets
+import shlex
+import signal
+import subprocess
+import time
+from typing import Callable, Dict, Optional, Set
+
+from config.settings import Setting
+from utils.logger import Logger
+from utils.process import READ_SIZE, CommandResult
+
+try:
+    import fcntl
+    import pty
+    import termios
+except ImportError:  # Windows
+    pty = None
+
+SUPPORTED = pty is not None
+
+# The end of every command is marked by `<MARKER><token>:<status>\n`; the
+# marker is assembled by printf so its text never appears in what is written.
+MARKER = b"\x1eWAI-END-"
+
+class ShellSessionError(Exception):
+    """Raised when a session cannot be started or has died."""
+
+def _take_terminal():
+    """Runs in the child: become a session leader and make the pty its controlling terminal."""
+    os.setsid()
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+class ShellSession:
+    """
+    A long-lived shell on a pseudo-terminal, reused by the commands of one chat.
+
+    Commands run one at a time in the same shell, so the working directory,
+    variables and activated virtualenvs carry over. Each command is passed to
+    `eval` followed by a printf of a random end marker with `$?`, which tells
+    where its output ends and how it exited. Echo and output post-processing
+    are turned off on the terminal, so the output is exactly what the command
+    printed.
+
+    Attributes:
+        chat_id (int): The chat the session belongs to.
+        last_used (float): `time.monotonic()` of the last command.
+        started (float): `time.time()` the shell was started.
+    """
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.last_used = time.monotonic()
+        self.started = time.time()
+        self.lock = asyncio.Lock()
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._master: Optional[int] = None
+        self._buffer = bytearray()
+        self._data = asyncio.Event()
+        self._eof = False
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None and not self._eof
+
+    async def start(self):
+        master, slave = pty.openpty()
+        attrs = termios.tcgetattr(slave)
+        attrs[1] &= ~termios.OPOST
+        attrs[3] &= ~(termios.ECHO | termios.ECHONL)
+        termios.tcsetattr(slave, termios.TCSANOW, attrs)
+
+        env = dict(os.environ, PS1="", PS2="", PS4="", TERM="dumb", PAGER="cat", GIT_PAGER="cat")
+        try:
+            self._process = await asyncio.create_subprocess_exec(
+                *shlex.split(Setting.SHELL_COMMAND),
+                stdin=slave, stdout=slave, stderr=slave,
+                env=env, preexec_fn=_take_terminal,
+            )
+        except OSError as e:
+            os.close(master)
+            raise ShellSessionError(f"Cannot start {Setting.SHELL_COMMAND}: {e}") from e
+        finally:
+            os.close(slave)
+
+        self._master = master
+        os.set_blocking(master, False)
+        asyncio.get_running_loop().add_reader(master, self._on_readable)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._master, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO: every process holding the terminal has exited.
+            data = b""
+        if data:
+            self._buffer += data
+        else:
+            self._eof = True
+            asyncio.get_running_loop().remove_reader(self._master)
+        self._data.set()
+
+    async def _write(self, text: str):
+        """Writes to the terminal, waiting in the event loop while its input queue is full."""
+        master = self._master
+        data = text.encode("utf-8")
+        loop = asyncio.get_running_loop()
+        while data:
+            if self._master != master:
+                raise ShellSessionError("The shell exited")
+            try:
+                written = os.write(master, data)
+            except BlockingIOError:
+                writable = loop.create_future()
+                loop.add_writer(master, lambda: writable.done() or writable.set_result(None))
+                try:
+                    await writable
+                finally:
+                    loop.remove_writer(master)
+                continue
+            data = data[written:]
+
+    async def _submit(self, command: str, token: str):
+        await self._write(
+            f"eval {shlex.quote(command)}\n"
+            f"printf '\\036%s%s:%d\\n' 'WAI-END-' '{token}' \"$?\"\n"
+        )
+
+    async def _read_until(self, token: str, on_data: Callable[[bytes], None]) -> int:
+        """Passes output to `on_data` until the end marker of `token`, then returns the exit status."""
+        end = MARKER + token.encode()
+        while True:
+            index = self._buffer.find(end)
+            if index >= 0:
+                newline = self._buffer.find(b"\n", index + len(end))
+                if newline >= 0:
+                    on_data(bytes(self._buffer[:index]))
+                    status = self._buffer[index + len(end) + 1:newline]
+                    del self._buffer[:newline + 1]
+                    return int(status) if status.isdigit() else -1
+            else:
+                # Hold back only what could be the start of the marker.
+                start = self._buffer.find(end[:1], max(len(self._buffer) - len(end) + 1, 0))
+                while start >= 0 and not end.startswith(self._buffer[start:]):
+                    start = self._buffer.find(end[:1], start + 1)
+                cut = len(self._buffer) if start < 0 else start
+                if cut:
+                    on_data(bytes(self._buffer[:cut]))
+                    del self._buffer[:cut]
+            if self._eof:
+                raise ShellSessionError("The shell exited")
+            self._data.clear()
+            await self._data.wait()
+
+    async def run(
+        self,
+        command: str,
+        on_output: Optional[Callable[[str], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> CommandResult:
+        """
+        Runs a command in the shell, like `utils.process.run_command`.
+
+        On timeout the command is interrupted with Ctrl-C; the shell is kept
+        if it answers within `Setting.SHELL_INTERRUPT_GRACE` seconds and closed
+        otherwise. A cancelled command closes the session.
+
+        Args:
+            command (str): The command line.
+            on_output (Callable[[str], None], optional): Called with each decoded chunk of output.
+            timeout (float, optional): Seconds before the command is interrupted (default `Setting.CMD_TIMEOUT`).
+
+        Returns:
+            CommandResult: The output and exit status.
+        """
+        timeout = Setting.CMD_TIMEOUT if timeout is None else timeout
+        async with self.lock:
+            if not self.alive:
+                raise ShellSessionError("The shell exited")
+            self.last_used = time.monotonic()
+
+            chunks = []
+            size = 0
+            truncated = False
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+            def on_data(data: bytes):
+                nonlocal size, truncated
+                text = decoder.decode(data)
+                if text and not truncated:
+                    if size + len(text) > Setting.CMD_MAX_OUTPUT:
+                        text = text[:Setting.CMD_MAX_OUTPUT - size]
+                        truncated = True
+                    chunks.append(text)
+                    size += len(text)
+                    if on_output:
+                        on_output(text)
+
+            token = secrets.token_hex(8)
+            timed_out = False
+            returncode = None
+
+            async def execute() -> int:
+                await self._submit(command, token)
+                return await self._read_until(token, on_data)
+
+            try:
+                try:
+                    returncode = await asyncio.wait_for(execute(), timeout)
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    await self._interrupt(on_data)
+                on_data(b"")
+            except BaseException:
+                await self.close()
+                raise
+            finally:
+                self.last_used = time.monotonic()
+
+            return CommandResult(
+                output="".join(chunks),
+                returncode=returncode,
+                timed_out=timed_out,
+                truncated=truncated,
+            )
+
+    async def _interrupt(self, on_data: Callable[[bytes], None]):
+        """Sends Ctrl-C and waits for the shell to answer a fresh marker, closing it if it does not."""
+        token = secrets.token_hex(8)
+
+        async def interrupt():
+            await self._write("\x03")
+            await self._write(f"printf '\\036%s%s:0\\n' 'WAI-END-' '{token}'\n")
+            await self._read_until(token, on_data)
+
+        try:
+            await asyncio.wait_for(interrupt(), Setting.SHELL_INTERRUPT_GRACE)
+        except (asyncio.TimeoutError, ShellSessionError):
+            Logger.warning("Shell session of chat %s did not answer after an interrupt, closing it", self.chat_id)
+            await self.close()
+
+    async def close(self):
+        """Hangs up the terminal and kills the shell."""
+        process, master = self._process, self._master
+        self._process = self._master = None
+        self._eof = True
+        if master is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(master)
+            except (RuntimeError, ValueError):
+                pass
+        if process is None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGHUP)
+        except (ProcessLookupError, PermissionError):
+            pass
+        if master is not None:
+            os.close(master)
+        try:
+            await asyncio.wait_for(process.wait(), 2)
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            await process.wait()
+
+class ShellSessions:
+    """
+    The shell sessions of all chats, at most `Setting.SHELL_MAX_SESSIONS` at once.
+
+    A chat opts in with `enable`; its `/cmd` then runs in its session, which is
+    started on first use and closed after `Setting.SHELL_IDLE_TIMEOUT` idle
+    seconds (the next command starts a new one).
+
+    Attributes:
+        sessions (Dict[int, ShellSession]): Live sessions by chat id.
+        enabled (Set[int]): Chats whose `/cmd` uses a session.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[int, ShellSession] = {}
+        self.enabled: Set[int] = set()
+
+    def enable(self, chat_id: int):
+        if not SUPPORTED:
+            raise ShellSessionError("Shell sessions need a pseudo-terminal, which this system does not have")
+        self.enabled.add(chat_id)
+
+    async def disable(self, chat_id: int):
+        self.enabled.discard(chat_id)
+        await self.close(chat_id)
+
+    async def get(self, chat_id: int) -> "tuple[ShellSession, bool]":
+        """
+        Returns the session of a chat, starting it if needed.
+
+        Returns:
+            tuple[ShellSession, bool]: The session, and whether it was just started.
+        """
+        session = self.sessions.get(chat_id)
+        if session is not None and session.alive:
+            return session, False
+        if session is not None:
+            await self.close(chat_id)
+        if len(self.sessions) >= Setting.SHELL_MAX_SESSIONS:
+            raise ShellSessionError(
+                f"All {Setting.SHELL_MAX_SESSIONS} shell sessions are in use, try again later or use /shell off elsewhere"
+            )
+        session = ShellSession(chat_id)
+        self.sessions[chat_id] = session
+        try:
+            await session.start()
+        except BaseException:
+            self.sessions.pop(chat_id, None)
+            raise
+        Logger.info("Started shell session for chat %s", chat_id)
+        return session, True
+
+    async def close(self, chat_id: int):
+        session = self.sessions.pop(chat_id, None)
+        if session is not None:
+            await session.close()
+
+    async def reap(self, interval: float):
+        """
+        Closes idle and dead sessions. A `Setting.SHELL_IDLE_TIMEOUT` of 0 or
+        less keeps idle sessions open.
+
+        Args:
+            interval (float): Seconds between two checks, at least 1.
+        """
+        interval = max(interval, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            idle_timeout = Setting.SHELL_IDLE_TIMEOUT
+            for chat_id, session in list(self.sessions.items()):
+                if session.lock.locked():
+                    continue
+                idle = idle_timeout > 0 and now - session.last_used > idle_timeout
+                if not session.alive or idle:
+                    Logger.info("Closing idle shell session of chat %s", chat_id)
+                    await self.close(chat_id)
+
+    async def close_all(self):
+        for chat_id in list(self.sessions):
+            await self.close(chat_id)
+
+shell_sessions = ShellSessions()
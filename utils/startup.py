@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import time
+from typing import List, Tuple
+
+class StartupProfiler:
+    """
+    Records how long each startup phase takes.
+
+    Phases are closed with `mark`, each one lasting from the previous mark (or
+    the creation of the profiler) to the current one. Nothing is recorded
+    unless the profiler is enabled, so the marks can stay in the startup path.
+
+    Attributes:
+        enabled (bool): Whether marks are recorded and reported.
+        phases (List[Tuple[str, float]]): The name and duration in seconds of every phase.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.phases: List[Tuple[str, float]] = []
+        self._started = self._last = time.perf_counter()
+
+    def mark(self, phase: str):
+        """
+        Ends the current phase.
+
+        Args:
+            phase (str): The name of the phase that just finished.
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self) -> str:
+        """
+        Formats the recorded phases as a table.
+
+        Returns:
+            str: One line per phase with its duration and share of the total.
+        """
+        total = self._last - self._started
+        width = max([5] + [len(name) for name, _ in self.phases])
+        lines = ["Startup profile:"]
+        for name, duration in self.phases:
+            share = duration / total if total else 0.0
+            lines.append(f"  {name:<{width}}  {duration * 1000:9.1f} ms  {share:6.1%}")
+        lines.append(f"  {'total':<{width}}  {total * 1000:9.1f} ms")
+        return "\n".join(lines)
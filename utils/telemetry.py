@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import heapq
+import os
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import psutil
+
+from config.settings import Setting
+from utils.logger import Logger
+
+SERIES = ("cpu", "mem", "swap", "disk_read", "disk_write", "net_rx", "net_tx", "load")
+
+class Tier:
+    """
+    One resolution of the history: a ring of `capacity` samples, `step` seconds apart.
+
+    Timestamps and every series live in preallocated `array('d')` buffers, so
+    the memory used is fixed when the tier is created. Samples arriving within
+    the same step are averaged into a single point.
+    """
+
+    def __init__(self, step: float, capacity: int):
+        self.step = step
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = {name: array("d", bytes(8 * capacity)) for name in SERIES}
+        self.head = 0
+        self.size = 0
+        self._bucket = None
+        self._sums = dict.fromkeys(SERIES, 0.0)
+        self._count = 0
+
+    @property
+    def span(self) -> float:
+        return self.step * self.capacity
+
+    def add(self, timestamp: float, sample: Dict[str, float]):
+        bucket = int(timestamp // self.step)
+        if self._bucket is not None and bucket != self._bucket:
+            self._push()
+        self._bucket = bucket
+        for name in SERIES:
+            self._sums[name] += sample[name]
+        self._count += 1
+
+    def _push(self):
+        self.times[self.head] = self._bucket * self.step
+        for name in SERIES:
+            self.values[name][self.head] = self._sums[name] / self._count
+            self._sums[name] = 0.0
+        self._count = 0
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def since(self, start: float) -> Tuple[List[float], Dict[str, List[float]]]:
+        """The points at or after `start`, oldest first."""
+        order = [(self.head - self.size + i) % self.capacity for i in range(self.size)]
+        order = [i for i in order if self.times[i] >= start]
+        return [self.times[i] for i in order], {name: [self.values[name][i] for i in order] for name in SERIES}
+
+class Telemetry:
+    """
+    Samples system counters with psutil in a background thread.
+
+    Every `Setting.SYSMON_INTERVAL` seconds it records CPU, memory, swap, disk
+    and network throughput and the load average into every tier of
+    `Setting.SYSMON_TIERS` (for example `1:600,60:1440`, 1 second points for
+    10 minutes and 1 minute points for a day). The busiest processes are
+    sampled every `Setting.SYSMON_PROC_INTERVAL` seconds. Queries only read
+    the buffers, so they never wait on the system.
+
+    Attributes:
+        latest (Dict[str, float]): The most recent sample.
+        processes (Deque): Recent `(time, by_cpu, by_rss)` snapshots, newest last. Both lists hold
+            `(pid, name, cpu %, rss bytes)` rows of the top processes by CPU and by memory.
+    """
+
+    def __init__(self, interval: float, tiers: str):
+        self.interval = interval
+        self.tiers = []
+        for spec in tiers.split(","):
+            step, _, capacity = spec.partition(":")
+            self.tiers.append(Tier(max(float(step), interval), int(capacity)))
+        self.tiers.sort(key=lambda tier: tier.step)
+        self.latest: Dict[str, float] = {}
+        self.processes: Deque[Tuple[float, List[Tuple[int, str, float, int]], List[Tuple[int, str, float, int]]]] = deque(maxlen=12)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0 and self.tiers:
+            self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _counters(self) -> Tuple[float, float, float, float]:
+        disk = psutil.disk_io_counters()
+        net = psutil.net_io_counters()
+        return (
+            disk.read_bytes if disk else 0.0, disk.write_bytes if disk else 0.0,
+            net.bytes_recv if net else 0.0, net.bytes_sent if net else 0.0,
+        )
+
+    def _run(self):
+        psutil.cpu_percent(None)
+        last, counters = time.monotonic(), self._counters()
+        next_processes = 0.0
+        while not self._stop.wait(self.interval - (time.monotonic() - last) % self.interval):
+            try:
+                now = time.monotonic()
+                elapsed, last = max(now - last, 1e-6), now
+                current = self._counters()
+                rates = [max(new - old, 0) / elapsed for new, old in zip(current, counters)]
+                counters = current
+                sample = {
+                    "cpu": psutil.cpu_percent(None),
+                    "mem": psutil.virtual_memory().percent,
+                    "swap": psutil.swap_memory().percent,
+                    "disk_read": rates[0], "disk_write": rates[1],
+                    "net_rx": rates[2], "net_tx": rates[3],
+                    "load": os.getloadavg()[0] if hasattr(os, "getloadavg") else 0.0,
+                }
+                timestamp = time.time()
+                with self._lock:
+                    self.latest = sample
+                    for tier in self.tiers:
+                        tier.add(timestamp, sample)
+                if now >= next_processes:
+                    next_processes = now + Setting.SYSMON_PROC_INTERVAL
+                    self.processes.append((timestamp, *self._top_processes()))
+            except Exception as e:
+                Logger.warning("System sampling failed: %s", e)
+
+    def _top_processes(self) -> Tuple[List[Tuple[int, str, float, int]], List[Tuple[int, str, float, int]]]:
+        """The top processes by CPU and, separately, by memory, so idle but large ones show up too."""
+        rows = []
+        for proc in psutil.process_iter(["pid", "name", "cpu_percent", "memory_info"]):
+            info = proc.info
+            memory = info["memory_info"]
+            rows.append((info["pid"], info["name"] or "?", info["cpu_percent"] or 0.0, memory.rss if memory else 0))
+        keep = max(Setting.SYSMON_TOP * 5, 50)
+        by_cpu = heapq.nlargest(keep, rows, key=lambda row: (row[2], row[3]))
+        by_rss = heapq.nlargest(keep, rows, key=lambda row: row[3])
+        return by_cpu, by_rss
+
+    def window(self, seconds: float) -> Tuple[List[float], Dict[str, List[float]]]:
+        """
+        The history of the last `seconds`, from the finest tier that reaches that far back.
+
+        Returns:
+            Tuple[List[float], Dict[str, List[float]]]: Timestamps, and the matching values of every series.
+        """
+        tier = next((tier for tier in self.tiers if tier.span >= seconds), self.tiers[-1])
+        with self._lock:
+            return tier.since(time.time() - seconds)
+
+    def average(self, name: str, seconds: float) -> Optional[float]:
+        _, values = self.window(seconds)
+        points = values[name]
+        return sum(points) / len(points) if points else None
+
+telemetry = Telemetry(Setting.SYSMON_INTERVAL, Setting.SYSMON_TIERS)
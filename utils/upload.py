@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import shlex
+from typing import BinaryIO, Dict, List, Optional
+
+from telegram.error import BadRequest
+
+from config.settings import Setting
+from utils.archive import DirectoryArchive
+from utils.file_cache import StaleFileId, file_cache
+from utils.logger import Logger
+
+# Only keep a compressed part if it saves at least this fraction of its size.
+MIN_COMPRESSION_GAIN = 0.1
+
+def _compress(data: bytes) -> Optional[bytes]:
+    """Gzip a part, returning None when compression does not pay off."""
+    packed = gzip.compress(data, compresslevel=Setting.UPLOAD_COMPRESS_LEVEL)
+    if len(packed) <= len(data) * (1 - MIN_COMPRESSION_GAIN):
+        return packed
+    return None
+
+def _read_head(path: str, size: int, digest) -> bytes:
+    """Read up to `size` bytes from the start of a file, feeding the digest. Blocking."""
+    with open(path, "rb") as file:
+        return _read_part(file, size, digest)
+
+def _read_part(file: BinaryIO, size: int, digest) -> bytes:
+    """Read the next part of a file and feed it to the running whole-file digest."""
+    data = file.read(size)
+    digest.update(data)
+    return data
+
+class PartUploader:
+    """
+    Sends a stream of file parts to a chat with bounded parallelism.
+
+    When the payload fits in a single part it is sent as one document under
+    its own name. Otherwise every part is sent as `<name>.partNNN[.gz]`
+    followed by a `<name>.manifest.json` describing how to reassemble them.
+
+    Attributes:
+        name (str): The name of the file being sent.
+        parts (List[Dict]): Manifest entries of the parts sent so far.
+        file_ids (Dict[str, str]): Telegram file_id of every document sent, keyed by document name.
+    """
+
+    def __init__(self, bot, chat_id: int, name: str, compress: bool = False, single: bool = False):
+        """
+        Args:
+            bot: The bot used to send documents.
+            chat_id (int): Destination chat.
+            name (str): Name of the file being sent.
+            compress (bool): Gzip parts when that makes them noticeably smaller.
+            single (bool): The caller knows the payload fits in one part.
+        """
+        self.bot = bot
+        self.chat_id = chat_id
+        self.name = name
+        self.compress = compress
+        self.single = single
+        self.parts: List[Dict] = []
+        self.file_ids: Dict[str, str] = {}
+        self._offset = 0
+        self._slots = asyncio.Semaphore(max(1, Setting.UPLOAD_PARALLEL))
+        self._tasks: List[asyncio.Task] = []
+        self._error: Optional[BaseException] = None
+
+    async def add(self, data: bytes, file_id: Optional[str] = None):
+        """
+        Queues the next part, waiting while `Setting.UPLOAD_PARALLEL` parts are in flight.
+
+        Args:
+            data (bytes): The raw bytes of the part.
+            file_id (str, optional): The part is already in the chat under this file_id;
+                it is only recorded for the manifest, not sent again.
+        """
+        await self._slots.acquire()
+        if self._error:
+            self._slots.release()
+            raise self._error
+
+        entry = {"index": len(self.parts) + 1, "offset": self._offset, "size": len(data)}
+        self.parts.append(entry)
+        self._offset += len(data)
+        self._tasks.append(asyncio.ensure_future(self._send(entry, data, file_id)))
+
+    async def _send(self, entry: Dict, data: bytes, file_id: Optional[str] = None):
+        try:
+            entry["sha256"] = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+            packed = await asyncio.to_thread(_compress, data) if self.compress else None
+
+            filename = self.name if self.single else f"{self.name}.part{entry['index']:03d}"
+            if packed is not None:
+                data = packed
+                filename += ".gz"
+            entry["file"] = filename
+            entry["compression"] = "gzip" if packed is not None else None
+
+            if file_id is not None:
+                self.file_ids[filename] = file_id
+            else:
+                await self._send_document(filename, data)
+        except Exception as e:
+            self._error = self._error or e
+        finally:
+            self._slots.release()
+
+    async def _send_document(self, filename: str, data: bytes):
+        message = await self.bot.send_document(
+            chat_id=self.chat_id,
+            document=data,
+            filename=filename,
+            write_timeout=Setting.UPLOAD_WRITE_TIMEOUT,
+        )
+        if message and message.document:
+            self.file_ids[filename] = message.document.file_id
+
+    async def finish(self, sha256: Optional[str] = None) -> int:
+        """
+        Waits for every queued part and sends the manifest for multi-part uploads.
+
+        Args:
+            sha256 (str, optional): Hex digest of the whole payload, recorded in the manifest.
+
+        Returns:
+            int: The number of parts sent.
+        """
+        try:
+            await asyncio.gather(*self._tasks)
+        except BaseException:
+            self.cancel()
+            raise
+        if self._error:
+            raise self._error
+
+        if not self.single and self.parts:
+            await self._send_document(f"{self.name}.manifest.json", self.manifest(sha256))
+        return len(self.parts)
+
+    def cancel(self):
+        """Cancels every part still in flight."""
+        for task in self._tasks:
+            task.cancel()
+
+    def manifest(self, sha256: Optional[str] = None) -> bytes:
+        """
+        Builds the reassembly manifest for the parts sent so far.
+
+        Args:
+            sha256 (str, optional): Hex digest of the whole payload.
+
+        Returns:
+            bytes: The manifest encoded as JSON.
+        """
+        commands = [
+            f"gzip -dc {shlex.quote(part['file'])}" if part["compression"] else f"cat {shlex.quote(part['file'])}"
+            for part in self.parts
+        ]
+        name = shlex.quote(self.name)
+        return json.dumps({
+            "name": self.name,
+            "size": self._offset,
+            "sha256": sha256,
+            "parts": self.parts,
+            "reassemble": f"({'; '.join(commands)}) > {name} && sha256sum {name}",
+        }, indent=2).encode("utf-8")
+
+async def upload_file(bot, chat_id: int, path: str, compress: bool = False) -> int:
+    """
+    Uploads a file of any size, reading it in parts off the event loop.
+
+    Args:
+        bot: The bot used to send documents.
+        chat_id (int): Destination chat.
+        path (str): Path of the file to upload.
+        compress (bool): Gzip parts when that makes them noticeably smaller.
+
+    Files that were uploaded before are sent again by file_id, see
+    `utils.file_cache.FileIdCache`: unchanged files are recognized by their
+    stat, and files that fit in one document also by their content.
+
+    Returns:
+        int: The number of parts sent (1 when the file fits in a single document).
+    """
+    part_size = Setting.UPLOAD_PART_SIZE
+    stat = os.stat(path)
+    size = stat.st_size
+    name = os.path.basename(path)
+    variant = f"{name}:{'gz' if compress else ''}"
+    stat_key = file_cache.stat_key(path, stat, variant)
+
+    entry = file_cache.get(stat_key)
+    delivered: List[str] = []
+    digest = hashlib.sha256()
+    head = None
+    if entry is None and size <= part_size:
+        # Hashed as it is read: on a miss these same bytes are uploaded.
+        head = await asyncio.to_thread(_read_head, path, size, digest)
+        entry = file_cache.get(file_cache.content_key(digest.hexdigest(), variant))
+    if entry is not None:
+        try:
+            await file_cache.send(bot, chat_id, entry)
+            return entry.get("parts", 1)
+        except StaleFileId as e:
+            # The parts delivered before the rejected one are not sent twice;
+            # they are only read again to rebuild the manifest.
+            if len(entry["files"]) > 1:
+                delivered = [file_id for _, file_id in entry["files"][:len(e.sent)]]
+            Logger.warning("Cached file_id of %s rejected after %d document(s), uploading the rest: %s",
+                           path, len(e.sent), e)
+        except BadRequest as e:
+            Logger.warning("Cached file_id of %s rejected, uploading again: %s", path, e)
+
+    uploader = PartUploader(bot, chat_id, name, compress, single=size <= part_size)
+
+    # Stop at the size seen up front so a growing log cannot spill a single
+    # upload into a second, unnamed part.
+    remaining = size
+    try:
+        if head is not None:
+            remaining -= len(head)
+            if head:
+                await uploader.add(head)
+        else:
+            with open(path, "rb") as file:
+                while remaining > 0:
+                    data = await asyncio.to_thread(_read_part, file, min(part_size, remaining), digest)
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    index = len(uploader.parts)
+                    await uploader.add(data, delivered[index] if index < len(delivered) else None)
+
+        parts = await uploader.finish(digest.hexdigest())
+    except BaseException:
+        uploader.cancel()
+        raise
+
+    names = [part["file"] for part in uploader.parts]
+    if not uploader.single:
+        names.append(f"{name}.manifest.json")
+    if remaining == 0 and all(n in uploader.file_ids for n in names):
+        file_cache.put(
+            {"files": [[n, uploader.file_ids[n]] for n in names], "parts": parts},
+            stat_key, file_cache.content_key(digest.hexdigest(), variant),
+        )
+    return parts
+
+async def upload_directory(bot, chat_id: int, archive: DirectoryArchive, members: List) -> int:
+    """
+    Uploads a directory as a `.tar.gz` streamed straight into the upload.
+
+    The compressed stream is cut into `Setting.UPLOAD_PART_SIZE` parts as it is
+    produced; nothing is written to disk.
+
+    Args:
+        bot: The bot used to send documents.
+        chat_id (int): Destination chat.
+        archive (DirectoryArchive): The directory to send.
+        members (List): The entries to archive, from `DirectoryArchive.scan`.
+
+    Returns:
+        int: The number of parts sent (1 when the archive fits in a single document).
+    """
+    part_size = Setting.UPLOAD_PART_SIZE
+    name = f"{archive.name}.tar.gz"
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    uploader = None
+    try:
+        async for chunk in archive.stream(members):
+            digest.update(chunk)
+            buffer += chunk
+            while len(buffer) > part_size:
+                if uploader is None:
+                    uploader = PartUploader(bot, chat_id, name)
+                await uploader.add(bytes(buffer[:part_size]))
+                del buffer[:part_size]
+        if uploader is None:
+            uploader = PartUploader(bot, chat_id, name, single=True)
+        await uploader.add(bytes(buffer))
+        return await uploader.finish(digest.hexdigest())
+    except BaseException:
+        if uploader is not None:
+            uploader.cancel()
+        raise
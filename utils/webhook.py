@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import asyncio
+import hmac
+import json
+import secrets
+import ssl
+from typing import Optional
+from urllib.parse import urlsplit
+from telegram import Update
+
+from config.settings import Setting
+from utils.logger import Logger
+
+MAX_BODY = 4 * 1024 * 1024
+MAX_HEADER_LINES = 100
+
+_RESPONSES = {
+    200: b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n",
+    400: b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n",
+    403: b"HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\nConnection: close\r\n\r\n",
+    404: b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n",
+    413: b"HTTP/1.1 413 Payload Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n",
+}
+
+class WebhookServer:
+    """
+    Receives updates from Telegram over HTTP(S) and feeds them to an application.
+
+    A deliberately small HTTP/1.1 server on top of `asyncio.start_server`: it
+    only accepts `POST <path>` with a JSON body, checks the
+    `X-Telegram-Bot-Api-Secret-Token` header in constant time, puts the update
+    on `application.update_queue` and answers 200 right away, so Telegram
+    never waits on a handler. At most `max_connections` requests are read at
+    the same time, and the same value is passed to `setWebhook`.
+
+    Attributes:
+        url (str): The public URL Telegram posts to.
+        path (str): The path updates are accepted on, taken from the URL.
+        secret (str): The secret token Telegram sends with every request.
+        received (int): The number of updates accepted.
+    """
+
+    def __init__(self, application, url: str = Setting.WEBHOOK_URL, listen: str = Setting.WEBHOOK_LISTEN,
+                 port: int = Setting.WEBHOOK_PORT, secret: Optional[str] = Setting.WEBHOOK_SECRET,
+                 cert: Optional[str] = Setting.WEBHOOK_CERT, key: Optional[str] = Setting.WEBHOOK_KEY,
+                 max_connections: int = Setting.WEBHOOK_MAX_CONNECTIONS):
+        if not url:
+            raise ValueError("WEBHOOK_URL not set")
+        self.application = application
+        self.url = url
+        self.path = urlsplit(url).path or "/"
+        self.listen = listen
+        self.port = port
+        self.secret = secret or secrets.token_urlsafe(32)
+        self.cert = cert
+        self.key = key
+        self.max_connections = max(1, min(100, max_connections))
+        self.received = 0
+        self._slots = asyncio.Semaphore(self.max_connections)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def _ssl_context(self) -> Optional[ssl.SSLContext]:
+        if not self.cert:
+            return None
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(self.cert, self.key)
+        return context
+
+    async def start(self):
+        """Starts listening and registers the webhook with Telegram."""
+        self._server = await asyncio.start_server(
+            self._serve, self.listen, self.port, ssl=self._ssl_context(), limit=64 * 1024
+        )
+        try:
+            certificate = open(self.cert, "rb") if self.cert and Setting.WEBHOOK_UPLOAD_CERT else None
+            try:
+                await self.application.bot.set_webhook(
+                    url=self.url,
+                    certificate=certificate,
+                    secret_token=self.secret,
+                    max_connections=self.max_connections,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+            finally:
+                if certificate is not None:
+                    certificate.close()
+        except BaseException:
+            await self.stop()
+            raise
+        Logger.info(f"Webhook listening on {self.listen}:{self.port}{self.path}")
+
+    async def stop(self, delete: bool = False):
+        """
+        Stops the server.
+
+        Args:
+            delete (bool): Also remove the webhook from Telegram.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if delete:
+            try:
+                await self.application.bot.delete_webhook()
+            except Exception as e:
+                Logger.warning(f"Could not delete webhook: {e}")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                # Idle keep-alive connections wait here, outside of the slots.
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                async with self._slots:
+                    status, keep_alive = await self._handle(reader, request_line)
+                writer.write(_RESPONSES[status])
+                await writer.drain()
+                if status != 200 or not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ssl.SSLError):
+            pass
+        except Exception as e:
+            Logger.debug("Webhook request failed: %s", e)
+        finally:
+            writer.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, request_line: bytes):
+        """Reads the rest of one request, returning (status, keep_alive)."""
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            return 400, False
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            return 400, False
+
+        # Everything is checked before the body is read, so an unauthenticated
+        # client cannot make the bot buffer MAX_BODY bytes. Rejections close
+        # the connection, so an unread body does not matter.
+        if method != "POST" or target.split("?", 1)[0] != self.path:
+            return 404, False
+        token = headers.get("x-telegram-bot-api-secret-token", "").encode("latin-1")
+        if not hmac.compare_digest(token, self.secret.encode("latin-1")):
+            return 403, False
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            return 400, False
+        if length < 0:
+            return 400, False
+        if length > MAX_BODY:
+            return 413, False
+        body = await reader.readexactly(length) if length else b""
+
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError):
+            return 400, False
+        if update is not None:
+            await self.application.update_queue.put(update)
+            self.received += 1
+
+        keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+        return 200, keep_alive
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#  wai-life-bot - Telegram bot
+#  Copyright (c) 2025 waibui
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+"""
+Runs commands from a wai-bot-tele coordinator on this host.
+
+    python wai-agent.py --coordinator bot.example.com:7100 --name web1
+
+The coordinator is the bot started with FLEET_PORT set; both sides must use
+the same FLEET_TOKEN.
+"""
+
+import sys
+import asyncio
+import argparse
+sys.dont_write_bytecode = True
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from config.settings import Setting
+from utils.fleet import Agent
+from utils.logger import Logger
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="wai-bot-tele agent")
+    parser.add_argument("--coordinator", required=True, help="host:port of the bot's FLEET_PORT")
+    parser.add_argument("--name", help="name used in /cmd @name (default: hostname)")
+    parser.add_argument("--token", default=Setting.FLEET_TOKEN, help="shared secret (default: FLEET_TOKEN)")
+    parser.add_argument("--tls", action="store_true", help="connect with TLS")
+    parser.add_argument("--cafile", help="CA bundle to verify the coordinator (implies --tls)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not args.token:
+        print("[ERROR] No token: set FLEET_TOKEN or pass --token")
+        sys.exit(1)
+    host, _, port = args.coordinator.rpartition(":")
+    if not host or not port.isdigit():
+        print("[ERROR] --coordinator must be host:port")
+        sys.exit(1)
+
+    agent = Agent(host, int(port), args.token, name=args.name, tls=args.tls, cafile=args.cafile)
+    try:
+        asyncio.run(agent.run_forever())
+    except KeyboardInterrupt:
+        Logger.warning("[!] Keyboard Interrupt detected!")
+
+if __name__ == "__main__":
+    main()
@@ -24,9 +24,13 @@ import sys
 import asyncio
 sys.dont_write_bytecode = True
 
+from utils.startup import StartupProfiler
+profiler = StartupProfiler(enabled="--profile-startup" in sys.argv[1:])
+
 try:
     from utils.dependencies import install_dependencies
     install_dependencies()
+    profiler.mark("dependency check")
 except Exception as e:
     print(f"[ERROR] Failed to install dependencies: {e}")
     sys.exit(1)
@@ -36,21 +40,36 @@ try:
     load_dotenv()
 
     import os
+    import html
     from telegram import Update
-    from telegram.ext import Application, CommandHandler, ContextTypes
+    from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes, MessageHandler, TypeHandler, filters
 
+    from config.settings import Setting
     from utils.logger import Logger
-    from utils.auth import authorized
+    from utils.auth import acl, gate
+    from utils.download import handle_document
+    from utils.jobs import jobs
+    from utils.output_store import CALLBACK_PREFIX, output_store
+    from utils.metrics import metrics
+    from utils.dispatch import ConcurrentDispatcher
+    from utils.outbound import COALESCE, OutboundLimiter
+    from utils.webhook import WebhookServer
+    from utils.fleet import fleet
+    from utils.path_index import path_index
+    from utils.telemetry import telemetry
+    from utils.shell_session import shell_sessions
     from manager.plugin_manager import PluginManager
+    from manager.plugin_workers import shutdown_workers
+    profiler.mark("imports")
 
 except Exception as e:
     print(f"[ERROR] Failed during imports or environment setup: {e}")
     sys.exit(1)
 
 plugin_manager = PluginManager()
+profiler.mark("plugin scan")
 shutdown_signal = asyncio.Event()
 
-@authorized
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         await update.message.reply_text(
@@ -63,7 +82,6 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         Logger.error(f"Error in /start command: {e}")
         await update.message.reply_text("⚠️ An error occurred while starting the bot.")
 
-@authorized
 async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         help_text = plugin_manager.get_help()
@@ -74,16 +92,30 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
         Logger.error(f"Error in /help command: {e}")
         await update.message.reply_text("⚠️ An error occurred while displaying help.")
 
-@authorized
 async def cmd_reload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        count = plugin_manager.reload()
-        await update.message.reply_text(f"Reloaded {count} plugins.")
+        if context.args and context.args[0] == "-f":
+            count = plugin_manager.reload()
+            await update.message.reply_text(f"Reloaded {count} plugins.")
+            return
+
+        changes = plugin_manager.refresh()
+        if not any(changes.values()):
+            await update.message.reply_text("Plugins are up to date.")
+            return
+        lines = [f"{label}: {', '.join(files)}" for label, files in changes.items() if files]
+        await update.message.reply_text("Reloaded plugins.\n" + "\n".join(lines))
     except Exception as e:
         Logger.error(f"Error reloading plugins: {e}")
-        await update.message.reply_text("⚠️ Failed to reload plugins.")
+        await update.message.reply_text("⚠️ Failed to reload plugins.", rate_limit_args=COALESCE)
         
-@authorized
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await update.message.reply_text(f"<pre>{html.escape(metrics.summary())}</pre>", parse_mode="HTML")
+    except Exception as e:
+        Logger.error(f"Error in /stats command: {e}")
+        await update.message.reply_text("⚠️ An error occurred while collecting statistics.")
+
 async def cmd_shutdown(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         await update.message.reply_text("Shutting down the bot...")
@@ -102,28 +134,80 @@ async def main():
         if not token:
             raise ValueError("TELEGRAM_BOT_TOKEN not set in .env")
 
-        app = Application.builder().token(token).build()
-        app.add_handler(CommandHandler("start", cmd_start))
-        app.add_handler(CommandHandler("help", cmd_help))
-        app.add_handler(CommandHandler("reload", cmd_reload))
-        app.add_handler(CommandHandler("shutdown", cmd_shutdown))
+        jobs.open()
+        builder = Application.builder().token(token).rate_limiter(OutboundLimiter(on_sent=jobs.record))
+        if Setting.BOT_API_URL:
+            api_url = Setting.BOT_API_URL.rstrip("/")
+            builder.base_url(f"{api_url}/bot").base_file_url(f"{api_url}/file/bot")
+        if Setting.UPDATE_WORKERS > 1:
+            builder.concurrent_updates(ConcurrentDispatcher(
+                command_limit=lambda command: plugin_manager.command_limits.get(command)
+            ))
+        app = builder.build()
+        app.add_handler(TypeHandler(Update, gate), group=Setting.AUTH_HANDLER_GROUP)
+        app.add_handler(CommandHandler("start", metrics.instrument("start", cmd_start)))
+        app.add_handler(CommandHandler("help", metrics.instrument("help", cmd_help)))
+        app.add_handler(CommandHandler("reload", metrics.instrument("reload", cmd_reload)))
+        app.add_handler(CommandHandler("stats", metrics.instrument("stats", cmd_stats)))
+        app.add_handler(CommandHandler("shutdown", metrics.instrument("shutdown", cmd_shutdown)))
+        app.add_handler(CallbackQueryHandler(output_store.handle_callback, pattern=f"^{CALLBACK_PREFIX}"))
+        app.add_handler(MessageHandler(filters.Document.ALL, metrics.instrument("download", handle_document)))
 
         try:
-            for handler in plugin_manager.get_handlers():
-                app.add_handler(handler)
+            plugin_manager.attach(app)
         except Exception as e:
             Logger.error(f"Failed to load plugin handlers: {e}")
+        profiler.mark("application setup")
 
         Logger.info("Bot started successfully. Listening for commands...")
         
         await app.initialize()
+        profiler.mark("bot initialize")
         await app.start()
-        await app.updater.start_polling()
+
+        webhook = None
+        if Setting.TRANSPORT == "webhook":
+            try:
+                webhook = WebhookServer(app)
+                await webhook.start()
+            except Exception as e:
+                Logger.error(f"Failed to start webhook, falling back to polling: {e}")
+                webhook = None
+        if webhook is None:
+            await app.updater.start_polling()
+        profiler.mark("start receiving updates")
+        if profiler.enabled:
+            Logger.info(profiler.report())
+
+        path_index.start()
+        telemetry.start()
+        watchers = []
+        if Setting.PLUGIN_WATCH_INTERVAL > 0:
+            watchers.append(asyncio.ensure_future(plugin_manager.watch(Setting.PLUGIN_WATCH_INTERVAL)))
+        if Setting.ACL_RELOAD_INTERVAL > 0:
+            watchers.append(asyncio.ensure_future(acl.watch(Setting.ACL_RELOAD_INTERVAL)))
+        if Setting.METRICS_LAG_INTERVAL > 0:
+            watchers.append(asyncio.ensure_future(metrics.sample_loop_lag(Setting.METRICS_LAG_INTERVAL)))
+        if Setting.METRICS_PORT > 0:
+            watchers.append(asyncio.ensure_future(metrics.serve_prometheus()))
+        if Setting.FLEET_PORT > 0:
+            watchers.append(asyncio.ensure_future(fleet.serve()))
+        watchers.append(asyncio.ensure_future(shell_sessions.reap(min(Setting.SHELL_IDLE_TIMEOUT, 60) if Setting.SHELL_IDLE_TIMEOUT > 0 else 60)))
         
         await shutdown_signal.wait()
         
         Logger.info("Performing clean shutdown...")
-        await app.updater.stop()
+        for watcher in watchers:
+            watcher.cancel()
+        path_index.stop()
+        telemetry.stop()
+        shutdown_workers()
+        await shell_sessions.close_all()
+        jobs.close()
+        if webhook is not None:
+            await webhook.stop()
+        else:
+            await app.updater.stop()
         await app.stop()
         await app.shutdown()
         